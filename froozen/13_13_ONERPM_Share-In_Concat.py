@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
+import hashlib
 import io
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Set
 
+from utils.cambio import COLUNAS_PERIODO, converter_colunas, periodo_do_relatorio, periodo_valido, salvar_taxas, taxas_do_periodo
+
 # Configuração da página
 st.set_page_config(
     page_title="Costa Gold Normalizer",
@@ -109,127 +113,98 @@ def identificar_moedas(dfs: Dict[str, pd.DataFrame]) -> Set[str]:
             moedas.update(moedas_planilha)
     return moedas
 
-def processar_planilha_nas_nuvens(df: pd.DataFrame, payer_names: List[str], origem: str, nome_arquivo: str) -> tuple[pd.DataFrame, pd.DataFrame]:
-    """Processa a planilha Nas Nuvens filtrando por Share Type = 'In' e Payer Name específico
+# Abas lidas de cada arquivo (numa única abertura do workbook)
+ABAS_SHARE_IN = ["Shares In & Out", "Youtube Channels"]
+
+# Payer Names considerados no arquivo Nas Nuvens
+PAYERS_NAS_NUVENS = ["Costa Gold", "Costa Gold by DMC"]
+
+def alinhar_estrutura(df: pd.DataFrame, mapeamento: Dict[str, str], estrutura: List[str], origem: str, nome_arquivo: str) -> pd.DataFrame:
+    """Aplica o mapeamento, identifica origem e arquivo e alinha à estrutura com um único reindex"""
+    df_alinhado = df.rename(columns=mapeamento)
+    df_alinhado['Origem'] = origem
+    df_alinhado['Nome Arquivo'] = nome_arquivo
+    return df_alinhado.reindex(columns=estrutura)
+
+def separar_share_in(df: pd.DataFrame, origem: str, nome_arquivo: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Separa as linhas Share In em dados normais e YouTube Video, já nas estruturas finais
     Retorna: (df_normal, df_youtube_videos)"""
     
     # Filtra por Share Type = 'In'
     if 'Share Type' in df.columns:
-        df = df[df['Share Type'] == 'In'].copy()
-    
-    # Filtra por Payer Name (Costa Gold ou Costa Gold by DMC)
-    if 'Payer Name' in df.columns:
-        df = df[df['Payer Name'].isin(payer_names)].copy()
+        df = df[df['Share Type'] == 'In']
     
     # Se não há dados após filtros, retorna DataFrames vazios
     if df.empty:
         return pd.DataFrame(columns=estrutura_final), pd.DataFrame(columns=estrutura_youtube)
     
     # Separa linhas com YouTube Video das demais
-    df_youtube_videos = pd.DataFrame()
-    df_normal = df.copy()
-    
     if 'Product Type' in df.columns:
         mask_youtube = df['Product Type'] == 'YouTube Video'
-        df_youtube_videos = df[mask_youtube].copy()
-        df_normal = df[~mask_youtube].copy()
+    else:
+        mask_youtube = pd.Series(False, index=df.index)
+    df_normal = df[~mask_youtube]
+    df_youtube_videos = df[mask_youtube]
     
-    # Processa dados normais
     df_normal_processado = pd.DataFrame(columns=estrutura_final)
     if not df_normal.empty:
-        # Aplica o mapeamento
-        df_normal_processado = df_normal.rename(columns=mapeamento_master_share_in)
-        
-        # Adiciona colunas de origem e nome do arquivo
-        df_normal_processado['Origem'] = origem
-        df_normal_processado['Nome Arquivo'] = nome_arquivo
-        
-        # Garante que todas as colunas da estrutura final existam
-        for coluna in estrutura_final:
-            if coluna not in df_normal_processado.columns:
-                df_normal_processado[coluna] = None
-        
-        # Reordena as colunas conforme a estrutura final
-        df_normal_processado = df_normal_processado[estrutura_final]
+        df_normal_processado = alinhar_estrutura(df_normal, mapeamento_master_share_in, estrutura_final, origem, nome_arquivo)
     
-    # Processa dados do YouTube Video
     df_youtube_processado = pd.DataFrame(columns=estrutura_youtube)
     if not df_youtube_videos.empty:
-        # Aplica o mapeamento específico para YouTube
-        df_youtube_processado = df_youtube_videos.rename(columns=mapeamento_youtube_shares_to_channels)
-        
-        # Adiciona colunas de origem e nome do arquivo
-        df_youtube_processado['Origem'] = origem
-        df_youtube_processado['Nome Arquivo'] = nome_arquivo
-        
-        # Garante que todas as colunas da estrutura youtube existam
-        for coluna in estrutura_youtube:
-            if coluna not in df_youtube_processado.columns:
-                df_youtube_processado[coluna] = None
-        
-        # Reordena as colunas conforme a estrutura youtube
-        df_youtube_processado = df_youtube_processado[estrutura_youtube]
+        df_youtube_processado = alinhar_estrutura(df_youtube_videos, mapeamento_youtube_shares_to_channels, estrutura_youtube, origem, nome_arquivo)
     
     return df_normal_processado, df_youtube_processado
 
-def processar_planilha_costa_gold(df: pd.DataFrame, origem: str, nome_arquivo: str) -> tuple[pd.DataFrame, pd.DataFrame]:
-    """Processa as planilhas Costa Gold e Costa Gold by DMC
+def processar_planilha_nas_nuvens(df: pd.DataFrame, payer_names: List[str], origem: str, nome_arquivo: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Processa a planilha Nas Nuvens filtrando por Share Type = 'In' e Payer Name específico
     Retorna: (df_normal, df_youtube_videos)"""
     
-    # Filtra por Share Type = 'In'
-    if 'Share Type' in df.columns:
-        df = df[df['Share Type'] == 'In'].copy()
-    
-    # Se não há dados após filtros, retorna DataFrames vazios
-    if df.empty:
-        return pd.DataFrame(columns=estrutura_final), pd.DataFrame(columns=estrutura_youtube)
-    
-    # Separa linhas com YouTube Video das demais
-    df_youtube_videos = pd.DataFrame()
-    df_normal = df.copy()
-    
-    if 'Product Type' in df.columns:
-        mask_youtube = df['Product Type'] == 'YouTube Video'
-        df_youtube_videos = df[mask_youtube].copy()
-        df_normal = df[~mask_youtube].copy()
-    
-    # Processa dados normais
-    df_normal_processado = pd.DataFrame(columns=estrutura_final)
-    if not df_normal.empty:
-        # Aplica o mapeamento
-        df_normal_processado = df_normal.rename(columns=mapeamento_master_share_in)
-        
-        # Adiciona colunas de origem e nome do arquivo
-        df_normal_processado['Origem'] = origem
-        df_normal_processado['Nome Arquivo'] = nome_arquivo
-        
-        # Garante que todas as colunas da estrutura final existam
-        for coluna in estrutura_final:
-            if coluna not in df_normal_processado.columns:
-                df_normal_processado[coluna] = None
-        
-        # Reordena as colunas conforme a estrutura final
-        df_normal_processado = df_normal_processado[estrutura_final]
-    
-    # Processa dados do YouTube Video
-    df_youtube_processado = pd.DataFrame(columns=estrutura_youtube)
-    if not df_youtube_videos.empty:
-        # Aplica o mapeamento específico para YouTube
-        df_youtube_processado = df_youtube_videos.rename(columns=mapeamento_youtube_shares_to_channels)
-        
-        # Adiciona colunas de origem e nome do arquivo
-        df_youtube_processado['Origem'] = origem
-        df_youtube_processado['Nome Arquivo'] = nome_arquivo
-        
-        # Garante que todas as colunas da estrutura youtube existam
-        for coluna in estrutura_youtube:
-            if coluna not in df_youtube_processado.columns:
-                df_youtube_processado[coluna] = None
-        
-        # Reordena as colunas conforme a estrutura youtube
-        df_youtube_processado = df_youtube_processado[estrutura_youtube]
+    # Filtra por Payer Name (Costa Gold ou Costa Gold by DMC)
+    if 'Payer Name' in df.columns:
+        df = df[df['Payer Name'].isin(payer_names)]
     
-    return df_normal_processado, df_youtube_processado
+    return separar_share_in(df, origem, nome_arquivo)
+
+def processar_planilha_costa_gold(df: pd.DataFrame, origem: str, nome_arquivo: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Processa as planilhas Costa Gold e Costa Gold by DMC
+    Retorna: (df_normal, df_youtube_videos)"""
+    return separar_share_in(df, origem, nome_arquivo)
+
+def ler_arquivo_share_in(conteudo: bytes) -> tuple[List[str], Dict[str, pd.DataFrame]]:
+    """Abre o workbook uma única vez e lê as abas Shares In & Out e Youtube Channels
+    Retorna: (abas existentes, {aba: DataFrame})"""
+    excel_file = pd.ExcelFile(io.BytesIO(conteudo))
+    abas = [aba for aba in ABAS_SHARE_IN if aba in excel_file.sheet_names]
+    return excel_file.sheet_names, (pd.read_excel(excel_file, sheet_name=abas) if abas else {})
+
+def consolidar_arquivo(nome: str, dados: Dict, taxas_cambio: Dict[str, float]) -> Dict[str, pd.DataFrame]:
+    """Processa um arquivo (Share In + YouTube) com as conversões para BRL; roda no pool de workers"""
+    nome_arquivo = dados['nome_arquivo'] or f"{nome}.xlsx"
+    
+    if nome == "Nas Nuvens":
+        # Filtra Nas Nuvens por Payer Name = Costa Gold ou Costa Gold by DMC
+        df_processado, df_youtube_shares = processar_planilha_nas_nuvens(
+            dados['df'], PAYERS_NAS_NUVENS, nome, nome_arquivo
+        )
+    else:
+        # Processa Costa Gold e Costa Gold by DMC
+        df_processado, df_youtube_shares = processar_planilha_costa_gold(dados['df'], nome, nome_arquivo)
+    
+    if not df_processado.empty:
+        df_processado = calcular_net_brl(df_processado, taxas_cambio)
+    if not df_youtube_shares.empty:
+        df_youtube_shares = calcular_conversoes_youtube(df_youtube_shares, taxas_cambio)
+    
+    df_youtube_channels = pd.DataFrame()
+    if dados['df_youtube'] is not None:
+        df_youtube_channels = processar_youtube_channels(dados['df_youtube'], taxas_cambio, nome, nome_arquivo)
+    
+    return {
+        'normal': df_processado,
+        'youtube_shares': df_youtube_shares,
+        'youtube_channels': df_youtube_channels,
+    }
 
 def processar_youtube_channels(df: pd.DataFrame, taxas_cambio: Dict[str, float], origem: str, nome_arquivo: str) -> pd.DataFrame:
     """Processa a planilha Youtube Channels mantendo estrutura original e convertendo valores"""
@@ -239,132 +214,21 @@ def processar_youtube_channels(df: pd.DataFrame, taxas_cambio: Dict[str, float],
     df_youtube['Origem'] = origem
     df_youtube['Nome Arquivo'] = nome_arquivo
     
-    # Renomeia as colunas originais primeiro
-    if 'Gross' in df_youtube.columns:
-        df_youtube = df_youtube.rename(columns={'Gross': 'Onerpm Gross'})
-    if 'Net' in df_youtube.columns:
-        df_youtube = df_youtube.rename(columns={'Net': 'Onerpm Net'})
-    
-    # Adiciona colunas de conversão para BRL se tiverem as colunas necessárias
-    if 'Onerpm Gross' in df_youtube.columns and 'Currency' in df_youtube.columns:
-        def converter_gross_para_brl(row):
-            if pd.isna(row['Onerpm Gross']) or pd.isna(row['Currency']):
-                return None
-            
-            moeda = row['Currency']
-            valor_gross = row['Onerpm Gross']
-            
-            if moeda == 'BRL':
-                return valor_gross
-            elif moeda in taxas_cambio:
-                return valor_gross * taxas_cambio[moeda]
-            else:
-                return None
-        
-        df_youtube['Gross'] = df_youtube.apply(converter_gross_para_brl, axis=1)
-    
-    if 'Onerpm Net' in df_youtube.columns and 'Currency' in df_youtube.columns:
-        def converter_net_para_brl(row):
-            if pd.isna(row['Onerpm Net']) or pd.isna(row['Currency']):
-                return None
-            
-            moeda = row['Currency']
-            valor_net = row['Onerpm Net']
-            
-            if moeda == 'BRL':
-                return valor_net
-            elif moeda in taxas_cambio:
-                return valor_net * taxas_cambio[moeda]
-            else:
-                return None
-        
-        df_youtube['Net'] = df_youtube.apply(converter_net_para_brl, axis=1)
-    
-    return df_youtube
+    # Renomeia as colunas originais e converte para BRL
+    df_youtube = df_youtube.rename(columns={'Gross': 'Onerpm Gross', 'Net': 'Onerpm Net'})
+    return converter_colunas(df_youtube, {'Onerpm Gross': 'Gross', 'Onerpm Net': 'Net'}, taxas_cambio)
 
 def calcular_gross_brl(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Calcula a coluna Gross BRL baseada nas taxas de câmbio"""
-    df = df.copy()
-    
-    def converter_gross_para_brl(row):
-        if pd.isna(row['Gross']) or pd.isna(row['Currency']):
-            return None
-        
-        moeda = row['Currency']
-        valor_gross = row['Gross']
-        
-        if moeda == 'BRL':
-            return valor_gross
-        elif moeda in taxas_cambio:
-            return valor_gross * taxas_cambio[moeda]
-        else:
-            return None
-    
-    df['Gross BRL'] = df.apply(converter_gross_para_brl, axis=1)
-    return df
+    return converter_colunas(df.copy(), {'Gross': 'Gross BRL'}, taxas_cambio)
 
 def calcular_net_brl(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Calcula a coluna Net BRL baseada nas taxas de câmbio"""
-    df = df.copy()
-    
-    def converter_para_brl(row):
-        if pd.isna(row['Net']) or pd.isna(row['Currency']):
-            return None
-        
-        moeda = row['Currency']
-        valor_net = row['Net']
-        
-        if moeda == 'BRL':
-            return valor_net
-        elif moeda in taxas_cambio:
-            return valor_net * taxas_cambio[moeda]
-        else:
-            return None
-    
-    df['Net BRL'] = df.apply(converter_para_brl, axis=1)
-    return df
+    return converter_colunas(df.copy(), {'Net': 'Net BRL'}, taxas_cambio)
 
 def calcular_conversoes_youtube(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Calcula as conversões para BRL nas planilhas YouTube"""
-    df = df.copy()
-    
-    # Converte Onerpm Net para Net (BRL)
-    if 'Onerpm Net' in df.columns and 'Currency' in df.columns:
-        def converter_net_para_brl(row):
-            if pd.isna(row['Onerpm Net']) or pd.isna(row['Currency']):
-                return None
-            
-            moeda = row['Currency']
-            valor_net = row['Onerpm Net']
-            
-            if moeda == 'BRL':
-                return valor_net
-            elif moeda in taxas_cambio:
-                return valor_net * taxas_cambio[moeda]
-            else:
-                return None
-        
-        df['Net'] = df.apply(converter_net_para_brl, axis=1)
-    
-    # Converte Onerpm Gross para Gross (BRL) se existir
-    if 'Onerpm Gross' in df.columns and 'Currency' in df.columns:
-        def converter_gross_para_brl(row):
-            if pd.isna(row['Onerpm Gross']) or pd.isna(row['Currency']):
-                return None
-            
-            moeda = row['Currency']
-            valor_gross = row['Onerpm Gross']
-            
-            if moeda == 'BRL':
-                return valor_gross
-            elif moeda in taxas_cambio:
-                return valor_gross * taxas_cambio[moeda]
-            else:
-                return None
-        
-        df['Gross'] = df.apply(converter_gross_para_brl, axis=1)
-    
-    return df
+    return converter_colunas(df.copy(), {'Onerpm Net': 'Net', 'Onerpm Gross': 'Gross'}, taxas_cambio)
 
 def preparar_df_para_download(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Prepara o DataFrame final para download com as colunas renomeadas"""
@@ -498,56 +362,61 @@ if uploaded_costa_gold_dmc:
 
 if arquivos_enviados:
     try:
-        # Carrega e processa os arquivos
-        dfs_carregados = {}
+        # Cada arquivo numa única leitura do workbook; arquivos já lidos (mesmo
+        # conteúdo) são reaproveitados entre reruns e só os enviados agora
+        # ficam na sessão. A leitura (openpyxl, Python puro) segura o GIL,
+        # então os arquivos são lidos um a um, sem threads
+        chaves = {nome: (nome, hashlib.sha256(arquivo.getvalue()).hexdigest()) for nome, arquivo in arquivos_enviados}
+        anteriores = st.session_state.get('share_in_arquivos', {})
+        cache_arquivos = {chave: anteriores[chave] for chave in chaves.values() if chave in anteriores}
+        st.session_state['share_in_arquivos'] = cache_arquivos
+        pendentes = [(nome, arquivo) for nome, arquivo in arquivos_enviados if chaves[nome] not in cache_arquivos]
         
-        with st.spinner("Carregando arquivos..."):
-            for nome, arquivo in arquivos_enviados:
-                excel_file = pd.ExcelFile(arquivo)
-                abas_existentes = excel_file.sheet_names
-                
-                st.info(f"📄 {nome} - Abas encontradas: {', '.join(abas_existentes)}")
-                
-                if "Shares In & Out" in abas_existentes:
-                    df = pd.read_excel(arquivo, sheet_name="Shares In & Out")
-                    dfs_carregados[nome] = {
-                        'df': df,
-                        'arquivo': arquivo
-                    }
-                else:
-                    st.warning(f"⚠️ Aba 'Shares In & Out' não encontrada em {nome}")
+        if pendentes:
+            with st.spinner("Carregando arquivos..."):
+                for nome, arquivo in pendentes:
+                    cache_arquivos[chaves[nome]] = ler_arquivo_share_in(arquivo.getvalue())
+        
+        dfs_carregados = {}
+        youtube_data = {}
+        for nome, arquivo in arquivos_enviados:
+            abas_existentes, planilhas = cache_arquivos[chaves[nome]]
+            st.info(f"📄 {nome} - Abas encontradas: {', '.join(abas_existentes)}")
+            
+            if "Shares In & Out" in planilhas:
+                dfs_carregados[nome] = {
+                    'df': planilhas["Shares In & Out"],
+                    'df_youtube': planilhas.get("Youtube Channels"),
+                    'nome_arquivo': arquivo.name
+                }
+                if "Youtube Channels" in planilhas:
+                    youtube_data[nome] = planilhas["Youtube Channels"]
+            else:
+                st.warning(f"⚠️ Aba 'Shares In & Out' não encontrada em {nome}")
         
         if dfs_carregados:
             st.divider()
             
-            # Identifica moedas de todos os arquivos
-            moedas_encontradas = set()
-            for nome, dados in dfs_carregados.items():
-                df = dados['df']
-                if 'Currency' in df.columns:
-                    moedas_df = df['Currency'].dropna().unique()
-                    moedas_encontradas.update(moedas_df)
-            
-            # Verifica se existe Youtube Channels em algum arquivo
-            youtube_data = {}
-            for nome, dados in dfs_carregados.items():
-                arquivo = dados['arquivo']
-                excel_file = pd.ExcelFile(arquivo)
-                if "Youtube Channels" in excel_file.sheet_names:
-                    df_youtube = pd.read_excel(arquivo, sheet_name="Youtube Channels")
-                    youtube_data[nome] = {
-                        'df': df_youtube,
-                        'arquivo': arquivo
-                    }
-                    # Adiciona moedas do Youtube Channels
-                    if 'Currency' in df_youtube.columns:
-                        moedas_youtube = df_youtube['Currency'].dropna().unique()
-                        moedas_encontradas.update(moedas_youtube)
+            # Identifica moedas de todos os arquivos (Shares In & Out e Youtube Channels)
+            moedas_encontradas = identificar_moedas(
+                {**{f"{nome} Shares": dados['df'] for nome, dados in dfs_carregados.items()},
+                 **{f"{nome} Youtube": df for nome, df in youtube_data.items()}}
+            )
             
             # Configuração de taxas de câmbio
             st.subheader("💱 Configuração de Taxas de Câmbio")
             st.write(f"Moedas encontradas: {', '.join(sorted(moedas_encontradas))}")
             
+            # Taxas salvas para o período são usadas como valor inicial dos campos
+            periodo_taxas = st.text_input(
+                "Período das taxas (AAAA-MM)",
+                value=periodo_do_relatorio([dados['df'] for dados in dfs_carregados.values()], COLUNAS_PERIODO),
+                help="As taxas informadas ficam salvas para este período e são sugeridas nos próximos processamentos. Linhas de outros meses (Accounted Date) usam as taxas salvas para o seu próprio período"
+            ).strip()
+            taxas_salvas = taxas_do_periodo(periodo_taxas)
+            if taxas_salvas:
+                st.caption(f"Taxas salvas para {periodo_taxas}: {', '.join(sorted(taxas_salvas))}")
+            
             # Cria inputs para taxas de câmbio
             taxas_cambio = {}
             col1, col2, col3 = st.columns(3)
@@ -566,15 +435,15 @@ if arquivos_enviados:
             for i, moeda in enumerate(sorted(moedas_encontradas)):
                 if moeda != 'BRL':  # BRL não precisa de conversão
                     col = [col1, col2, col3][i % 3]
-                    with col1:
-                        valor_padrao = valores_padrao.get(moeda, 1.0)
+                    with col:
+                        valor_padrao = taxas_salvas.get(moeda, valores_padrao.get(moeda, 1.0))
                         taxa = st.number_input(
                             f"Taxa {moeda} → BRL:",
                             min_value=0.0,
                             value=valor_padrao,
                             step=0.01,
                             format="%.4f",
-                            key=f"taxa_{moeda}",
+                            key=f"taxa_{moeda}_{periodo_taxas}",
                             help=f"Taxa de conversão de {moeda} para Real brasileiro"
                         )
                         taxas_cambio[moeda] = taxa
@@ -583,54 +452,39 @@ if arquivos_enviados:
             
             # Botão para processar
             if st.button("Processar Dados", type="primary"):
+                if not periodo_valido(periodo_taxas):
+                    st.error("Informe o período das taxas no formato AAAA-MM")
+                    st.stop()
+                salvar_taxas(periodo_taxas, taxas_cambio)
                 with st.spinner("Processando dados..."):
                     dfs_processados = []
                     youtube_shares_dfs = []  # Para YouTube Videos das Shares In & Out
+                    youtube_channels_dfs = []
                     
-                    # Processa cada arquivo
-                    for nome, dados in dfs_carregados.items():
-                        df = dados['df']
-                        arquivo = dados['arquivo']
-                        nome_arquivo = arquivo.name if arquivo.name else f"{nome}.xlsx"
-                        
-                        if nome == "Nas Nuvens":
-                            # Filtra Nas Nuvens por Payer Name = Costa Gold ou Costa Gold by DMC
-                            payer_names = ["Costa Gold", "Costa Gold by DMC"]
-                            df_processado, df_youtube_shares = processar_planilha_nas_nuvens(
-                                df, payer_names, nome, nome_arquivo
-                            )
-                        else:
-                            # Processa Costa Gold e Costa Gold by DMC
-                            df_processado, df_youtube_shares = processar_planilha_costa_gold(
-                                df, nome, nome_arquivo
-                            )
-                        
-                        if not df_processado.empty:
-                            # Calcula Net BRL
-                            df_processado = calcular_net_brl(df_processado, taxas_cambio)
-                            dfs_processados.append(df_processado)
-                            st.success(f"✓ {nome} processado: {len(df_processado)} registros")
+                    # Processa os arquivos em paralelo; os resultados mantêm a ordem do upload
+                    nomes = list(dfs_carregados)
+                    with ThreadPoolExecutor(max_workers=len(nomes)) as executor:
+                        resultados = list(executor.map(
+                            lambda nome: consolidar_arquivo(nome, dfs_carregados[nome], taxas_cambio),
+                            nomes
+                        ))
+                    
+                    for nome, resultado in zip(nomes, resultados):
+                        if not resultado['normal'].empty:
+                            dfs_processados.append(resultado['normal'])
+                            st.success(f"✓ {nome} processado: {len(resultado['normal'])} registros")
                         else:
                             st.info(f"ℹ️ Nenhum dado normal encontrado em {nome}")
                         
-                        if not df_youtube_shares.empty:
-                            # Calcula conversões para YouTube
-                            df_youtube_shares = calcular_conversoes_youtube(df_youtube_shares, taxas_cambio)
-                            youtube_shares_dfs.append(df_youtube_shares)
-                            st.success(f"✓ YouTube Videos de {nome}: {len(df_youtube_shares)} registros")
+                        if not resultado['youtube_shares'].empty:
+                            youtube_shares_dfs.append(resultado['youtube_shares'])
+                            st.success(f"✓ YouTube Videos de {nome}: {len(resultado['youtube_shares'])} registros")
                     
-                    # Processa Youtube Channels se existir
-                    youtube_channels_dfs = []
-                    if youtube_data:
-                        for nome, dados in youtube_data.items():
-                            df_youtube = dados['df']
-                            arquivo = dados['arquivo']
-                            nome_arquivo = arquivo.name if arquivo.name else f"{nome}.xlsx"
-                            
-                            df_youtube_proc = processar_youtube_channels(df_youtube, taxas_cambio, nome, nome_arquivo)
-                            if not df_youtube_proc.empty:
-                                youtube_channels_dfs.append(df_youtube_proc)
-                                st.success(f"✓ Youtube Channels de {nome}: {len(df_youtube_proc)} registros")
+                    # Youtube Channels de cada arquivo, se existir
+                    for nome, resultado in zip(nomes, resultados):
+                        if not resultado['youtube_channels'].empty:
+                            youtube_channels_dfs.append(resultado['youtube_channels'])
+                            st.success(f"✓ Youtube Channels de {nome}: {len(resultado['youtube_channels'])} registros")
                     
                     # Concatena YouTube Shares com YouTube Channels
                     df_youtube_final = pd.DataFrame()
@@ -1,7 +1,8 @@
 import streamlit as st
 import os
-import shutil
 import pandas as pd
+from utils.copia import MAX_WORKERS_COPIA, copiar_em_paralelo, formatar_bytes
+from utils.manifesto import manifesto_padrao
 
 #----------------------------------
 # Copiador de Arquivos Mensais para Outgoing
@@ -28,29 +29,66 @@ raiz_antiga = st.text_input("Raiz origem:", r'N:')
 raiz_nova = st.text_input("Raiz saída:", r'Z:')
 
 #----------------------------------
-# Função para copiar arquivos
+# Cópias simultâneas (latência da rede)
 #----------------------------------
 
-def copiar_arquivos(row):
-    caminhos_arquivos = row[coluna_caminho].split('/')
-    catalogo = row[coluna_catalogo].strip()
-    fonte_renda = row[coluna_fonte_renda].strip()
-    pasta_destino = os.path.join(pasta_saida, catalogo, fonte_renda)
+max_workers = st.number_input("Cópias simultâneas:", min_value=1, max_value=32, value=MAX_WORKERS_COPIA, step=1)
 
-    # Criar a pasta de destino se não existir
-    if not os.path.exists(pasta_destino):
-        os.makedirs(pasta_destino)
+#----------------------------------
+# Funções para montar e copiar os arquivos
+#----------------------------------
 
-    # Copiar os arquivos
-    for caminho_arquivo in caminhos_arquivos:
-        caminho_arquivo = caminho_arquivo.strip().replace(raiz_antiga, raiz_nova)
-        try:
-            shutil.copy(caminho_arquivo, pasta_destino)
-            st.write(f"Arquivo {caminho_arquivo} copiado para {pasta_destino}")
-        except FileNotFoundError:
-            st.warning(f"Arquivo {caminho_arquivo} não encontrado.")
-        except Exception as e:
-            st.error(f"Erro ao copiar o arquivo {caminho_arquivo}: {e}")
+def listar_copias(df_mes):
+    """Lista (arquivo de origem, destino) de todas as linhas do mês.
+    A coluna Stmt Path pode ter vários arquivos separados por '/'."""
+    tarefas = []
+    for caminhos, catalogo, fonte_renda in zip(df_mes[coluna_caminho], df_mes[coluna_catalogo], df_mes[coluna_fonte_renda]):
+        pasta_destino = os.path.join(pasta_saida, str(catalogo).strip(), str(fonte_renda).strip())
+        for caminho_arquivo in str(caminhos).split('/'):
+            caminho_arquivo = caminho_arquivo.strip().replace(raiz_antiga, raiz_nova)
+            if caminho_arquivo:
+                tarefas.append((caminho_arquivo, os.path.join(pasta_destino, os.path.basename(caminho_arquivo))))
+    return tarefas
+
+def copiar_arquivos(tarefas):
+    barra = st.progress(0)
+    status = st.empty()
+
+    def ao_progredir(resumo):
+        barra.progress(resumo.concluidos / max(resumo.enviados, 1))
+        status.text(
+            f"{resumo.concluidos}/{resumo.enviados} arquivos · {resumo.copiados} copiados · "
+            f"{resumo.ignorados} já atualizados · {formatar_bytes(resumo.vazao)}/s"
+        )
+
+    manifesto = manifesto_padrao()
+    resumo = copiar_em_paralelo(tarefas, max_workers=int(max_workers), ao_progredir=ao_progredir, manifesto=manifesto)
+
+    st.success(
+        f"Processo de cópia concluído! {resumo.copiados} arquivos copiados "
+        f"({formatar_bytes(resumo.bytes_copiados)} em {resumo.segundos:.1f}s), "
+        f"{resumo.ignorados} já estavam atualizados."
+    )
+    if resumo.duplicados:
+        st.info(f"{len(resumo.duplicados)} caminhos repetidos na planilha foram copiados uma única vez.")
+    if resumo.conflitos:
+        with st.expander(f"⚠️ {len(resumo.conflitos)} arquivos com o mesmo destino de outro arquivo, não copiados"):
+            for caminho_arquivo, destino in resumo.conflitos:
+                st.write(f"{caminho_arquivo} → {destino}")
+    if resumo.nao_encontrados:
+        with st.expander(f"⚠️ {len(resumo.nao_encontrados)} arquivos não encontrados"):
+            for caminho_arquivo in resumo.nao_encontrados:
+                st.write(caminho_arquivo)
+    if resumo.falhas:
+        with st.expander(f"❌ {len(resumo.falhas)} arquivos com erro"):
+            for caminho_arquivo, erro in resumo.falhas:
+                st.write(f"{caminho_arquivo}: {erro}")
+
+    # Extratos com o mesmo conteúdo em pastas diferentes (pelo hash do manifesto, sem reler)
+    duplicados = manifesto.duplicados(origem for origem, _ in tarefas)
+    if not duplicados.empty:
+        with st.expander(f"📑 {duplicados['hash'].nunique()} extratos com o mesmo conteúdo em mais de um caminho"):
+            st.dataframe(duplicados[['caminho', 'tamanho']].assign(grupo=duplicados['hash'].factorize()[0] + 1), hide_index=True)
 
 #----------------------------------
 # Botão para iniciar a cópia dos arquivos
@@ -66,9 +104,8 @@ with col2:
             df = pd.read_excel(caminho_excel, sheet_name='ROYALTY')
             df_mes = df[df[coluna_mes_pgto] == mes].dropna(subset=[coluna_caminho])
 
-            # Iterar sobre o DataFrame e copiar os arquivos
-            df_mes.apply(copiar_arquivos, axis=1)
-            st.success("Processo de cópia concluído!")
+            # Copiar os arquivos de todas as linhas do mês
+            copiar_arquivos(listar_copias(df_mes))
         except FileNotFoundError:
             st.error("O arquivo Excel especificado não foi encontrado.")
         except Exception as e:
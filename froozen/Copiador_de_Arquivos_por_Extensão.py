@@ -1,6 +1,7 @@
 import os
-import shutil
 import streamlit as st
+from utils.copia import MAX_WORKERS_COPIA, VarreduraArquivos, copiar_em_paralelo, formatar_bytes
+from utils.manifesto import manifesto_padrao
 
 #----------------------------------
 # Copiador por Extensão
@@ -24,6 +25,7 @@ def clean_path(path):
 #----------------------------------
 source_path = clean_path(st.text_input('Caminho para a pasta mãe'))  # O caminho da pasta mãe
 output_file_path = clean_path(st.text_input('Caminho para a pasta de saída'))  # O caminho onde o arquivo processado será salvo
+varredura_paralela = st.checkbox('Varrer as subpastas em paralelo', value=True, help="Uma leitura por subpasta do primeiro nível ao mesmo tempo (mais rápido em pastas de rede)")
 
 #----------------------------------
 # Função para copiar os arquivos
@@ -42,43 +44,46 @@ def copiar_arquivos(source_path, output_file_path):
             st.error(f"Erro ao criar a pasta de destino: {e}")
             return
     
-    arquivos_copiados = 0
-    arquivos_falha = 0
-    arquivos_encontrados = False
-    lista_arquivos = []
+    # Varredura única da pasta mãe; as cópias começam enquanto ela continua
+    varredura = VarreduraArquivos(source_path, [extensao], ignorar=[output_file_path], paralelo=varredura_paralela)
+    tarefas = ((caminho, os.path.join(output_file_path, os.path.basename(caminho))) for caminho in varredura)
     
-    # Inicializa o progresso
-    num_arquivos = sum([len(files) for r, d, files in os.walk(source_path)])
     progress = st.progress(0)
-    progresso_atual = 0
+    status = st.empty()
     
-    # Percorre o diretório de origem e suas subpastas
-    for root, dirs, files in os.walk(source_path):
-        for file in files:
-            if file.endswith(extensao):
-                arquivos_encontrados = True
-                caminho_completo = os.path.join(root, file)
-                destino_completo = os.path.join(output_file_path, file)
-                
-                try:
-                    shutil.copy2(caminho_completo, destino_completo)
-                    arquivos_copiados += 1
-                    lista_arquivos.append(f"Arquivo copiado: {file}")
-                except Exception as e:
-                    arquivos_falha += 1
-                    lista_arquivos.append(f"Erro ao copiar {file}: {e}")
-            
-            progresso_atual += 1
-            progress.progress(progresso_atual / num_arquivos)
+    def ao_progredir(resumo):
+        # Enquanto a varredura não termina, o total é estimado pelas subpastas já lidas
+        total = max(varredura.total_estimado(), resumo.enviados, 1)
+        progresso = resumo.concluidos / total
+        progress.progress(progresso if varredura.concluida else min(progresso, 0.99))
+        texto_total = f"{total}" if varredura.concluida else f"~{total} (varrendo: {varredura.pastas_visitadas} pastas)"
+        status.text(
+            f"{resumo.concluidos}/{texto_total} arquivos · {resumo.copiados} copiados · "
+            f"{resumo.ignorados} já atualizados · {formatar_bytes(resumo.vazao)}/s"
+        )
+    
+    resumo = copiar_em_paralelo(tarefas, max_workers=MAX_WORKERS_COPIA, ao_progredir=ao_progredir, manifesto=manifesto_padrao())
+    progress.progress(1.0)
+    
+    lista_arquivos = [f"Arquivo não encontrado: {os.path.basename(caminho)}" for caminho in resumo.nao_encontrados]
+    lista_arquivos += [f"Erro ao copiar {os.path.basename(caminho)}: {erro}" for caminho, erro in resumo.falhas]
+    lista_arquivos += [f"Mesmo nome de outro arquivo, não copiado: {caminho}" for caminho, _ in resumo.conflitos]
+    lista_arquivos += [f"Pasta não lida: {pasta}: {erro}" for pasta, erro in varredura.erros]
+    arquivos_falha = len(resumo.nao_encontrados) + len(resumo.falhas)
     
     # Verifica se nenhum arquivo foi encontrado
-    if not arquivos_encontrados:
+    if not varredura.encontrados:
         st.warning(f"Não há arquivos com a extensão {extensao} na pasta mãe.")
     else:
         # Exibe o resumo da operação
-        st.success(f"Cópia concluída: {arquivos_copiados} arquivos copiados.")
+        st.success(
+            f"Cópia concluída: {resumo.copiados} arquivos copiados ({formatar_bytes(resumo.bytes_copiados)} em {resumo.segundos:.1f}s), "
+            f"{resumo.ignorados} já estavam atualizados. {varredura.arquivos_vistos} arquivos verificados em {varredura.pastas_visitadas} pastas."
+        )
         if arquivos_falha > 0:
             st.warning(f"{arquivos_falha} arquivos não puderam ser copiados.")
+        if resumo.conflitos:
+            st.warning(f"{len(resumo.conflitos)} arquivos têm o mesmo nome de outro já copiado e foram ignorados (vale o primeiro em ordem alfabética de pastas).")
         
         # Adiciona CSS customizado para ajustar o layout do expander
         st.markdown(
@@ -93,10 +98,11 @@ def copiar_arquivos(source_path, output_file_path):
             """, unsafe_allow_html=True
         )
         
-        # Exibe a lista de arquivos copiados dentro de um expander com scroll
-        with st.expander("Clique para ver os detalhes dos arquivos copiados"):
-            for arquivo in lista_arquivos:
-                st.write(arquivo)
+        # Exibe a lista de arquivos não copiados dentro de um expander com scroll
+        if lista_arquivos:
+            with st.expander("Clique para ver os detalhes dos arquivos não copiados"):
+                for arquivo in lista_arquivos:
+                    st.write(arquivo)
 
 #----------------------------------
 # Centraliza apenas o botão
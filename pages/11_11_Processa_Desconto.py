@@ -1,113 +1,197 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import hashlib
 from io import BytesIO
 
-def create_download_section(df_processed, original_filename):
+from utils.descontos import (
+    aplicar_percentual,
+    aplicar_valor,
+    linhas_ajuste,
+    tabela_valores,
+    totais,
+)
+from utils.formato_br import estilo_br
+
+# Linhas do arquivo processado exibidas na página (o arquivo completo vai para o download)
+LINHAS_PREVIEW = 20
+
+def load_file(uploaded_file):
+    """
+    Arquivo carregado em cache na sessão pelo conteúdo: o original é lido
+    uma vez e a cópia de trabalho (onde os descontos são aplicados) é feita
+    uma única vez por arquivo, não a cada clique.
+    """
+    content = uploaded_file.getvalue()
+    key = (uploaded_file.name, hashlib.sha256(content).hexdigest())
+    state = st.session_state.get('desconto')
+    if state is None or state['chave'] != key:
+        if uploaded_file.name.endswith('.csv'):
+            df = pd.read_csv(BytesIO(content))
+        else:
+            df = pd.read_excel(BytesIO(content))
+        state = {
+            'chave': key,
+            'original': df,
+            'processado': df.copy(),
+            'alteradas': [],
+            'ajustes': None,
+            'colunas': [],
+            'mensagem': None,
+            'download': None,
+        }
+        st.session_state['desconto'] = state
+    return state
+
+def reset_processed(state):
+    """Desfaz a ação anterior: só as colunas alteradas voltam do original."""
+    if state['alteradas']:
+        state['processado'][state['alteradas']] = state['original'][state['alteradas']]
+    state['alteradas'] = []
+    state['ajustes'] = None
+    state['download'] = None
+
+def export_frame(state):
+    """Arquivo final: as linhas de ajuste só são juntadas aqui."""
+    if state['ajustes'] is None or state['ajustes'].empty:
+        return state['processado']
+    return pd.concat([state['processado'], state['ajustes']], ignore_index=True)
+
+def build_download(df_processed, original_filename):
+    if original_filename.endswith('.csv'):
+        return df_processed.to_csv(index=False).encode('utf-8')
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df_processed.to_excel(writer, index=False, sheet_name='Processado')
+    return buffer.getvalue()
+
+def create_download_section(state, original_filename):
     """Função para criar a seção de download"""
     st.subheader("Download do Arquivo Processado")
-    
+
+    # Gerado uma vez por resultado; reruns da página reaproveitam os bytes
+    if state['download'] is None:
+        state['download'] = build_download(export_frame(state), original_filename)
+
     if original_filename.endswith('.csv'):
-        # Para CSV
-        csv_data = df_processed.to_csv(index=False)
         st.download_button(
             label="📥 Download CSV Processado",
-            data=csv_data,
+            data=state['download'],
             file_name=f"processado_{original_filename}",
             mime="text/csv"
         )
     else:
-        # Para Excel
-        buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df_processed.to_excel(writer, index=False, sheet_name='Processado')
-        
         st.download_button(
             label="📥 Download Excel Processado",
-            data=buffer.getvalue(),
+            data=state['download'],
             file_name=f"processado_{original_filename}",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
 
-def show_comparison_and_download(df_original, df_processed, selected_column, filename):
+def show_comparison_and_download(state, filename):
     """Função para mostrar comparação e seção de download"""
+    colunas = state['colunas']
+
     # Mostrar comparação
     st.subheader("Comparação dos Resultados")
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        st.write("**Total Original:**")
-        st.write(f"Total: {df_original[selected_column].sum():,.2f}")
-    
-    with col2:
-        st.write("**Total Processado:**")
-        st.write(f"Total: {df_processed[selected_column].sum():,.2f}")
-        difference = df_original[selected_column].sum() - df_processed[selected_column].sum()
-        st.write(f"Diferença: {difference:,.2f}")
-    
-    # Exibir dados processados
+    comparison = pd.DataFrame({
+        "Total Original": totais(state['original'], colunas),
+        "Total Processado": totais(state['processado'], colunas, state['ajustes']),
+    })
+    comparison["Diferença"] = comparison["Total Original"] - comparison["Total Processado"]
+    st.dataframe(estilo_br(comparison), use_container_width=True)
+
+    # Só o início do arquivo; o arquivo completo vai para o download
     st.subheader("Dados Processados")
-    st.dataframe(df_processed, use_container_width=True)
-    
+    st.caption(f"Primeiras {LINHAS_PREVIEW} linhas de {len(state['processado'])}.")
+    st.dataframe(state['processado'].head(LINHAS_PREVIEW), use_container_width=True)
+    if state['ajustes'] is not None and not state['ajustes'].empty:
+        st.write("**Linhas de ajuste:**")
+        st.dataframe(state['ajustes'], use_container_width=True, hide_index=True)
+
     # Download do arquivo processado
-    create_download_section(df_processed, filename)
+    create_download_section(state, filename)
+
+def edit_values(df, selected_columns, group_column, default_value, label, key):
+    """
+    Valores por grupo e por coluna, partindo de `default_value`. Com uma
+    coluna e sem grupo, é o próprio valor informado.
+    """
+    values = tabela_valores(df, selected_columns, group_column, default_value)
+    if group_column is None and len(selected_columns) == 1:
+        return values
+    st.caption(f"{label} por {'grupo e ' if group_column else ''}coluna (edite para valores diferentes):")
+    # A chave muda com a configuração para a tabela recomeçar do valor padrão
+    return st.data_editor(
+        values,
+        use_container_width=True,
+        key=f"{key}_{group_column}_{'|'.join(selected_columns)}_{default_value}",
+    )
 
 def main():
     st.title("Processador de Descontos")
     st.divider()
-    
+
     # Upload de arquivo
     uploaded_file = st.file_uploader(
         "Selecione o arquivo de royalties",
         type=['csv', 'xlsx', 'xls'],
         help="Formatos suportados: CSV, Excel (.xlsx, .xls)"
     )
-    
+
     if uploaded_file is not None:
         # Leitura do arquivo
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
-            
+            state = load_file(uploaded_file)
+            df = state['original']
+
             st.success(f"Arquivo carregado com sucesso! {len(df)} linhas encontradas.")
-            
+
             # Exibir preview dos dados
             st.subheader("Preview dos Dados")
             st.dataframe(df.head(), use_container_width=True)
-            
+
             # Identificar colunas numéricas
             numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
-            
+
             if not numeric_columns:
                 st.warning("Nenhuma coluna numérica encontrada no arquivo.")
                 return
             st.divider()
 
-            # Seleção da coluna para cálculos
+            # Seleção das colunas para cálculos
             st.subheader("Configuração dos Cálculos")
-            selected_column = st.selectbox(
-                "Selecione a coluna numérica para os cálculos:",
-                numeric_columns
+            selected_columns = st.multiselect(
+                "Selecione as colunas numéricas para os cálculos:",
+                numeric_columns,
+                default=numeric_columns[:1]
+            )
+
+            text_columns = df.select_dtypes(include=['object', 'string']).columns.tolist()
+            group_options = ["(sem grupo)"] + [c for c in df.columns if c not in numeric_columns]
+            group_choice = st.selectbox(
+                "Aplicar por grupo (ex.: moeda, catálogo):",
+                group_options,
+                help="Com um grupo, cada grupo pode ter o seu percentual ou valor"
             )
-            
-            if selected_column:
-                # Mostrar soma da coluna selecionada
-                total_sum = df[selected_column].sum()
-                st.write(f"Total da coluna **{selected_column}**: {total_sum:,.2f}")
-                
+            group_column = None if group_choice == "(sem grupo)" else group_choice
+
+            if selected_columns:
+                # Mostrar soma das colunas selecionadas
+                for column, total_sum in totais(df, selected_columns).items():
+                    st.write(f"Total da coluna **{column}**: {total_sum:,.2f}")
+
                 # Funcionalidade de desconto - ESTRUTURA UNIFICADA
                 st.subheader("Desconto Proporcional")
-                
+
                 discount_type = st.radio(
                     "Tipo de desconto:",
                     ["Percentual", "Valor específico", "Adicionar Linha de Desconto"]
                 )
-                
+
                 if discount_type == "Percentual":
                     st.caption("Aplica um percentual de desconto em cada linha individualmente")
-                    
+
                     discount_value = st.number_input(
                         "Percentual de desconto (%):",
                         min_value=0.0,
@@ -116,19 +200,22 @@ def main():
                         step=0.1,
                         format="%.2f"
                     )
-                    
+                    percentages = edit_values(df, selected_columns, group_column, discount_value, "Percentual (%)", "desconto_percentual")
+
                     # Botão para aplicar desconto percentual
                     if st.button("Aplicar Desconto", type="primary"):
-                        df_processed = df.copy()
-                        df_processed[selected_column] = df[selected_column] * (1 - discount_value/100)
-                        st.success(f"Desconto de {discount_value}% aplicado com sucesso!")
-                        
-                        # Mostrar comparação e download
-                        show_comparison_and_download(df, df_processed, selected_column, uploaded_file.name)
-                
+                        if ((percentages < 0) | (percentages > 100)).any().any():
+                            st.error("Os percentuais devem estar entre 0 e 100.")
+                        else:
+                            reset_processed(state)
+                            aplicar_percentual(state['processado'], selected_columns, percentages, group_column)
+                            state['alteradas'] = list(selected_columns)
+                            state['colunas'] = list(selected_columns)
+                            state['mensagem'] = f"Desconto de {discount_value}% aplicado com sucesso!" if (percentages == discount_value).all().all() else "Descontos percentuais aplicados com sucesso!"
+
                 elif discount_type == "Valor específico":
-                    st.caption("Distribui um valor fixo de desconto proporcionalmente entre todas as linhas")
-                    
+                    st.caption("Distribui um valor fixo de desconto proporcionalmente entre todas as linhas (de cada grupo)")
+
                     discount_value = st.number_input(
                         "Valor total de desconto:",
                         min_value=0.0,
@@ -136,26 +223,29 @@ def main():
                         step=0.01,
                         format="%.2f"
                     )
-                    
+                    amounts = edit_values(df, selected_columns, group_column, discount_value, "Valor", "desconto_valor")
+
                     # Botão para aplicar desconto por valor específico
                     if st.button("Aplicar Desconto", type="primary"):
-                        total_original = df[selected_column].sum()
-                        if total_original > 0:
-                            df_processed = df.copy()
-                            proportion_factor = (total_original - discount_value) / total_original
-                            df_processed[selected_column] = df[selected_column] * proportion_factor
-                            st.success(f"Desconto de {discount_value:,.2f} aplicado proporcionalmente!")
-                            
-                            # Mostrar comparação e download
-                            show_comparison_and_download(df, df_processed, selected_column, uploaded_file.name)
+                        if (amounts < 0).any().any():
+                            st.error("Os valores de desconto não podem ser negativos.")
                         else:
-                            st.error("Não é possível aplicar desconto: soma da coluna é zero ou negativa.")
-                
+                            reset_processed(state)
+                            try:
+                                # Desconto repartido proporcionalmente pelos maiores restos:
+                                # a soma dos descontos das linhas é exatamente o valor informado
+                                aplicar_valor(state['processado'], selected_columns, amounts, group_column)
+                                state['alteradas'] = list(selected_columns)
+                                state['colunas'] = list(selected_columns)
+                                state['mensagem'] = f"Desconto de {amounts.to_numpy().sum():,.2f} aplicado proporcionalmente!"
+                            except ValueError as e:
+                                state['colunas'] = []
+                                st.error(f"Não é possível aplicar desconto: {e}")
+
                 elif discount_type == "Adicionar Linha de Desconto":
-                    st.caption("Adiciona uma nova linha com ajuste (mantém valores originais intactos)")
-                    
+                    st.caption("Adiciona uma linha com ajuste por grupo (mantém valores originais intactos)")
+
                     # Seleção da coluna para descrição
-                    text_columns = df.select_dtypes(include=['object', 'string']).columns.tolist()
                     if not text_columns:
                         st.warning("Nenhuma coluna de texto encontrada para a descrição.")
                     else:
@@ -163,13 +253,13 @@ def main():
                             "Selecione a coluna para a descrição do ajuste:",
                             text_columns
                         )
-                        
+
                         # Tipo de ajuste
                         adjustment_type = st.radio(
                             "Tipo de ajuste:",
                             ["Desconto (reduz o total)", "Ajuste positivo (aumenta o total)"]
                         )
-                        
+
                         # Campos para a nova linha
                         col1, col2 = st.columns(2)
                         with col1:
@@ -178,7 +268,7 @@ def main():
                                 value="Desconto aplicado" if adjustment_type.startswith("Desconto") else "Ajuste positivo",
                                 help="Texto que aparecerá na linha de ajuste"
                             )
-                        
+
                         with col2:
                             adjustment_amount = st.number_input(
                                 "Valor do ajuste:",
@@ -188,40 +278,36 @@ def main():
                                 format="%.2f",
                                 help="Digite sempre valor positivo - o sinal será aplicado automaticamente"
                             )
-                        
+                        adjustments = edit_values(df, selected_columns, group_column, adjustment_amount, "Valor do ajuste", "desconto_ajuste")
+
                         # Botão para adicionar linha de ajuste
                         if st.button("Aplicar Desconto", type="primary"):
-                            if adjustment_amount > 0 and adjustment_description.strip():
-                                df_processed = df.copy()
-                                
-                                # Determinar o valor final com sinal correto
-                                final_value = -adjustment_amount if adjustment_type.startswith("Desconto") else adjustment_amount
-                                
-                                # Criar nova linha
-                                new_row = {}
-                                for col in df_processed.columns:
-                                    if col == selected_column:
-                                        new_row[col] = final_value
-                                    elif col == description_column:
-                                        new_row[col] = adjustment_description
-                                    else:
-                                        new_row[col] = ""  # Células vazias para outras colunas
-                                
-                                # Adicionar a nova linha
-                                df_processed = pd.concat([df_processed, pd.DataFrame([new_row])], ignore_index=True)
-                                
+                            if (adjustments > 0).any().any() and not (adjustments < 0).any().any() and adjustment_description.strip():
+                                reset_processed(state)
+
+                                # Sinal aplicado conforme o tipo de ajuste
+                                sign = -1 if adjustment_type.startswith("Desconto") else 1
+                                state['ajustes'] = linhas_ajuste(
+                                    df, selected_columns, adjustments, description_column,
+                                    adjustment_description, sign, group_column
+                                )
+                                state['colunas'] = list(selected_columns)
+
                                 # Mensagem de sucesso personalizada
                                 action_text = "Desconto" if adjustment_type.startswith("Desconto") else "Ajuste positivo"
-                                st.success(f"{action_text} adicionado: {adjustment_description} - R$ {adjustment_amount:,.2f}")
-                                
-                                # Mostrar comparação e download
-                                show_comparison_and_download(df, df_processed, selected_column, uploaded_file.name)
-                            
+                                state['mensagem'] = f"{action_text} adicionado: {adjustment_description} - R$ {adjustments.to_numpy().sum():,.2f} ({len(state['ajustes'])} linha(s))"
+
                             else:
                                 st.error("Por favor, preencha a descrição e um valor maior que zero.")
-        
+
+            # Resultado da última ação, mantido entre reruns da página
+            if state['colunas']:
+                if state['mensagem']:
+                    st.success(state['mensagem'])
+                show_comparison_and_download(state, uploaded_file.name)
+
         except Exception as e:
             st.error(f"Erro ao processar o arquivo: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,8 +1,19 @@
 import streamlit as st
 import pandas as pd
+import hashlib
 import io
 from typing import Dict, List, Set
 
+from utils.cambio import (
+    COLUNAS_PERIODO,
+    converter_colunas,
+    periodo_do_relatorio,
+    periodo_valido,
+    salvar_taxas,
+    taxas_das_linhas,
+    taxas_do_periodo,
+)
+
 # Configuração da página
 st.set_page_config(
     page_title="NN App",
@@ -127,50 +138,9 @@ def processar_planilha(df: pd.DataFrame, mapeamento: Dict[str, str], nome_planil
 
 def processar_youtube_channels(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Processa a planilha Youtube Channels mantendo estrutura original e convertendo valores"""
-    df_youtube = df.copy()
-    
-    # Renomeia as colunas originais primeiro
-    if 'Gross' in df_youtube.columns:
-        df_youtube = df_youtube.rename(columns={'Gross': 'Onerpm Gross'})
-    if 'Net' in df_youtube.columns:
-        df_youtube = df_youtube.rename(columns={'Net': 'Onerpm Net'})
-    
-    # Adiciona colunas de conversão para BRL se tiverem as colunas necessárias
-    if 'Onerpm Gross' in df_youtube.columns and 'Currency' in df_youtube.columns:
-        def converter_gross_para_brl(row):
-            if pd.isna(row['Onerpm Gross']) or pd.isna(row['Currency']):
-                return None
-            
-            moeda = row['Currency']
-            valor_gross = row['Onerpm Gross']
-            
-            if moeda == 'BRL':
-                return valor_gross
-            elif moeda in taxas_cambio:
-                return valor_gross * taxas_cambio[moeda]
-            else:
-                return None
-        
-        df_youtube['Gross'] = df_youtube.apply(converter_gross_para_brl, axis=1)
-    
-    if 'Onerpm Net' in df_youtube.columns and 'Currency' in df_youtube.columns:
-        def converter_net_para_brl(row):
-            if pd.isna(row['Onerpm Net']) or pd.isna(row['Currency']):
-                return None
-            
-            moeda = row['Currency']
-            valor_net = row['Onerpm Net']
-            
-            if moeda == 'BRL':
-                return valor_net
-            elif moeda in taxas_cambio:
-                return valor_net * taxas_cambio[moeda]
-            else:
-                return None
-        
-        df_youtube['Net'] = df_youtube.apply(converter_net_para_brl, axis=1)
-    
-    return df_youtube
+    # Renomeia as colunas originais e converte para BRL
+    df_youtube = df.rename(columns={'Gross': 'Onerpm Gross', 'Net': 'Onerpm Net'})
+    return converter_colunas(df_youtube, {'Onerpm Gross': 'Gross', 'Onerpm Net': 'Net'}, taxas_cambio)
 
 def processar_shares_out(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Processa os dados de Share Out separadamente"""
@@ -184,21 +154,7 @@ def processar_shares_out(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd
         return pd.DataFrame()
     
     # Calcula Net BRL para Share Out
-    def converter_para_brl(row):
-        if pd.isna(row['Net']) or pd.isna(row['Currency']):
-            return None
-        
-        moeda = row['Currency']
-        valor_net = row['Net']
-        
-        if moeda == 'BRL':
-            return valor_net
-        elif moeda in taxas_cambio:
-            return valor_net * taxas_cambio[moeda]
-        else:
-            return None
-    
-    df_out['Net BRL'] = df_out.apply(converter_para_brl, axis=1)
+    df_out = converter_colunas(df_out, {'Net': 'Net BRL'}, taxas_cambio)
     
     # Seleciona e reordena as colunas conforme solicitado
     colunas_share_out = ['Receiver Name', 'Net', 'Currency', 'Net BRL', 'Artists', 'Title']
@@ -208,45 +164,11 @@ def processar_shares_out(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd
 
 def calcular_gross_brl(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Calcula a coluna Gross BRL baseada nas taxas de câmbio"""
-    df = df.copy()
-    
-    def converter_gross_para_brl(row):
-        if pd.isna(row['Gross']) or pd.isna(row['Currency']):
-            return None
-        
-        moeda = row['Currency']
-        valor_gross = row['Gross']
-        
-        if moeda == 'BRL':
-            return valor_gross
-        elif moeda in taxas_cambio:
-            return valor_gross * taxas_cambio[moeda]
-        else:
-            return None
-    
-    df['Gross BRL'] = df.apply(converter_gross_para_brl, axis=1)
-    return df
+    return converter_colunas(df.copy(), {'Gross': 'Gross BRL'}, taxas_cambio)
 
 def calcular_net_brl(df: pd.DataFrame, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Calcula a coluna Net BRL baseada nas taxas de câmbio"""
-    df = df.copy()
-    
-    def converter_para_brl(row):
-        if pd.isna(row['Net']) or pd.isna(row['Currency']):
-            return None
-        
-        moeda = row['Currency']
-        valor_net = row['Net']
-        
-        if moeda == 'BRL':
-            return valor_net
-        elif moeda in taxas_cambio:
-            return valor_net * taxas_cambio[moeda]
-        else:
-            return None
-    
-    df['Net BRL'] = df.apply(converter_para_brl, axis=1)
-    return df
+    return converter_colunas(df.copy(), {'Net': 'Net BRL'}, taxas_cambio)
 
 def aplicar_desconto_proporcional(df: pd.DataFrame, taxa_usd: float, taxa_brl: float, taxas_cambio: Dict[str, float]) -> pd.DataFrame:
     """Aplica desconto proporcional das taxas bancárias na coluna Net"""
@@ -260,13 +182,11 @@ def aplicar_desconto_proporcional(df: pd.DataFrame, taxa_usd: float, taxa_brl: f
     total_net_brl = df['Net BRL'].sum()
     
     if total_net_brl > 0:
-        # Calcula o desconto proporcional para cada linha
-        df['Net'] = df.apply(lambda row: 
-            row['Net'] - (row['Net BRL'] / total_net_brl * total_taxas_brl / taxas_cambio.get(row['Currency'], 1.0))
-            if pd.notna(row['Net']) and pd.notna(row['Net BRL']) and pd.notna(row['Currency'])
-            else row['Net'],
-            axis=1
-        )
+        # Desconto proporcional de cada linha, em BRL, convertido de volta para a moeda da linha
+        taxas = taxas_das_linhas(df, taxas_cambio)
+        desconto = df['Net BRL'] / total_net_brl * total_taxas_brl / taxas
+        com_desconto = df['Net'].notna() & desconto.notna()
+        df.loc[com_desconto, 'Net'] = df.loc[com_desconto, 'Net'] - desconto[com_desconto]
         
         # Recalcula Net BRL após o desconto
         df = calcular_net_brl(df, taxas_cambio)
@@ -412,23 +332,28 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file is not None:
     try:
-        # Lê todas as abas do arquivo
-        with st.spinner("Carregando planilhas..."):
-            excel_file = pd.ExcelFile(uploaded_file)
-            
-            # Verifica se as abas necessárias existem
-            abas_necessarias = ["Masters", "Youtube Channels", "Shares In & Out"]
-            abas_existentes = excel_file.sheet_names
-            
-            st.info(f"Abas encontradas: {', '.join(abas_existentes)}")
-            
-            # Carrega as planilhas
-            dfs = {}
-            for aba in abas_necessarias:
-                if aba in abas_existentes:
-                    dfs[aba] = pd.read_excel(uploaded_file, sheet_name=aba)
-                else:
-                    st.warning(f"⚠️ Aba '{aba}' não encontrada no arquivo")
+        # Lê todas as abas do arquivo uma única vez por upload (reruns reaproveitam)
+        hash_arquivo = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        carregado = st.session_state.get('onerpm_planilhas')
+        if carregado is None or carregado['hash'] != hash_arquivo:
+            with st.spinner("Carregando planilhas..."):
+                excel_file = pd.ExcelFile(io.BytesIO(uploaded_file.getvalue()))
+                abas_existentes = excel_file.sheet_names
+                
+                # Carrega as planilhas necessárias do mesmo ExcelFile
+                abas_necessarias = ["Masters", "Youtube Channels", "Shares In & Out"]
+                carregado = {
+                    'hash': hash_arquivo,
+                    'abas_existentes': abas_existentes,
+                    'abas_faltando': [aba for aba in abas_necessarias if aba not in abas_existentes],
+                    'dfs': {aba: excel_file.parse(aba) for aba in abas_necessarias if aba in abas_existentes},
+                }
+            st.session_state['onerpm_planilhas'] = carregado
+        
+        st.info(f"Abas encontradas: {', '.join(carregado['abas_existentes'])}")
+        for aba in carregado['abas_faltando']:
+            st.warning(f"⚠️ Aba '{aba}' não encontrada no arquivo")
+        dfs = carregado['dfs']
         st.divider()
         if len(dfs) > 0:
             # Identifica moedas
@@ -436,6 +361,16 @@ if uploaded_file is not None:
             st.subheader("💱 Configuração de Taxas de Câmbio")
             st.write(f"Moedas encontradas: {', '.join(sorted(moedas_encontradas))}")
             
+            # Taxas salvas para o período são usadas como valor inicial dos campos
+            periodo_taxas = st.text_input(
+                "Período das taxas (AAAA-MM)",
+                value=periodo_do_relatorio(dfs.values(), COLUNAS_PERIODO),
+                help="As taxas informadas ficam salvas para este período e são sugeridas nos próximos processamentos. Linhas de outros meses (Accounted Date) usam as taxas salvas para o seu próprio período"
+            ).strip()
+            taxas_salvas = taxas_do_periodo(periodo_taxas)
+            if taxas_salvas:
+                st.caption(f"Taxas salvas para {periodo_taxas}: {', '.join(sorted(taxas_salvas))}")
+            
             # Cria inputs para taxas de câmbio
             taxas_cambio = {}
             col1, col2, col3 = st.columns(3)
@@ -454,22 +389,22 @@ if uploaded_file is not None:
             for i, moeda in enumerate(sorted(moedas_encontradas)):
                 if moeda != 'BRL':  # BRL não precisa de conversão
                     col = [col1, col2, col3][i % 3]
-                    with col1:
-                        valor_padrao = valores_padrao.get(moeda, 1.0)
+                    with col:
+                        valor_padrao = taxas_salvas.get(moeda, valores_padrao.get(moeda, 1.0))
                         taxa = st.number_input(
                             f"Taxa {moeda} → BRL:",
                             min_value=0.0,
                             value=valor_padrao,
                             step=0.01,
                             format="%.4f",
-                            key=f"taxa_{moeda}",
+                            key=f"taxa_{moeda}_{periodo_taxas}",
                             help=f"Taxa de conversão de {moeda} para Real brasileiro"
                         )
                         taxas_cambio[moeda] = taxa
                 else:
                     taxas_cambio[moeda] = 1.0
             
-                    st.divider()
+            st.divider()
             
             # Inputs para taxas bancárias
             st.subheader("🏦 Taxas Bancárias")
@@ -499,6 +434,10 @@ if uploaded_file is not None:
             
             # Botão para processar
             if st.button("Processar e Gerar Planilhas", type="primary"):
+                if not periodo_valido(periodo_taxas):
+                    st.error("Informe o período das taxas no formato AAAA-MM")
+                    st.stop()
+                salvar_taxas(periodo_taxas, taxas_cambio)
                 with st.spinner("Processando dados..."):
                     # Extrai nome do arquivo com e sem extensão
                     nome_arquivo_completo = uploaded_file.name if uploaded_file.name else "arquivo.xlsx"
@@ -7,6 +7,8 @@ import streamlit as st
 import zipfile
 import xml.etree.ElementTree as ET
 from collections import defaultdict, Counter
+from utils.copia import chave_caminho
+from utils.manifesto import manifesto_padrao
 
 st.set_page_config(page_title="Cruzamento Royalties x Catálogo", layout="wide")
 
@@ -129,16 +131,31 @@ def build_lookup(df_base: pd.DataFrame, key_col: str) -> dict:
     return grouped
 
 
+def avisar_relatorio_duplicado(file_path: str):
+    """
+    Avisa se o mesmo relatório (mesmo hash) já foi visto em outro caminho,
+    como um extrato repetido em outra pasta de catálogo.
+    """
+    duplicados = manifesto_padrao().duplicados([file_path])
+    outros = [c for c in duplicados["caminho"] if chave_caminho(c) != chave_caminho(file_path)]
+    if outros:
+        st.warning("⚠️ O mesmo relatório também está em:\n" + "\n".join(f"`{c}`" for c in outros))
+
+
 # ---------------------------
 # Helpers ABRAMUS
 # ---------------------------
-def read_ecad_report(file_path: str) -> pd.DataFrame:
+def read_ecad_report(file_path) -> pd.DataFrame:
     """
     Lê o relatório ECAD (CSV com preâmbulo) detectando automaticamente
     a linha do header e usando separador ';' e encoding ISO-8859-1.
+    Aceita o caminho ou o arquivo binário já aberto (Manifesto.ler).
     """
-    with open(file_path, 'rb') as f:
-        raw_bytes = f.read()
+    if hasattr(file_path, 'read'):
+        raw_bytes = file_path.read()
+    else:
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
     
     text = raw_bytes.decode("ISO-8859-1", errors="replace")
     lines = text.splitlines()
@@ -183,11 +200,14 @@ def get_available_periods_abramus() -> list:
         7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"
     }
     
+    # Listagens das pastas vêm do manifesto enquanto as pastas não mudam
+    manifesto = manifesto_padrao()
+    
     # Percorre as pastas de ano
-    for ano_folder in sorted(os.listdir(CAMINHO_ABRAMUS), reverse=True):
+    for ano_folder, eh_pasta in sorted(manifesto.listar_pasta(CAMINHO_ABRAMUS), reverse=True):
         ano_path = os.path.join(CAMINHO_ABRAMUS, ano_folder)
         
-        if not os.path.isdir(ano_path):
+        if not eh_pasta:
             continue
         
         # Tenta extrair o ano da pasta
@@ -197,14 +217,14 @@ def get_available_periods_abramus() -> list:
             continue
         
         # Percorre as pastas de mês dentro do ano
-        for mes_folder in sorted(os.listdir(ano_path)):
+        for mes_folder, eh_pasta in manifesto.listar_pasta(ano_path):
             mes_path = os.path.join(ano_path, mes_folder)
             
-            if not os.path.isdir(mes_path):
+            if not eh_pasta:
                 continue
             
             # Procura arquivo CSV dentro da pasta do mês
-            csv_files = [f for f in os.listdir(mes_path) if f.endswith('.csv')]
+            csv_files = [f for f, eh_pasta in manifesto.listar_pasta(mes_path) if not eh_pasta and f.endswith('.csv')]
             
             if not csv_files:
                 continue
@@ -233,10 +253,10 @@ def get_available_periods_abramus() -> list:
 # ---------------------------
 # Helpers SONY
 # ---------------------------
-def read_excel_xml(file_path: str) -> pd.DataFrame:
+def read_excel_xml(file_path) -> pd.DataFrame:
     """
-    Lê arquivo Excel possivelmente corrompido via XML.
-    Retorna DataFrame com os dados.
+    Lê arquivo Excel possivelmente corrompido via XML (caminho ou arquivo
+    binário já aberto). Retorna DataFrame com os dados.
     """
     with zipfile.ZipFile(file_path, 'r') as zip_ref:
         # Ler strings compartilhadas
@@ -323,11 +343,14 @@ def get_available_periods_sony() -> list:
         7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"
     }
     
+    # Listagens das pastas vêm do manifesto enquanto as pastas não mudam
+    manifesto = manifesto_padrao()
+    
     # Percorre as pastas de ano
-    for ano_folder in sorted(os.listdir(CAMINHO_SONY), reverse=True):
+    for ano_folder, eh_pasta in sorted(manifesto.listar_pasta(CAMINHO_SONY), reverse=True):
         ano_path = os.path.join(CAMINHO_SONY, ano_folder)
         
-        if not os.path.isdir(ano_path):
+        if not eh_pasta:
             continue
         
         try:
@@ -336,14 +359,14 @@ def get_available_periods_sony() -> list:
             continue
         
         # Percorre as pastas de mês
-        for mes_folder in sorted(os.listdir(ano_path)):
+        for mes_folder, eh_pasta in manifesto.listar_pasta(ano_path):
             mes_path = os.path.join(ano_path, mes_folder)
             
-            if not os.path.isdir(mes_path):
+            if not eh_pasta:
                 continue
             
             # Procura arquivo XLSX dentro da pasta do mês
-            xlsx_files = [f for f in os.listdir(mes_path) if f.endswith('.xlsx')]
+            xlsx_files = [f for f, eh_pasta in manifesto.listar_pasta(mes_path) if not eh_pasta and f.endswith('.xlsx')]
             
             if not xlsx_files:
                 continue
@@ -429,7 +452,9 @@ if fonte == "ABRAMUS":
                 df_base = normalize_catalog_column(df_base)
 
             with st.spinner("Carregando relatório ABRAMUS..."):
-                df_report = read_ecad_report(arquivo_selecionado)
+                # Leitura reaproveitada pelo manifesto enquanto o arquivo não muda
+                df_report, _ = manifesto_padrao().ler(arquivo_selecionado, read_ecad_report)
+                avisar_relatorio_duplicado(arquivo_selecionado)
 
             # Verifica colunas-chave
             if "CÓD. OBRA" not in df_base.columns:
@@ -803,7 +828,9 @@ elif fonte == "SONY":
                     st.stop()
 
             with st.spinner("Carregando relatório Sony..."):
-                df_report = read_excel_xml(arquivo_selecionado)
+                # Leitura reaproveitada pelo manifesto enquanto o arquivo não muda
+                df_report, _ = manifesto_padrao().ler(arquivo_selecionado, read_excel_xml)
+                avisar_relatorio_duplicado(arquivo_selecionado)
                 
                 if "Song No." not in df_report.columns:
                     st.error("❌ Relatório não contém a coluna 'Song No.'")
@@ -1,10 +1,23 @@
 import streamlit as st
 import pandas as pd
+import hashlib
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils.concatenacao import alinhar_colunas
+from utils.formato_br import parse_br
 
 st.title("Editor de Extratos Bancários")
+st.caption("Extratos Itaú (.xlsx) e Bradesco (.csv) do mês, consolidados em um único CSV.")
 
-banco = st.selectbox("Selecione o banco:", ["Itaú", "Bradesco"])
+# Linhas usadas quando o cabeçalho não é encontrado pelo conteúdo
+HEADER_ROW_ITAU = 9
+HEADER_LINE_BRADESCO = 2
+
+# Palavras que identificam colunas de valores (crédito, débito, valor)
+VALUE_KEYWORDS = ["créd", "déb", "cred", "deb", "valor"]
+
+BANK_BY_EXTENSION = {".xlsx": "Itaú", ".csv": "Bradesco"}
 
 def insert_cols_after_lancamento(df):
     cols = list(df.columns)
@@ -26,84 +39,170 @@ def drop_saldo_col(df):
             break
     return df
 
-def parse_br_number(series):
-    """Convert Brazilian number strings (1.234,56) to float."""
-    return (
-        series.str.strip()
-        .str.replace(".", "", regex=False)
-        .str.replace(",", ".", regex=False)
-        .pipe(pd.to_numeric, errors="coerce")
-    )
-
-# ─── ITAÚ ────────────────────────────────────────────────────────────────────
-if banco == "Itaú":
-    uploaded = st.file_uploader("Upload do extrato Itaú (.xlsx)", type=["xlsx"])
-    if uploaded:
-        raw = pd.read_excel(uploaded, header=None)
+def convert_value_columns(df):
+    """Parse the text value columns (crédito, débito, valor) in a single pass."""
+    cols = [c for c in df.columns if any(k in str(c).lower() for k in VALUE_KEYWORDS)]
+    if cols:
+        df[cols] = parse_br(df[cols])
+    return df
 
-        header_row = 9
-        headers = raw.iloc[header_row].tolist()
-        data = raw.iloc[header_row + 1:].reset_index(drop=True)
-        data.columns = headers
+def first_match(mask, default=None):
+    """Position of the first True in a boolean mask (default if none)."""
+    mask = pd.Series(mask).fillna(False).to_numpy(dtype=bool)
+    return int(mask.argmax()) if mask.any() else default
+
+def cut_at_total(df):
+    """Drop the first "Total" row in column A and everything below it."""
+    is_total = df.iloc[:, 0].astype(str).str.strip().str.lower().eq("total")
+    total_idx = first_match(is_total)
+    return df if total_idx is None else df.iloc[:total_idx].reset_index(drop=True)
+
+def standard_column(col):
+    """Same name for the same column in both banks ("data" / "Data", "valor (R$)" / "Valor (R$)")."""
+    low = str(col).strip().lower()
+    if low.startswith("data"):
+        return "Data"
+    if "lan" in low:
+        return "Lançamento"
+    if low.startswith("valor"):
+        return "Valor (R$)"
+    if "créd" in low or "cred" in low:
+        return "Crédito (R$)"
+    if "déb" in low or "deb" in low:
+        return "Débito (R$)"
+    return str(col).strip()
+
+def standardize_columns(df):
+    names = []
+    for col in df.columns:
+        name = standard_column(col)
+        names.append(name if name not in names else str(col).strip())
+    df.columns = names
+    return df
 
-        data = drop_saldo_col(data)
-        data = insert_cols_after_lancamento(data)
+def add_signed_value(df):
+    """Single "Valor (R$)" column for statements split into crédito/débito (débito always negative)."""
+    if "Valor (R$)" in df.columns or not {"Crédito (R$)", "Débito (R$)"} <= set(df.columns):
+        return df
+    credit, debit = df["Crédito (R$)"], df["Débito (R$)"]
+    value = credit.fillna(0) - debit.abs().fillna(0)
+    df.insert(df.columns.get_loc("Débito (R$)") + 1, "Valor (R$)", value.where(credit.notna() | debit.notna()))
+    return df
 
-        st.success("Arquivo processado com sucesso!")
-        st.dataframe(data.head(20))
+def finish(df):
+    df = df.dropna(how="all").reset_index(drop=True)
+    # Empty columns created by trailing separators
+    df = df.loc[:, ~(df.columns.astype(str).str.startswith("Unnamed") & df.isna().all().to_numpy())]
+    df = drop_saldo_col(df)
+    df = insert_cols_after_lancamento(df)
+    return add_signed_value(standardize_columns(df))
 
-        csv_bytes = data.to_csv(index=False, sep=";", encoding="utf-8-sig").encode("utf-8-sig")
-        st.download_button(
-            label="Baixar CSV",
-            data=csv_bytes,
-            file_name="extrato_itau.csv",
-            mime="text/csv",
-        )
+# ─── ITAÚ ────────────────────────────────────────────────────────────────────
+def read_itau(content):
+    """Returns (DataFrame, warning or None)."""
+    raw = pd.read_excel(io.BytesIO(content), header=None)
+
+    # Header row: one cell that is exactly "data" and one starting with "lançamento"
+    # (whole cells, so preamble rows such as "Lançamentos do período" don't match)
+    text = raw.apply(lambda col: col.astype(str).str.strip().str.lower())
+    is_header = text.eq("data").any(axis=1) & text.apply(lambda col: col.str.startswith(("lançamento", "lancamento"))).any(axis=1)
+    header_row = first_match(is_header)
+    warning = None
+    if header_row is None:
+        header_row = HEADER_ROW_ITAU
+        warning = f"Cabeçalho (Data / Lançamento) não encontrado; usada a linha {HEADER_ROW_ITAU + 1} da planilha. Confira as colunas."
+
+    headers = raw.iloc[header_row].tolist()
+    data = raw.iloc[header_row + 1:].reset_index(drop=True)
+    data.columns = headers
+    return finish(data), warning
 
 # ─── BRADESCO ─────────────────────────────────────────────────────────────────
-else:
-    uploaded = st.file_uploader("Upload do extrato Bradesco (.csv)", type=["csv"])
-    if uploaded:
-        content = uploaded.read().decode("latin-1")
-        lines = content.splitlines()
-
-        if len(lines) < 3:
-            st.error("Arquivo com menos de 3 linhas.")
-            st.stop()
-
-        header_line = lines[2]
-        sep = ";" if ";" in header_line else ","
-
-        cleaned = "\n".join(lines[2:])
-        df = pd.read_csv(io.StringIO(cleaned), sep=sep, dtype=str, encoding="latin-1", on_bad_lines="skip")
-
-        # Convert numeric columns at read time — proper BR format (1.234,56 → 1234.56)
-        for col in df.columns:
-            col_lower = str(col).lower()
-            if any(k in col_lower for k in ["créd", "déb", "cred", "deb", "valor"]):
-                df[col] = parse_br_number(df[col])
-
-        df = drop_saldo_col(df)
-        df = insert_cols_after_lancamento(df)
-
-        # Find first "Total" in column A and drop that row + everything below
-        col_a = df.columns[0]
-        total_idx = None
-        for i, val in enumerate(df[col_a]):
-            if str(val).strip().lower() == "total":
-                total_idx = i
-                break
-
-        if total_idx is not None:
-            df = df.iloc[:total_idx].reset_index(drop=True)
-
-        st.success("Arquivo processado com sucesso!")
-        st.dataframe(df.head(20))
-
-        csv_bytes = df.to_csv(index=False, sep=";", encoding="utf-8-sig").encode("utf-8-sig")
+def read_bradesco(content):
+    """Returns (DataFrame, warning or None)."""
+    text = content.decode("latin-1")
+    lines = text.splitlines()
+
+    if len(lines) < 3:
+        raise ValueError("Arquivo com menos de 3 linhas.")
+
+    # Header line: the first one starting with "Data" (after the account preamble)
+    starts_with_data = pd.Series(lines[:50]).str.strip().str.lower().str.startswith("data")
+    header_idx = first_match(starts_with_data)
+    warning = None
+    if header_idx is None:
+        header_idx = HEADER_LINE_BRADESCO
+        warning = f"Cabeçalho (Data…) não encontrado; usada a linha {HEADER_LINE_BRADESCO + 1} do arquivo. Confira as colunas."
+
+    header_line = lines[header_idx]
+    sep = ";" if ";" in header_line else ","
+
+    cleaned = "\n".join(lines[header_idx:])
+    df = pd.read_csv(io.StringIO(cleaned), sep=sep, dtype=str, on_bad_lines="skip")
+    # Convert numeric columns at read time — proper BR format (1.234,56 → 1234.56)
+    df = convert_value_columns(df)
+    return finish(cut_at_total(df)), warning
+
+READERS = {"Itaú": read_itau, "Bradesco": read_bradesco}
+
+def process_statement(name, content):
+    """Normalize one statement; returns (bank, DataFrame or None, error or None, warning or None)."""
+    bank = BANK_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+    try:
+        df, warning = READERS[bank](content)
+    except Exception as e:
+        return bank, None, str(e), None
+    df.insert(0, "Banco", bank)
+    df.insert(1, "Arquivo", name)
+    return bank, df, None, warning
+
+# ─── LOTE ─────────────────────────────────────────────────────────────────────
+uploaded_files = st.file_uploader(
+    "Upload dos extratos (Itaú .xlsx / Bradesco .csv)",
+    type=["xlsx", "csv"],
+    accept_multiple_files=True,
+)
+
+if uploaded_files:
+    # Files already normalized (same content) are reused across reruns;
+    # only the files currently uploaded are kept in the session
+    keys = [(f.name, hashlib.sha256(f.getvalue()).hexdigest()) for f in uploaded_files]
+    previous = st.session_state.get("extratos_normalizados", {})
+    cache = {key: previous[key] for key in keys if key in previous}
+    st.session_state["extratos_normalizados"] = cache
+    pending = [(key, f) for key, f in zip(keys, uploaded_files) if key not in cache]
+
+    if pending:
+        with st.spinner(f"Processando {len(pending)} extrato(s)..."):
+            with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+                results = list(executor.map(lambda item: process_statement(item[1].name, item[1].getvalue()), pending))
+        for (key, _), result in zip(pending, results):
+            cache[key] = result
+
+    ledgers = []
+    summary = []
+    for key in keys:
+        bank, df, error, warning = cache[key]
+        if error is not None:
+            st.error(f"{key[0]} ({bank}): {error}")
+            continue
+        if warning is not None:
+            st.warning(f"{key[0]} ({bank}): {warning}")
+        ledgers.append(df)
+        summary.append({"Arquivo": key[0], "Banco": bank, "Lançamentos": len(df)})
+
+    if ledgers:
+        columns = alinhar_colunas([df.columns for df in ledgers], "uniao")
+        ledger = pd.concat([df.reindex(columns=columns) for df in ledgers], ignore_index=True)
+
+        st.success(f"{len(ledgers)} extrato(s) processado(s): {len(ledger)} lançamentos.")
+        st.dataframe(pd.DataFrame(summary), hide_index=True)
+        st.dataframe(ledger.head(20))
+
+        csv_bytes = ledger.to_csv(index=False, sep=";", encoding="utf-8-sig").encode("utf-8-sig")
         st.download_button(
             label="Baixar CSV",
             data=csv_bytes,
-            file_name="extrato_bradesco.csv",
+            file_name="extratos_consolidados.csv",
             mime="text/csv",
-        )
\ No newline at end of file
+        )
@@ -3,6 +3,9 @@ import pandas as pd
 from io import BytesIO
 import zipfile
 
+from utils.dinheiro import CASAS_RATEIO, ratear
+from utils.formato_br import parse_numero
+
 #----------------------------------
 # Função para ajustar nomes dos arquivos, mantendo o nome original e adicionando o sufixo
 #----------------------------------
@@ -196,14 +199,7 @@ if uploaded_file is not None:
 
         def _coerce_number(series):
             # Converte textos tipo "1,234.56", "($12.34)" etc. para número
-            return pd.to_numeric(
-                series.astype(str)
-                    .str.replace(',', '', regex=False)
-                    .str.replace('$', '', regex=False)
-                    .str.replace('(', '-', regex=False)
-                    .str.replace(')', '', regex=False),
-                errors='coerce'
-            ).fillna(0.0)
+            return parse_numero(series, decimal='.', milhar=',').fillna(0.0)
 
         # Apenas cria o botão; leitura/execução ocorre dentro do clique
         if st.button('Processar desconto', type='primary', key='process_orchard'):
@@ -387,9 +383,12 @@ if uploaded_file is not None:
             st.session_state['share_out_by_currency'] = {}
             st.session_state['onerpm_results'] = []
 
+            # Lê cada planilha uma única vez (usada nos dois passos)
+            planilhas = {sheet: pd.read_excel(xls, sheet_name=sheet) for sheet in required_sheets}
+
             # Primeiro passo: somar os valores de entrada nas planilhas para USD e BRL (apenas 'In' para 'Shares In & Out')
             for sheet in required_sheets:
-                df_sheet = pd.read_excel(xls, sheet_name=sheet)
+                df_sheet = planilhas[sheet]
 
                 # Identifica as moedas diferentes na planilha
                 currencies = df_sheet['Currency'].unique()
@@ -422,9 +421,33 @@ if uploaded_file is not None:
 
             # Agora temos total_net_usd e total_net_brl somados a partir das planilhas relevantes, além dos valores de Share-Out
 
-            # Segundo passo: aplicar o desconto proporcionalmente em cada linha com base no total líquido
+            # Segundo passo: aplicar o desconto proporcionalmente em cada linha com base no total líquido.
+            # A taxa de cada moeda é repartida de uma vez entre as linhas de todas as planilhas
+            # (maiores restos, utils.dinheiro), então a soma dos fees é exatamente a taxa informada
+            fees = {}
+            for currency, taxa, total_moeda in [('USD', usd_tax, st.session_state['total_net_usd']),
+                                                ('BRL', brl_tax, st.session_state['total_net_brl'])]:
+                if total_moeda <= 0:
+                    continue
+                linhas = []
+                for sheet in required_sheets:
+                    df_sheet = planilhas[sheet]
+                    # Linhas com Net vazio ficam fora do rateio (e continuam vazias)
+                    mascara = (df_sheet['Currency'] == currency) & df_sheet['Net'].notna()
+                    if sheet == 'Shares In & Out':
+                        mascara &= df_sheet['Share Type'] == 'In'
+                    if df_sheet.loc[mascara, 'Net'].sum() != 0:
+                        linhas.append((sheet, df_sheet.loc[mascara, 'Net']))
+                if not linhas:
+                    continue
+                valores_fee = ratear(taxa, pd.concat([net for _, net in linhas]).to_numpy(dtype=float), CASAS_RATEIO)
+                inicio = 0
+                for sheet, net in linhas:
+                    fees[(sheet, currency)] = pd.Series(valores_fee[inicio:inicio + len(net)], index=net.index)
+                    inicio += len(net)
+
             for sheet in required_sheets:
-                df_sheet = pd.read_excel(xls, sheet_name=sheet)
+                df_sheet = planilhas[sheet]
 
                 # Identifica as moedas diferentes na planilha
                 currencies = df_sheet['Currency'].unique()
@@ -440,20 +463,15 @@ if uploaded_file is not None:
                     net_total = df_sheet_currency['Net'].sum()
 
                     if net_total != 0:
-                        # Calcula a proporção do valor total para cada linha
-                        if currency == 'USD' and st.session_state['total_net_usd'] > 0:
-                            df_sheet_currency['Proportion'] = df_sheet_currency['Net'] / st.session_state['total_net_usd']
-                            fee_applied = df_sheet_currency['Proportion'] * usd_tax
-                            st.session_state['total_usd_fee_applied'] += fee_applied.sum()
-                            df_sheet_currency['Net'] = df_sheet_currency['Net'] - fee_applied
-                            df_sheet_currency = df_sheet_currency.drop('Proportion', axis=1)  # Remove a coluna Proportion
-
-                        elif currency == 'BRL' and st.session_state['total_net_brl'] > 0:
-                            df_sheet_currency['Proportion'] = df_sheet_currency['Net'] / st.session_state['total_net_brl']
-                            fee_applied = df_sheet_currency['Proportion'] * brl_tax
-                            st.session_state['total_brl_fee_applied'] += fee_applied.sum()
+                        # Fee proporcional de cada linha, já repartido entre as planilhas
+                        if (sheet, currency) in fees:
+                            df_sheet_currency = df_sheet_currency.copy()
+                            fee_applied = fees[(sheet, currency)]
+                            if currency == 'USD':
+                                st.session_state['total_usd_fee_applied'] += fee_applied.sum()
+                            else:
+                                st.session_state['total_brl_fee_applied'] += fee_applied.sum()
                             df_sheet_currency['Net'] = df_sheet_currency['Net'] - fee_applied
-                            df_sheet_currency = df_sheet_currency.drop('Proportion', axis=1)
 
                         withholding_total = df_sheet_currency['Net'].sum()
                         total_withheld = net_total - withholding_total
@@ -5,20 +5,17 @@ import zipfile
 import locale
 import unicodedata
 import re
-import os
 import logging
 from pathlib import Path
 
+from utils.cambio import periodo_valido, salvar_taxas, taxas_do_periodo
+from utils.formato_br import estilo_br, formatar_br, formatar_taxa
+from utils.referencias import caminho_referencia, carregar_referencia
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def format_br(value):
-    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-
-def format_fx_rate(value):
-    return f"{value:.4f}".replace(".", ",")
-
 #----------------------------------
 # Ingrooves Breaker
 #----------------------------------
@@ -167,10 +164,10 @@ def unclassified_artists_to_dataframe(unclassified_list):
     return pd.DataFrame(data)
 
 def load_mapping_file():
-    mapping_path = os.path.join("data", "mapping", "mapping-artistas-ingrooves.xlsx")
+    mapping_path = caminho_referencia("artistas_ingrooves")
     
     try:
-        mapping_df = pd.read_excel(mapping_path)
+        mapping_df = carregar_referencia("artistas_ingrooves")
         if 'Artist' in mapping_df.columns and 'Tag_Artista' in mapping_df.columns:
             st.success(f"✅ Arquivo de mapeamento carregado com sucesso: {mapping_path}")
             return mapping_df
@@ -383,9 +380,9 @@ if uploaded_file is not None and st.session_state['mapping_df'] is not None:
         writer.close()
         st.session_state.processed_data = output.getvalue()
         
-        st.write(f'O valor Original é **USD {format_br(original_total)}**')
-        st.write(f'O total de withholding aplicado é **USD {format_br(total_withheld)}**')
-        st.write(f':red[O valor Net menos withholding é **USD {format_br(discounted_total)}**]')
+        st.write(f'O valor Original é **USD {formatar_br(original_total)}**')
+        st.write(f'O total de withholding aplicado é **USD {formatar_br(total_withheld)}**')
+        st.write(f':red[O valor Net menos withholding é **USD {formatar_br(discounted_total)}**]')
         
         st.session_state.show_fx_rate = True
         
@@ -398,7 +395,28 @@ elif uploaded_file is not None and st.session_state['mapping_df'] is None:
     st.warning("⚠️ Não foi possível carregar o arquivo de mapeamento. Verifique se o arquivo está no caminho correto: data/mapping/mapping-artistas-ingrooves.xlsx")
 
 if st.session_state.show_fx_rate:
-    fx_rate = st.number_input("Adicione aqui a taxa de câmbio (FX rate)", value=0.0, format="%.4f")
+    # A taxa USD → BRL pode ser salva por período e é sugerida nos próximos
+    # relatórios. O relatório da Ingrooves não tem coluna de data, então o
+    # período é sempre informado
+    periodo_fx = st.text_input(
+        "Período da taxa de câmbio (AAAA-MM)",
+        help="Mês do relatório; necessário só para salvar a taxa ou usar uma taxa já salva"
+    ).strip()
+    fx_rate = st.number_input(
+        "Adicione aqui a taxa de câmbio (FX rate)",
+        value=taxas_do_periodo(periodo_fx).get('USD', 0.0) if periodo_valido(periodo_fx) else 0.0,
+        format="%.4f",
+        key=f"fx_rate_{periodo_fx}"
+    )
+    
+    # Só grava com confirmação: valores intermediários digitados não viram versões
+    if fx_rate > 0 and st.button("Salvar taxa para o período"):
+        if not periodo_valido(periodo_fx):
+            st.warning("Período inválido: use o formato AAAA-MM para salvar a taxa")
+        elif salvar_taxas(periodo_fx, {'USD': fx_rate}):
+            st.caption(f"Taxa {formatar_taxa(fx_rate)} salva para {periodo_fx}")
+        else:
+            st.caption(f"Taxa {formatar_taxa(fx_rate)} já era a salva para {periodo_fx}")
     
     if st.session_state['processed_df'] is not None and fx_rate > 0:
         unmatched_artists = get_unmatched_artists_with_values(st.session_state['processed_df'], fx_rate)
@@ -411,10 +429,10 @@ if st.session_state.show_fx_rate:
             total_unmatched_brl = sum(artist['brl'] for artist in unmatched_artists)
             
             st.markdown(f"**Total de artistas não encontrados:** {len(unmatched_artists)}")
-            st.markdown(f"**Valor total não classificado:** USD {format_br(total_unmatched_usd)} (BRL {format_br(total_unmatched_brl)})")
+            st.markdown(f"**Valor total não classificado:** USD {formatar_br(total_unmatched_usd)} (BRL {formatar_br(total_unmatched_brl)})")
             
             for i, artist_info in enumerate(unmatched_artists, 1):
-                st.markdown(f"{i}. **{artist_info['artist']}** - USD {format_br(artist_info['net_dollars'])} (BRL {format_br(artist_info['brl'])})")
+                st.markdown(f"{i}. **{artist_info['artist']}** - USD {formatar_br(artist_info['net_dollars'])} (BRL {formatar_br(artist_info['brl'])})")
     
     if fx_rate > 0 and st.session_state['processed_df'] is not None:
         summary_df, artist_dfs, total_geral_values, unclassified_artists = generate_summary(
@@ -432,24 +450,22 @@ if st.session_state.show_summary and st.session_state.summary_df is not None:
     st.divider()
     st.write("### Agrupamento por artista:")
     
-    display_df = st.session_state.summary_df.copy()
-    display_df['Total Net Dollars'] = display_df['Total Net Dollars'].apply(lambda x: f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-    display_df['FX Rate'] = display_df['FX Rate'].apply(lambda x: f"{x:.4f}".replace(".", ","))
-    display_df['Total BRL'] = display_df['Total BRL'].apply(lambda x: f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-    st.dataframe(display_df)
+    # Formato brasileiro só na exibição (os valores continuam numéricos)
+    display_df = estilo_br(st.session_state.summary_df, ['Total Net Dollars', 'Total BRL'])
+    st.dataframe(estilo_br(display_df, ['FX Rate'], casas=4))
 
     if 'unclassified_artists' in st.session_state and st.session_state['unclassified_artists']:
         st.write("### ⚠️ Artistas não encontrados no mapeamento:")
         
         for i, artist_info in enumerate(st.session_state['unclassified_artists'], 1):
-            st.write(f"{i}. **{artist_info['artist']}** - USD {format_br(artist_info['net_dollars'])} (BRL {format_br(artist_info['brl'])})")
+            st.write(f"{i}. **{artist_info['artist']}** - USD {formatar_br(artist_info['net_dollars'])} (BRL {formatar_br(artist_info['brl'])})")
         
         total_unclassified_usd = sum(artist['net_dollars'] for artist in st.session_state['unclassified_artists'])
         total_unclassified_brl = sum(artist['brl'] for artist in st.session_state['unclassified_artists'])
         
         st.markdown(f"**Total de artistas não encontrados:** {len(st.session_state['unclassified_artists'])}")
-        st.markdown(f"**Total USD:** {format_br(total_unclassified_usd)}")
-        st.markdown(f"**Total BRL:** {format_br(total_unclassified_brl)}")
+        st.markdown(f"**Total USD:** {formatar_br(total_unclassified_usd)}")
+        st.markdown(f"**Total BRL:** {formatar_br(total_unclassified_brl)}")
 
     if st.session_state.artist_dataframes:
         zip_buffer = BytesIO()
@@ -477,10 +493,10 @@ if st.session_state.show_summary and st.session_state.summary_df is not None:
     st.divider()
     st.markdown(
         f"### Total Geral\n"
-        f"**Total Net Dollars:** USD {format_br(st.session_state.total_geral_values['Total Net Dollars'])}\n\n"
-        f"**Total BRL:** BRL {format_br(st.session_state.total_geral_values['Total BRL'])}\n\n"
-        f":red[**Diferença Net Dollars: USD {format_br(st.session_state.total_geral_values['Difference Net Dollars'])}**]\n\n"
-        f":red[**Diferença BRL: BRL {format_br(st.session_state.total_geral_values['Difference BRL'])}**]"
+        f"**Total Net Dollars:** USD {formatar_br(st.session_state.total_geral_values['Total Net Dollars'])}\n\n"
+        f"**Total BRL:** BRL {formatar_br(st.session_state.total_geral_values['Total BRL'])}\n\n"
+        f":red[**Diferença Net Dollars: USD {formatar_br(st.session_state.total_geral_values['Difference Net Dollars'])}**]\n\n"
+        f":red[**Diferença BRL: BRL {formatar_br(st.session_state.total_geral_values['Difference BRL'])}**]"
     )
 
     if 'unclassified_artists' in st.session_state and st.session_state['unclassified_artists']:
@@ -2,59 +2,159 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openpyxl import load_workbook
+from utils.formato_br import estilo_br, formatar_br
+
+from utils.concatenacao import (
+    MODOS_ALINHAMENTO,
+    alinhar_colunas,
+    concatenar_para_disco,
+    criar_caminho_temporario,
+    inferir_dtypes,
+    remover_temporario,
+)
 
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 pd.set_option('display.max_colwidth', None)
 
+MIME_SAIDA = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
 #----------------------------------
 # Funções auxiliares
 #----------------------------------
 
-def detectar_formato_arquivo(file):
+def ler_linhas_iniciais(file, n_linhas=8):
     """
-    Detecta automaticamente o formato do arquivo Backoffice.
+    Lê apenas as primeiras linhas da primeira planilha do arquivo, sem
+    carregar a planilha inteira.
+    
+    Arquivos .xlsx são lidos com o openpyxl em modo read-only (streaming),
+    que descompacta somente o início da planilha. Outros formatos caem
+    para uma leitura limitada via pandas.
     
     Retorna:
-        - 0: arquivo começa direto com o cabeçalho (header=0)
-        - 5: arquivo tem metadados nas primeiras linhas (header=5)
-        - None: arquivo inválido ou muito pequeno
+        - Lista de tuplas com os valores brutos de cada linha
     """
     try:
-        # Tenta ler as primeiras linhas
-        df_test = pd.read_excel(file, nrows=7)
-        
-        # Se o arquivo tem menos de 2 linhas, é inválido
-        if len(df_test) < 1:
-            return None
-        
-        # Verifica se a primeira linha já é o cabeçalho correto
-        if "BO_PayeesID" in df_test.columns or "PAYEESID" in str(df_test.columns[0]).upper():
-            return 0
-        
-        # Se o arquivo tem pelo menos 6 linhas, tenta com header=5
-        if len(df_test) >= 6:
-            # Reseta o ponteiro do arquivo
-            file.seek(0)
-            df_test_h5 = pd.read_excel(file, header=5, nrows=1)
-            
-            # Verifica se com header=5 encontra o cabeçalho correto
-            if "BO_PayeesID" in df_test_h5.columns or any("PAYEE" in str(col).upper() for col in df_test_h5.columns):
-                return 5
-        
-        # Se não detectou formato válido
-        return None
+        file.seek(0)
+        if file.name.lower().endswith(".xlsx"):
+            wb = load_workbook(file, read_only=True, data_only=True)
+            try:
+                ws = wb.worksheets[0]
+                return [tuple(linha) for linha in ws.iter_rows(max_row=n_linhas, values_only=True)]
+            finally:
+                wb.close()
         
-    except Exception as e:
-        return None
+        df_bruto = pd.read_excel(file, header=None, nrows=n_linhas)
+        return [tuple(linha) for linha in df_bruto.itertuples(index=False, name=None)]
     finally:
         # Garante que o ponteiro do arquivo volta ao início
         file.seek(0)
 
 
-def ler_arquivo_backoffice(file):
+def normalizar_cabecalho(valores):
+    """
+    Converte os valores brutos da linha de cabeçalho nos mesmos nomes de
+    coluna que o pd.read_excel geraria: remove células vazias no final,
+    nomeia vazias como "Unnamed: n" e numera repetidas como "X.1", "X.2".
+    """
+    valores = list(valores)
+    while valores and (valores[-1] is None or str(valores[-1]).strip() == ""):
+        valores.pop()
+    
+    colunas = []
+    contagem = {}
+    for i, valor in enumerate(valores):
+        nome = f"Unnamed: {i}" if valor is None or str(valor).strip() == "" else valor
+        if nome in contagem:
+            contagem[nome] += 1
+            novo_nome = f"{nome}.{contagem[nome]}"
+            while novo_nome in contagem:
+                contagem[nome] += 1
+                novo_nome = f"{nome}.{contagem[nome]}"
+            contagem[novo_nome] = 0
+            nome = novo_nome
+        else:
+            contagem[nome] = 0
+        colunas.append(nome)
+    return colunas
+
+
+def detectar_cabecalho(file):
+    """
+    Detecta a linha de cabeçalho do arquivo Backoffice com uma única leitura
+    das primeiras linhas.
+    
+    Retorna:
+        - Posição do cabeçalho (0, 5 ou None, como em detectar_formato_arquivo)
+        - Lista com os nomes das colunas do cabeçalho detectado (ou None)
+        - DataFrame com as linhas lidas após o cabeçalho, usado como amostra
+          de tipos (ou None)
+    """
+    try:
+        linhas = ler_linhas_iniciais(file)
+    except Exception:
+        return None, None, None
+    return cabecalho_das_linhas(linhas)
+
+
+def cabecalho_das_linhas(linhas):
+    """
+    Detecta o cabeçalho a partir das primeiras linhas já lidas (tuplas de
+    valores brutos). Mesmo retorno de detectar_cabecalho.
+    """
+    # Cabeçalho + pelo menos uma linha de dados
+    if len(linhas) < 2:
+        return None, None, None
+    
+    header_pos = None
+    
+    # Verifica se a primeira linha já é o cabeçalho correto
+    colunas = normalizar_cabecalho(linhas[0])
+    if "BO_PayeesID" in colunas or (colunas and "PAYEESID" in str(colunas[0]).upper()):
+        header_pos = 0
+    
+    # Se o arquivo tem pelo menos 7 linhas, verifica o cabeçalho na linha 5
+    elif len(linhas) >= 7:
+        colunas = normalizar_cabecalho(linhas[5])
+        if "BO_PayeesID" in colunas or any("PAYEE" in str(col).upper() for col in colunas):
+            header_pos = 5
+    
+    # Se não detectou formato válido
+    if header_pos is None:
+        return None, None, None
+    
+    n_colunas = len(colunas)
+    amostra = pd.DataFrame(
+        [(tuple(linha) + (None,) * n_colunas)[:n_colunas] for linha in linhas[header_pos + 1:]],
+        columns=colunas,
+    )
+    return header_pos, colunas, amostra
+
+
+def detectar_formato_arquivo(file):
+    """
+    Detecta automaticamente o formato do arquivo Backoffice.
+    
+    Retorna:
+        - 0: arquivo começa direto com o cabeçalho (header=0)
+        - 5: arquivo tem metadados nas primeiras linhas (header=5)
+        - None: arquivo inválido ou muito pequeno
+    """
+    header_pos, _, _ = detectar_cabecalho(file)
+    return header_pos
+
+
+def ler_arquivo_backoffice(file, header_pos=None):
     """
     Lê arquivo Backoffice detectando automaticamente o formato.
     
+    Se `header_pos` já tiver sido detectado, a detecção não é repetida.
+    
     Retorna:
         - DataFrame com os dados
         - String com informações sobre a leitura
@@ -63,13 +163,14 @@ def ler_arquivo_backoffice(file):
     nome_arquivo = file.name
     
     # Detecta o formato
-    header_pos = detectar_formato_arquivo(file)
+    if header_pos is None:
+        header_pos = detectar_formato_arquivo(file)
     
     if header_pos is None:
         return None, f"❌ Arquivo muito pequeno ou formato inválido", False
     
     try:
-        # Lê o arquivo com o header correto
+        # Lê o arquivo uma única vez com o header já detectado
         df = pd.read_excel(file, header=header_pos)
         
         # Valida se o DataFrame não está vazio
@@ -85,6 +186,101 @@ def ler_arquivo_backoffice(file):
         return None, f"❌ Erro ao ler: {str(e)}", False
 
 
+def localizar_coluna_royalties(colunas):
+    """
+    Procura a coluna de royalties na lista de nomes do cabeçalho.
+    
+    Retorna:
+        - Índice da coluna (base 0) ou None se não encontrada
+    """
+    if "ROYALTIES_TO_BE_PAID" in colunas:
+        return colunas.index("ROYALTIES_TO_BE_PAID")
+    if "ROYALTIES_TO_BE_PAID_$" in colunas:
+        return colunas.index("ROYALTIES_TO_BE_PAID_$")
+    
+    # Tenta encontrar coluna que contenha "ROYALTIES" no nome
+    for i, col in enumerate(colunas):
+        if "ROYALTIES" in str(col).upper() and "PAID" in str(col).upper():
+            return i
+    return None
+
+
+def valores_royalties(file, n_linhas=8):
+    """
+    Lê o arquivo uma única vez: as primeiras linhas resolvem o cabeçalho e,
+    na mesma leitura, a coluna de royalties é extraída das linhas seguintes.
+    Arquivos .xlsx são percorridos em modo read-only (streaming), sem montar
+    o DataFrame completo do statement.
+    
+    Retorna:
+        - Lista com os valores brutos da coluna de royalties (ou None)
+        - String com o motivo da falha (ou None em caso de sucesso)
+    """
+    wb = None
+    file.seek(0)
+    try:
+        if file.name.lower().endswith(".xlsx"):
+            wb = load_workbook(file, read_only=True, data_only=True)
+            linhas = wb.worksheets[0].iter_rows(values_only=True)
+        else:
+            df_bruto = pd.read_excel(file, header=None)
+            linhas = df_bruto.itertuples(index=False, name=None)
+        
+        iniciais = [tuple(linha) for _, linha in zip(range(n_linhas), linhas)]
+        header_pos, colunas, _ = cabecalho_das_linhas(iniciais)
+        if header_pos is None:
+            return None, "❌ Arquivo muito pequeno ou formato inválido"
+        
+        idx_coluna = localizar_coluna_royalties(colunas)
+        if idx_coluna is None:
+            return None, "❌ Coluna de royalties não encontrada"
+        
+        # Linhas de dados já lidas com o cabeçalho e o restante do arquivo
+        dados = iniciais[header_pos + 1:]
+        valores = [linha[idx_coluna] if idx_coluna < len(linha) else None for linha in dados]
+        valores += [linha[idx_coluna] if idx_coluna < len(linha) else None for linha in linhas]
+        return valores, None
+    finally:
+        if wb is not None:
+            wb.close()
+
+
+def somar_royalties_arquivo(file):
+    """
+    Soma a coluna de royalties de um arquivo ST lendo apenas essa coluna,
+    numa única leitura do arquivo (valores_royalties).
+    
+    Células com texto que não é número não impedem o total: ficam fora da
+    soma e são contadas para aviso na página.
+    
+    Retorna:
+        - Nome do arquivo
+        - Total de royalties (ou None em caso de falha)
+        - String com o motivo da falha (ou None em caso de sucesso)
+        - Quantidade de valores que não puderam ser lidos como número
+    """
+    if "ST" not in file.name.upper():
+        return file.name, None, "⚠️ Não é arquivo ST (Statement)", 0
+    
+    try:
+        valores, motivo = valores_royalties(file)
+        if motivo is not None:
+            return file.name, None, motivo, 0
+        
+        # Mesma semântica de soma do pandas (ignora vazios)
+        serie = pd.Series(valores, dtype="object").dropna()
+        if len(serie) == 0:
+            return file.name, None, "⚠️ Arquivo sem dados", 0
+        
+        numeros = pd.to_numeric(serie, errors="coerce")
+        return file.name, numeros.sum(), None, int(numeros.isna().sum())
+    
+    except Exception as e:
+        return file.name, None, f"❌ Erro: {str(e)}", 0
+    finally:
+        file.seek(0)
+
+
 #----------------------------------
 # Interface Streamlit
 #----------------------------------
@@ -103,6 +299,19 @@ uploaded_files = st.file_uploader(
 if uploaded_files:
     st.info(f"📁 {len(uploaded_files)} arquivo(s) carregado(s)")
     
+    # Opções da concatenação
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        modo_alinhamento = st.selectbox(
+            "Colunas do arquivo final",
+            list(MODOS_ALINHAMENTO.keys()),
+            help="União: todas as colunas encontradas. Interseção: apenas as colunas presentes em todos os arquivos.",
+        )
+    
+    with col2:
+        formato_saida = st.selectbox("Formato de saída", ["xlsx", "csv"])
+    
     # Botões para escolher a ação
     col1, col2 = st.columns(2)
     
@@ -120,77 +329,101 @@ if uploaded_files:
         st.divider()
         st.subheader("📊 Processando concatenação...")
         
-        # Lista para armazenar os DataFrames e logs
-        dataframes = []
         logs = []
-        arquivos_sucesso = 0
-        arquivos_erro = 0
+        arquivos_validos = []
+        cabecalhos = []
+        amostras = []
         
-        # Processamento com barra de progresso
+        # Primeira passagem: apenas os cabeçalhos, para alinhar o esquema
+        for file in uploaded_files:
+            header_pos, colunas, amostra = detectar_cabecalho(file)
+            if header_pos is None:
+                logs.append(f"**{file.name}** - ❌ Arquivo muito pequeno ou formato inválido")
+                continue
+            arquivos_validos.append((file, header_pos))
+            cabecalhos.append(colunas)
+            amostras.append(amostra)
+        
+        colunas_finais = alinhar_colunas(cabecalhos, MODOS_ALINHAMENTO[modo_alinhamento])
+        dtypes = inferir_dtypes(amostras, colunas_finais)
+        
+        # Segunda passagem: cada arquivo é lido e gravado direto no disco
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        for i, file in enumerate(uploaded_files):
-            progress = (i + 1) / len(uploaded_files)
-            progress_bar.progress(progress)
-            status_text.text(f"Processando {i+1}/{len(uploaded_files)}: {file.name}")
-            
-            # Tenta ler o arquivo
-            df, info, sucesso = ler_arquivo_backoffice(file)
-            
-            if sucesso:
-                dataframes.append(df)
-                logs.append(f"**{file.name}** - {info}")
-                arquivos_sucesso += 1
-            else:
-                logs.append(f"**{file.name}** - {info}")
-                arquivos_erro += 1
+        headers_por_arquivo = {id(file): header_pos for file, header_pos in arquivos_validos}
+        infos = {}
+        
+        def atualizar_progresso(i, file):
+            progress_bar.progress((i + 1) / len(arquivos_validos))
+            status_text.text(f"Processando {i+1}/{len(arquivos_validos)}: {file.name}")
+        
+        def ler_para_concatenar(file):
+            df, info, sucesso = ler_arquivo_backoffice(file, headers_por_arquivo[id(file)])
+            infos[id(file)] = info
+            return df if sucesso else None
+        
+        caminho_saida = criar_caminho_temporario(formato_saida)
+        try:
+            total_linhas, df_previa, resultados = concatenar_para_disco(
+                [file for file, _ in arquivos_validos],
+                ler_para_concatenar,
+                colunas_finais,
+                caminho_saida,
+                formato=formato_saida,
+                dtypes=dtypes,
+                ao_processar=atualizar_progresso,
+            )
+            with open(caminho_saida, "rb") as f:
+                dados_saida = f.read()
+        except Exception as e:
+            st.error(f"❌ Erro ao concatenar os arquivos: {str(e)}")
+            resultados, dados_saida = [], None
+        finally:
+            remover_temporario(caminho_saida)
         
         # Limpa o status
         progress_bar.empty()
         status_text.empty()
         
+        for (file, _), (nome, erro) in zip(arquivos_validos, resultados):
+            info = infos.get(id(file))
+            if erro is not None and (info is None or info.startswith("✅")):
+                info = f"❌ Erro ao gravar: {erro}"
+            logs.append(f"**{nome}** - {info}")
+        
+        arquivos_sucesso = sum(1 for _, erro in resultados if erro is None)
+        arquivos_erro = len(uploaded_files) - arquivos_sucesso
+        
         # Mostra os logs de processamento
         with st.expander(f"📋 Detalhes do processamento ({arquivos_sucesso} sucesso, {arquivos_erro} erro)", expanded=False):
             for log in logs:
                 st.markdown(log)
         
         # Se conseguiu ler algum arquivo
-        if dataframes:
-            try:
-                # Concatena todos os DataFrames
-                concatenated_df = pd.concat(dataframes, ignore_index=True)
-                
-                # Informações sobre o resultado
-                st.success(f"""
-                ✅ **Concatenação concluída com sucesso!**
-                - Arquivos processados: {arquivos_sucesso}/{len(uploaded_files)}
-                - Total de linhas: {len(concatenated_df):,}
-                - Total de colunas: {len(concatenated_df.columns)}
-                """)
-                
-                # Preview dos dados
-                with st.expander("👁️ Visualizar dados concatenados", expanded=False):
-                    st.dataframe(concatenated_df.head(100), use_container_width=True)
-                
-                # Prepara o arquivo para download
-                buffer = BytesIO()
-                with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                    concatenated_df.to_excel(writer, index=False, sheet_name='Dados Concatenados')
-                
-                # Botão de download
-                st.download_button(
-                    label="📥 Baixar arquivo concatenado",
-                    data=buffer.getvalue(),
-                    file_name="backoffice_concatenado.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
-                
-            except Exception as e:
-                st.error(f"❌ Erro ao concatenar os arquivos: {str(e)}")
+        if arquivos_sucesso and dados_saida is not None:
+            # Informações sobre o resultado
+            st.success(f"""
+            ✅ **Concatenação concluída com sucesso!**
+            - Arquivos processados: {arquivos_sucesso}/{len(uploaded_files)}
+            - Total de linhas: {total_linhas:,}
+            - Total de colunas: {len(colunas_finais)}
+            """)
+            
+            # Preview dos dados
+            with st.expander("👁️ Visualizar dados concatenados", expanded=False):
+                st.dataframe(df_previa, use_container_width=True)
+            
+            # Botão de download
+            st.download_button(
+                label="📥 Baixar arquivo concatenado",
+                data=dados_saida,
+                file_name=f"backoffice_concatenado.{formato_saida}",
+                mime=MIME_SAIDA[formato_saida],
+                use_container_width=True
+            )
         
-        else:
+        elif dados_saida is not None:
             st.error("❌ Nenhum arquivo pôde ser processado com sucesso!")
     
     #----------------------------------
@@ -210,51 +443,37 @@ if uploaded_files:
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        for i, file in enumerate(uploaded_files):
-            progress = (i + 1) / len(uploaded_files)
-            progress_bar.progress(progress)
-            status_text.text(f"Processando {i+1}/{len(uploaded_files)}: {file.name}")
-            
-            # Verifica se é um arquivo ST (Statement)
-            if "ST" in file.name.upper():
-                try:
-                    # Tenta detectar o formato e ler
-                    df, info, sucesso = ler_arquivo_backoffice(file)
-                    
-                    if not sucesso:
-                        arquivos_ignorados.append((file.name, info))
-                        continue
-                    
-                    # Procura pela coluna de royalties
-                    coluna_royalties = None
-                    
-                    if "ROYALTIES_TO_BE_PAID" in df.columns:
-                        coluna_royalties = "ROYALTIES_TO_BE_PAID"
-                    elif "ROYALTIES_TO_BE_PAID_$" in df.columns:
-                        coluna_royalties = "ROYALTIES_TO_BE_PAID_$"
-                    else:
-                        # Tenta encontrar coluna que contenha "ROYALTIES" no nome
-                        for col in df.columns:
-                            if "ROYALTIES" in str(col).upper() and "PAID" in str(col).upper():
-                                coluna_royalties = col
-                                break
-                    
-                    if coluna_royalties:
-                        total_royalties = df[coluna_royalties].sum()
-                        results.append((file.name, total_royalties))
-                        arquivos_processados += 1
-                    else:
-                        arquivos_ignorados.append((file.name, "❌ Coluna de royalties não encontrada"))
-                
-                except Exception as e:
-                    arquivos_ignorados.append((file.name, f"❌ Erro: {str(e)}"))
+        # Lê apenas a coluna de royalties de cada arquivo, em paralelo
+        totais_por_arquivo = [None] * len(uploaded_files)
+        with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as executor:
+            futuros = {
+                executor.submit(somar_royalties_arquivo, file): idx
+                for idx, file in enumerate(uploaded_files)
+            }
+            for i, futuro in enumerate(as_completed(futuros)):
+                totais_por_arquivo[futuros[futuro]] = futuro.result()
+                progress_bar.progress((i + 1) / len(uploaded_files))
+                status_text.text(f"Processando {i+1}/{len(uploaded_files)}: {totais_por_arquivo[futuros[futuro]][0]}")
+        
+        # Mantém a ordem original do upload
+        valores_invalidos = []
+        for nome, total, motivo, invalidos in totais_por_arquivo:
+            if motivo is None:
+                results.append((nome, total))
+                arquivos_processados += 1
+                if invalidos:
+                    valores_invalidos.append((nome, invalidos))
             else:
-                arquivos_ignorados.append((file.name, "⚠️ Não é arquivo ST (Statement)"))
+                arquivos_ignorados.append((nome, motivo))
         
         # Limpa o status
         progress_bar.empty()
         status_text.empty()
         
+        # Valores de royalties que não são números ficaram fora do total
+        for nome, invalidos in valores_invalidos:
+            st.warning(f"**{nome}** - {invalidos} valor(es) de royalties não numérico(s) ignorado(s) na soma")
+        
         # Mostra arquivos ignorados
         if arquivos_ignorados:
             with st.expander(f"⚠️ Arquivos ignorados ({len(arquivos_ignorados)})", expanded=False):
@@ -275,16 +494,11 @@ if uploaded_files:
             # Adiciona uma linha com a soma total
             df_results.loc[len(df_results.index)] = ["TOTAL GERAL", total_royalties_sum]
             
-            # Formata como moeda brasileira
-            df_results["Soma de ROYALTIES_TO_BE_PAID"] = df_results["Soma de ROYALTIES_TO_BE_PAID"].apply(
-                lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            )
-            
             # Exibe o resultado
             st.success(f"✅ {arquivos_processados} arquivo(s) totalizado(s) com sucesso!")
             
-            # Mostra a tabela
-            st.dataframe(df_results, use_container_width=True, hide_index=True)
+            # Mostra a tabela formatada como moeda brasileira
+            st.dataframe(estilo_br(df_results, ["Soma de ROYALTIES_TO_BE_PAID"], prefixo="R$ "), use_container_width=True, hide_index=True)
             
             # Cálculos adicionais
             st.divider()
@@ -294,7 +508,7 @@ if uploaded_files:
             with col1:
                 st.metric(
                     label="💰 Total Bruto",
-                    value=f"R$ {total_royalties_sum:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                    value=formatar_br(total_royalties_sum, prefixo="R$ ")
                 )
             
             desconto_r3 = (total_royalties_sum * 0.025).round(2)
@@ -302,7 +516,7 @@ if uploaded_files:
             with col2:
                 st.metric(
                     label="📉 Desconto R3 (2,5%)",
-                    value=f"R$ {desconto_r3:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                    value=formatar_br(desconto_r3, prefixo="R$ ")
                 )
             
             total_liquido = (total_royalties_sum - desconto_r3).round(2)
@@ -310,7 +524,7 @@ if uploaded_files:
             with col3:
                 st.metric(
                     label="✅ Total Líquido",
-                    value=f"R$ {total_liquido:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                    value=formatar_br(total_liquido, prefixo="R$ ")
                 )
             
             # Botão para baixar os totais
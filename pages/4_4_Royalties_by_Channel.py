@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 import os
-from io import BytesIO
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.formato_br import parse_br
+from utils.referencias import obter_indice
 
 #----------------------------------
 # Royalties by Channel App
@@ -12,73 +16,138 @@ title = st.title("Royalties by Channel")
 
 descritivo = st.caption("Cria a planilha Royalties by Channel para uso do financeiro.")
 
-selectbox = st.selectbox("Selecione a fonte", ['ABRAMUS', 'UBC'])
+LOTE = 'Lote (ABRAMUS + UBC)'
+
+selectbox = st.selectbox("Selecione a fonte", ['ABRAMUS', 'UBC', LOTE])
 
 # Inputs do usuário para os caminhos dos arquivos
-source_file = st.file_uploader('Upload do relatório', type=['csv', 'xlsx'])  # Carregando o arquivo CSV
+if selectbox == LOTE:
+    # No lote, CSVs são tratados como ABRAMUS e XLSX como UBC
+    source_file = st.file_uploader('Upload dos relatórios do mês (CSV ABRAMUS e XLSX UBC)', type=['csv', 'xlsx'], accept_multiple_files=True)
+else:
+    source_file = st.file_uploader('Upload do relatório', type=['csv', 'xlsx'])  # Carregando o arquivo CSV
 
-# Definindo caminhos fixos para as planilhas de mapeamento
-target_path = 'data/mapping/planilha-target.xlsx'
-mapping_file_path = 'data/mapping/mapping-rubricas.xlsx'
+# Colunas do arquivo final
+COLUNAS_SAIDA = ['Catalog', 'Source', 'Period', 'Rubrica', 'Channel', 'Rendimentos', 'Tipo Distribuição', 'Key']
 
 # Variáveis adicionais para o mês e ano
 mes = st.number_input('Mês', min_value=1, max_value=12, value=1, step=1)  # Exemplo de período
 ano = st.number_input('Ano', min_value=1900, max_value=2100, value=2024, step=1)
 source_name = selectbox  # Variável para a coluna Source
+incluir_hash = st.checkbox('Incluir chave compacta (Key Hash)', help='Adiciona uma coluna com o hash de 64 bits da Key, mais leve para joins')
 
-# Função para extrair as informações iniciais diretamente do arquivo CSV
-def extract_catalog_and_period_abramus(source_file):
-    metadata = [next(source_file).decode('latin1').strip() for _ in range(4)]
+# Função para criar coluna 'Channel' baseada no arquivo de mapeamento
+def map_channel(df):
+    # Dicionário Rubrica -> Channel, lido uma vez por processo (utils.referencias)
+    mapping_rubricas = obter_indice('rubricas', 'Rubrica', 'Channel')
     
-    # Extraindo "Catalog" e "Period" dos metadados
-    catalog = metadata[1].split(":")[1].strip()  # Linha 2 para "Catalog"
-    period = metadata[3].split(":")[1].strip()   # Linha 4 para "Period"
+    # Realizando o mapeamento
+    df['Channel'] = df['Rubrica'].map(mapping_rubricas).fillna("Not Mapped")
     
-    return catalog, period
+    return df
 
-def extract_catalog_and_period_ubc(source_file):
-    # Read the first few rows of the Excel file to extract metadata
-    df_metadata = pd.read_excel(source_file, nrows=5)
-    
-    # Extract catalog (name) from the row that starts with "Nome:"
-    name_row = df_metadata[df_metadata.iloc[:, 0].str.contains("Nome:", na=False)].iloc[0, 0]
+# Função para criar a coluna 'Key' com separador "|"
+def create_key_column(df, incluir_hash=False):
+    # Converte cada coluna inteira para texto (mesmo resultado de str() valor a valor)
+    # e concatena as colunas de uma vez, sem percorrer linha a linha
+    colunas = list(df.columns)
+    partes = [pd.Series(df[col].to_numpy(dtype=object).astype(str), index=df.index) for col in colunas]
+    if partes:
+        df['Key'] = partes[0].str.cat(partes[1:], sep="|")
+    else:
+        df['Key'] = ""
+
+    # Chave compacta opcional: hash de 64 bits das mesmas colunas, em hexadecimal
+    if incluir_hash:
+        hashes = pd.util.hash_pandas_object(df[colunas], index=False)
+        df['Key Hash'] = hashes.map("{:016x}".format)
+    return df
+
+
+
+# Lê o CSV ABRAMUS uma única vez: metadados e dados saem do mesmo conteúdo
+def ler_relatorio_abramus(conteudo):
+    texto = conteudo.decode('latin1')
+    metadata = [linha.strip() for linha in texto.split('\n', 4)[:4]]
+    catalog = metadata[1].split(":")[1].strip()  # Linha 2 para "Catalog"
+
+    source_df = pd.read_csv(StringIO(texto), sep=';', header=4)  # Planilha com conteúdo a ser copiado
+    final_df = source_df[['RUBRICA', 'RATEIO', 'TIPO DISTRIBUIÇÃO']].copy()
+    final_df.columns = ['Rubrica', 'Rendimentos', 'Tipo Distribuição']
+    return catalog, final_df
+
+# Lê o Excel UBC uma única vez: metadados nas primeiras linhas e dados após o cabeçalho
+def ler_relatorio_ubc(conteudo):
+    df_bruto = pd.read_excel(BytesIO(conteudo), header=None)
+
+    # Metadados "Nome:" e "Período:" na primeira coluna das primeiras linhas
+    metadados = df_bruto.iloc[:6, 0].dropna().astype(str)
+    name_row = metadados[metadados.str.contains("Nome:")].iloc[0]
     catalog = name_row.split("Nome:")[1].strip()
-    
-    # Extract period from the row that starts with "Período:"
-    period_row = df_metadata[df_metadata.iloc[:, 0].str.contains("Período:", na=False)].iloc[0, 0]
+    period_row = metadados[metadados.str.contains("Período:")].iloc[0]
     period_text = period_row.split("Período:")[1].strip()
-    
+
     # Convert period format (e.g., "Nov de 2024" to "2024-11")
     month_map = {
         'Jan': '01', 'Fev': '02', 'Mar': '03', 'Abr': '04',
         'Mai': '05', 'Jun': '06', 'Jul': '07', 'Ago': '08',
         'Set': '09', 'Out': '10', 'Nov': '11', 'Dez': '12'
     }
-    
-    # Split the period text and extract month and year
-    month_text = period_text.split()[0]
-    year = period_text.split()[-1]
-    
-    # Convert to desired format
-    month_number = month_map[month_text]
-    period = f"{year}-{month_number}"
-    
-    return catalog, period
-
-# Função para criar coluna 'Channel' baseada no arquivo de mapeamento
-def map_channel(df, mapping_file_path):
-    mapping_df = pd.read_excel(mapping_file_path, sheet_name='Sheet1')
-    
-    # Realizando o mapeamento
-    df['Channel'] = df['Rubrica'].map(mapping_df.set_index('Rubrica')['Channel']).fillna("Not Mapped")
-    
-    return df
-
-# Função para criar a coluna 'Key' com separador "|"
-def create_key_column(df):
-    df['Key'] = df.apply(lambda row: "|".join(row.values.astype(str)), axis=1)
-    return df
-
+    period = f"{period_text.split()[-1]}-{month_map[period_text.split()[0]]}"
+
+    # Linha de cabeçalho da tabela de rendimentos
+    linhas_cabecalho = df_bruto.index[(df_bruto == "Descrição").any(axis=1)]
+    if len(linhas_cabecalho) == 0:
+        raise ValueError("Cabeçalho 'Descrição' não encontrado no relatório UBC")
+    linha_cabecalho = linhas_cabecalho[0]
+
+    source_df = df_bruto.iloc[linha_cabecalho + 1:].copy()
+    source_df.columns = df_bruto.iloc[linha_cabecalho]
+    source_df = source_df[["Descrição", "Rendimento Total do Titular"]]
+
+    # Remove a última linha (que contém a soma)
+    source_df = source_df.iloc[:-1].infer_objects().reset_index(drop=True)
+    source_df.columns = ['Rubrica', 'Rendimentos']
+    source_df['Tipo Distribuição'] = 'Padrão'  # Placeholder
+    return catalog, period, source_df
+
+# Completa o DataFrame com Catalog, Period, Source, Channel e Key
+def montar_royalties_by_channel(final_df, catalog, period, source, incluir_hash=False):
+    final_df['Catalog'] = catalog
+    final_df['Period'] = period
+    final_df['Source'] = source
+
+    # Mapeando o Channel usando o arquivo de mapeamento
+    final_df = map_channel(final_df)
+
+    # Criando a coluna 'Key' com separador "|"
+    final_df = create_key_column(final_df, incluir_hash)
+
+    # Reordenando as colunas
+    return final_df[COLUNAS_SAIDA + (['Key Hash'] if incluir_hash else [])]
+
+# Converte os Rendimentos (1.234,56) em número; retorna as linhas cujo valor não pôde ser lido
+def converter_rendimentos(final_df):
+    originais = final_df['Rendimentos']
+    valores = parse_br(originais)
+    preenchidos = originais.notna() & originais.astype(str).str.strip().ne('')
+    invalidos = final_df.loc[valores.isna() & preenchidos, ['Rubrica', 'Rendimentos']]
+    final_df['Rendimentos'] = valores
+    return invalidos
+
+# Processa um arquivo do lote, identificando a fonte pela extensão (CSV = ABRAMUS, XLSX = UBC)
+def processa_arquivo_lote(nome, conteudo, periodo_abramus, incluir_hash=False):
+    try:
+        if nome.lower().endswith('.csv'):
+            catalog, source_df = ler_relatorio_abramus(conteudo)
+            final_df = montar_royalties_by_channel(source_df, catalog, periodo_abramus, 'ABRAMUS', incluir_hash)
+        else:
+            catalog, period, source_df = ler_relatorio_ubc(conteudo)
+            final_df = montar_royalties_by_channel(source_df, catalog, period, 'UBC', incluir_hash)
+        invalidos = converter_rendimentos(final_df)
+        return nome, final_df, invalidos, None
+    except Exception as e:
+        return nome, None, None, str(e)
 
 
 if selectbox == "ABRAMUS":
@@ -92,28 +161,14 @@ if selectbox == "ABRAMUS":
                 try:
                     # Lendo as planilhas
                     st.write("Carregando os dados...")
-                    target_df = pd.read_excel(target_path, header=None)  # Planilha com headers padrão
-                    source_df = pd.read_csv(source_file, sep=';', encoding='latin1', header=4)  # Planilha com conteúdo a ser copiado
-                    
-                    # Extraindo Catalog e Period da planilha de origem
-                    source_file.seek(0)  # Volta ao início do arquivo carregado
-                    catalog, period = extract_catalog_and_period_abramus(source_file)
-
-                    # Criando o DataFrame final com os headers da target e adicionando conteúdo da source
-                    final_df = source_df[['RUBRICA', 'RATEIO', 'TIPO DISTRIBUIÇÃO']].copy()
-                    final_df.columns = ['Rubrica', 'Rendimentos', 'Tipo Distribuição']
-                    final_df['Catalog'] = catalog
-                    final_df['Period'] = f"{ano}-{str(mes).zfill(2)}"
-                    final_df['Source'] = source_name  # Usando a variável "Source"
-
-                    # Mapeando o Channel usando o arquivo de mapeamento
-                    final_df = map_channel(final_df, mapping_file_path)
+                    catalog, final_df = ler_relatorio_abramus(source_file.getvalue())
+                    final_df = montar_royalties_by_channel(final_df, catalog, f"{ano}-{str(mes).zfill(2)}", source_name, incluir_hash)
 
-                    # Criando a coluna 'Key' com separador "|"
-                    final_df = create_key_column(final_df)
-
-                    # Reordenando as colunas
-                    final_df = final_df[['Catalog', 'Source', 'Period', 'Rubrica', 'Channel', 'Rendimentos', 'Tipo Distribuição', 'Key']]
+                    # Mesma conversão do lote: Rendimentos em número, valores inválidos listados
+                    invalidos = converter_rendimentos(final_df)
+                    if len(invalidos):
+                        st.warning(f"{len(invalidos)} linha(s) com Rendimentos inválidos (fora do total)")
+                        st.dataframe(invalidos, use_container_width=True)
 
                     # Salvando o DataFrame final em memória (buffer)
                     buffer = BytesIO()
@@ -143,34 +198,15 @@ if selectbox == "UBC":
                 try:
                     # Lendo as planilhas
                     st.write("Carregando os dados...")
-                    target_df = pd.read_excel(target_path, header=None)  # Planilha com headers padrão
-                    
-                    # Extract metadata first
-                    catalog, period = extract_catalog_and_period_ubc(source_file)
-                    
-                    # Reset file pointer and read main data
-                    source_df = pd.read_excel(source_file, skiprows=6, usecols=["Descrição", "Rendimento Total do Titular"])
-
-                    # Remove a última linha (que contém a soma)
-                    source_df = source_df.iloc[:-1]
                     
-                    # Renomeando colunas para o formato esperado
-                    source_df.columns = ['Rubrica', 'Rendimentos']
-
-                    # Adicionando colunas adicionais
-                    source_df['Tipo Distribuição'] = 'Padrão'  # Placeholder
-                    source_df['Catalog'] = catalog
-                    source_df['Period'] = period  # Using the extracted and formatted period
-                    source_df['Source'] = source_name
-
-                    # Mapeando o Channel usando o arquivo de mapeamento
-                    final_df = map_channel(source_df, mapping_file_path)
-
-                    # Criando a coluna 'Key' com separador "|"
-                    final_df = create_key_column(final_df)
+                    catalog, period, source_df = ler_relatorio_ubc(source_file.getvalue())
+                    final_df = montar_royalties_by_channel(source_df, catalog, period, source_name, incluir_hash)
 
-                    # Reordenando as colunas
-                    final_df = final_df[['Catalog', 'Source', 'Period', 'Rubrica', 'Channel', 'Rendimentos', 'Tipo Distribuição', 'Key']]
+                    # Mesma conversão do lote: Rendimentos em número, valores inválidos listados
+                    invalidos = converter_rendimentos(final_df)
+                    if len(invalidos):
+                        st.warning(f"{len(invalidos)} linha(s) com Rendimentos inválidos (fora do total)")
+                        st.dataframe(invalidos, use_container_width=True)
 
                     # Salvando o DataFrame final em memória (buffer)
                     buffer = BytesIO()
@@ -190,9 +226,79 @@ if selectbox == "UBC":
 
 
 
+if selectbox == LOTE:
+
+    # Função de processamento em lote (vários catálogos ABRAMUS e UBC do mês)
+    def processa_lote():
+        if st.button('Criar arquivo consolidado', type='primary'):
+            if source_file:
+                periodo_abramus = f"{ano}-{str(mes).zfill(2)}"
+                resultados = [None] * len(source_file)
+                progress_bar = st.progress(0)
+
+                # Cada arquivo é lido uma única vez e processado em paralelo
+                with ThreadPoolExecutor(max_workers=min(8, len(source_file))) as executor:
+                    futuros = {
+                        executor.submit(processa_arquivo_lote, file.name, file.getvalue(), periodo_abramus, incluir_hash): idx
+                        for idx, file in enumerate(source_file)
+                    }
+                    for i, futuro in enumerate(as_completed(futuros)):
+                        resultados[futuros[futuro]] = futuro.result()
+                        progress_bar.progress((i + 1) / len(source_file))
+                progress_bar.empty()
+
+                dfs = []
+                resumo = []
+                for nome, final_df, invalidos, erro in resultados:
+                    if erro is not None:
+                        st.error(f"{nome}: {erro}")
+                        resumo.append({'Arquivo': nome, 'Catalog': '', 'Source': '', 'Period': '', 'Linhas': 0, 'Rendimentos': 0, 'Valores inválidos': 0, 'Erro': erro})
+                        continue
+                    # Valores que não são números não entram no total: são listados para conferência
+                    if len(invalidos):
+                        st.warning(f"{nome}: {len(invalidos)} linha(s) com Rendimentos inválidos (fora do total)")
+                        st.dataframe(invalidos, use_container_width=True)
+                    dfs.append(final_df)
+                    resumo.append({
+                        'Arquivo': nome,
+                        'Catalog': final_df['Catalog'].iloc[0] if len(final_df) else '',
+                        'Source': final_df['Source'].iloc[0] if len(final_df) else '',
+                        'Period': final_df['Period'].iloc[0] if len(final_df) else '',
+                        'Linhas': len(final_df),
+                        'Rendimentos': final_df['Rendimentos'].sum(),
+                        'Valores inválidos': len(invalidos),
+                        'Erro': ''
+                    })
+
+                df_resumo = pd.DataFrame(resumo)
+                st.dataframe(df_resumo, hide_index=True, use_container_width=True)
+
+                if dfs:
+                    final_df = pd.concat(dfs, ignore_index=True)
+                    st.success(f"{len(dfs)} arquivo(s) consolidado(s): {len(final_df)} linhas")
+
+                    # Salvando o DataFrame final em memória (buffer)
+                    buffer = BytesIO()
+                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+                        final_df.to_excel(writer, index=False, sheet_name='Sheet1')
+                        df_resumo.to_excel(writer, index=False, sheet_name='Arquivos')
+                    buffer.seek(0)
+
+                    # Disponibilizando o botão de download
+                    st.download_button(
+                        label="Baixar arquivo consolidado",
+                        data=buffer,
+                        file_name=f'Royalties_by_Channel_{periodo_abramus}.xlsx',
+                        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                    )
+
+
+
 if __name__ == "__main__":
     if selectbox == "ABRAMUS":
         processa_abramus()
     elif selectbox == "UBC":
         processa_ubc()
+    elif selectbox == LOTE:
+        processa_lote()
 
@@ -0,0 +1,86 @@
+import streamlit as st
+import pandas as pd
+import os
+
+from utils.contratos import listar_artistas
+from utils.processador_ep import processar_pasta, exportar_incomes
+
+def main():
+    st.title("EP Calculator - Lote")
+    st.caption("Processa os relatórios Writer e Publisher de vários artistas e períodos e gera um único arquivo de incomes.")
+
+    st.markdown("""
+    **Estrutura da pasta:** `<pasta>/<período>/<artista>/<Writer|Publisher>/` com os relatórios
+    nacionais (CSV) e internacionais (Excel). O período segue o nome das incomes (ex: `2025M8`)
+    e o artista é o nome da pasta em `data/catalogs` que tem o `contrato.json`.
+    """)
+    st.caption(f"Artistas com contrato: {', '.join(listar_artistas()) or 'nenhum'}")
+
+    pasta = st.text_input("Pasta dos relatórios")
+
+    if st.button("Processar pasta", type="primary"):
+        if not pasta or not os.path.isdir(pasta):
+            st.error("Informe uma pasta válida")
+            return
+
+        progress_bar = st.progress(0)
+        status = st.empty()
+
+        def ao_processar(concluidos, total):
+            progress_bar.progress(concluidos / total)
+            status.text(f"{concluidos}/{total} artista(s)/período(s) lidos")
+
+        try:
+            with st.spinner("Processando relatórios..."):
+                df_resumo, df_incomes, ignorados = processar_pasta(pasta, ao_processar=ao_processar)
+        except Exception as e:
+            st.error(f"Erro ao processar a pasta: {str(e)}")
+            return
+        finally:
+            progress_bar.empty()
+            status.empty()
+
+        st.session_state['ep_lote_resultado'] = {
+            'pasta': pasta,
+            'resumo': df_resumo,
+            'incomes': df_incomes,
+            'ignorados': ignorados,
+        }
+
+    resultado = st.session_state.get('ep_lote_resultado')
+    if not resultado:
+        return
+
+    df_resumo = resultado['resumo']
+    df_incomes = resultado['incomes']
+
+    st.subheader("Resumo por artista / tipo / período")
+    if df_resumo.empty:
+        st.warning("Nenhum relatório encontrado na pasta")
+    else:
+        st.dataframe(df_resumo, hide_index=True, use_container_width=True)
+        erros = df_resumo[df_resumo['Erro'].fillna('') != '']
+        if not erros.empty:
+            st.error(f"{len(erros)} grupo(s) com erro ficaram fora do arquivo de incomes")
+
+    if resultado['ignorados']:
+        with st.expander(f"Arquivos ignorados ({len(resultado['ignorados'])})"):
+            st.dataframe(pd.DataFrame(resultado['ignorados'], columns=['Arquivo', 'Motivo']), hide_index=True, use_container_width=True)
+
+    if df_incomes.empty:
+        return
+
+    st.subheader("Incomes consolidadas")
+    st.success(f"✅ {len(df_incomes)} linhas de income")
+    st.dataframe(df_incomes, hide_index=True, use_container_width=True)
+
+    periodos = "_".join(sorted(df_incomes['PERIODO'].unique()))
+    st.download_button(
+        label="📥 Download CSV com as Incomes",
+        data=exportar_incomes(df_incomes),
+        file_name=f"incomes_consolidadas_{periodos}.csv",
+        mime="text/csv"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -2,417 +2,46 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import os
 
-# Configurações pré-determinadas
-AUTOR = "Douglas Cezar"
-EDITORA = "DC Editora"
-OBRAS_PATH = os.path.join("data", "catalogs", "douglas-cezar", "obras-cadastradas-DOUGLAS-CEZAR.xlsx")
+from utils.contratos import carregar_contrato
+from utils.formato_br import estilo_br, formatar_br
+from utils.processador_ep import ProcessadorRoyalties, calcular_totais, gerar_linhas_incomes, ler_relatorio
 
-# Shares pré-definidos
-WRITER_SHARE = 0.5
-NNC_WRITER_SHARE = 0.5
-PUBLISHER_TOTAL_SHARE = 0.5
-NNC_PUBLISHER_SHARE = 0.5
-PUBLISHER_ADMIN_SHARE = 0.4
-NNC_ADMIN_SHARE = 0.6
+# Configurações pré-determinadas (data/catalogs/douglas-cezar/contrato.json)
+ARTISTA = "douglas-cezar"
 
-def get_regras(periodo):
-    """Retorna as regras com o período informado"""
-    return {
-        ("DOUGLAS CEZAR", "Writer Share"): [
-            {"Contract - Money In": "ABRAMUS"},
-            {"nome_income1": periodo + " EXECUCAO PUBLICA - DOUGLAS CEZAR - NN AQUISICAO (50%)"},
-            {"nome_income2": periodo + " EXECUCAO PUBLICA - DOUGLAS CEZAR - RECUPERAVEL (50%)"},
-            {"Contract - Money Out": "NAS NUVENS (WS) - DOUGLAS CEZAR (37,5%)"},
-            {"SPLIT AMOUNT | Organization (%)": 0},
-            {"SPLIT AMOUNT | Rights-Holder (%)": 50},
-            {"Contract - Money Out": "DOUGLAS CEZAR AQUISIÇÃO (37,5%)"},
-            {"SPLIT AMOUNT | Organization (%)": 0},
-            {"SPLIT AMOUNT | Rights-Holder (%)": 50}
-        ],
-        ("DOUGLAS CEZAR", "Publisher Share"): [
-            {"Contract - Money In": "ABRAMUS"},
-            {"nome_income1": periodo + " EXECUCAO PUBLICA - DOUGLAS CEZAR / DC EDICOES - NN AQUISICAO (50%)"},
-            {"nome_income2": periodo + " EXECUCAO PUBLICA - DOUGLAS CEZAR / DC EDICOES - NN RECUPERAVEL (50%)"},
-            {"Contract - Money Out": "NAS NUVENS (PS) - DOUGLAS CEZAR - DC PRODUÇÕES (12,5%)"},
-            {"SPLIT AMOUNT | Organization (%)": 0},
-            {"SPLIT AMOUNT | Rights-Holder (%)": 50},
-            {"Contract - Money Out": "DC PRODUÇÕES (DOUGLAS CEZAR) (PS) (12,5%)"},
-            {"SPLIT AMOUNT | Organization (%)": 30},
-            {"SPLIT AMOUNT | Rights-Holder (%)": 20}
-        ]
-    }
+def exibir_obras_nao_cadastradas(df_nao_cadastradas):
+    """Lista as obras do relatório que não estão no catálogo (ficam fora do cálculo)"""
+    if df_nao_cadastradas is None or df_nao_cadastradas.empty:
+        return
+    st.warning(
+        f"{len(df_nao_cadastradas)} obra(s) não cadastrada(s) ficaram fora do cálculo "
+        f"({formatar_br(df_nao_cadastradas['TOTAL'].sum())})"
+    )
+    with st.expander("Obras não cadastradas"):
+        st.dataframe(
+            estilo_br(df_nao_cadastradas.sort_values('TOTAL', ascending=False), ['TOTAL']),
+            hide_index=True,
+            use_container_width=True
+        )
 
-def format_currency(value):
-    """Formata valor numérico com separadores de milhar e decimais"""
+def main():
+    # Contrato lido aqui (e não na importação) para que um arquivo ausente
+    # ou inválido apareça como erro na página
     try:
-        if isinstance(value, str):
-            value = float(value.replace('R$', '').replace('.', '').replace(',', '.').strip())
-        return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except:
-        return value
-
-class ProcessadorRoyalties:
-    def __init__(self, obras_cadastradas, tipo_relatorio):
-        self.obras_cadastradas = obras_cadastradas
-        self.tipo_relatorio = tipo_relatorio
-        self.autor = AUTOR
-        self.editora = EDITORA
-        
-        if tipo_relatorio == "Writer":
-            self.writer_share = WRITER_SHARE
-            self.nnc_writer_share = NNC_WRITER_SHARE
-            self.publisher_share = 0
-            self.nnc_publisher_share = 0
-            self.publisher_admin_share = 0
-            self.nnc_admin_share = 0
-        else:
-            self.writer_share = 0
-            self.nnc_writer_share = 0
-            self.publisher_share = PUBLISHER_TOTAL_SHARE
-            self.nnc_publisher_share = NNC_PUBLISHER_SHARE
-            self.publisher_admin_share = PUBLISHER_ADMIN_SHARE
-            self.nnc_admin_share = NNC_ADMIN_SHARE
-
-    def processar_relatorio(self, relatorio):
-        """Processa o relatório (pode conter nacional, internacional ou ambos) e retorna os resultados calculados"""
-        
-        # Identifica quais tipos de relatório estão presentes
-        tem_nacional = 'CÓD. OBRA' in relatorio.columns and 'RATEIO' in relatorio.columns
-        tem_internacional = 'ISRC/ISWC' in relatorio.columns and 'Rendimento' in relatorio.columns
-        
-        dfs_obras_processadas = []
-        
-        # Processa relatório NACIONAL se existir
-        if tem_nacional:
-            df_nacional = relatorio[relatorio['CÓD. OBRA'].notna()].copy()
-            if not df_nacional.empty:
-                # Agrupa por código e título, somando os valores
-                df_obras_nac = df_nacional.groupby(['CÓD. OBRA', 'TÍTULO DA MUSICA']).agg({
-                    'RATEIO': 'sum'
-                }).reset_index()
-                df_obras_nac = df_obras_nac.rename(columns={'RATEIO': 'TOTAL'})
-                
-                # Faz merge com obras cadastradas
-                df_obras_nac = df_obras_nac.merge(
-                    self.obras_cadastradas[['CÓD. OBRA', 'AQUIRED', 'CONTROLLED']],
-                    on='CÓD. OBRA',
-                    how='inner'
-                )
-                
-                if not df_obras_nac.empty:
-                    dfs_obras_processadas.append(df_obras_nac)
-        
-        # Processa relatório INTERNACIONAL se existir  
-        if tem_internacional:
-            df_inter = relatorio[relatorio['ISRC/ISWC'].notna()].copy()
-            if not df_inter.empty:
-                # Identifica o nome correto da coluna de título
-                coluna_titulo_inter = 'Título' if 'Título' in df_inter.columns else 'TITULOTITULO'
-                
-                # Agrupa por ISWC e título, somando os valores
-                df_obras_inter = df_inter.groupby(['ISRC/ISWC', coluna_titulo_inter]).agg({
-                    'Rendimento': 'sum'
-                }).reset_index()
-                df_obras_inter = df_obras_inter.rename(columns={'Rendimento': 'TOTAL'})
-                
-                # Faz merge com obras cadastradas usando ISWC
-                df_obras_inter = df_obras_inter.merge(
-                    self.obras_cadastradas[['ISWC', 'AQUIRED', 'CONTROLLED']],
-                    left_on='ISRC/ISWC',
-                    right_on='ISWC',
-                    how='inner'
-                )
-                
-                # Renomeia colunas para padronizar com nacional
-                rename_dict = {'ISRC/ISWC': 'CÓD. OBRA'}
-                rename_dict[coluna_titulo_inter] = 'TÍTULO DA MUSICA'
-                df_obras_inter = df_obras_inter.rename(columns=rename_dict)
-                
-                if not df_obras_inter.empty:
-                    dfs_obras_processadas.append(df_obras_inter)
-        
-        # Se não há obras processadas, retorna vazio
-        if not dfs_obras_processadas:
-            if self.tipo_relatorio == "Writer":
-                return pd.DataFrame(columns=['TITULAR', 'PERCENTUAL', 'TOTAL CALCULADO']), \
-                       pd.DataFrame(), []
-            else:
-                return pd.DataFrame(columns=['TITULAR', 'PERCENTUAL', 'TOTAL CALCULADO']), \
-                       pd.DataFrame(columns=['TITULAR', 'PERCENTUAL', 'TOTAL CALCULADO']), \
-                       pd.DataFrame(), []
-        
-        # Combina as obras processadas de nacional e internacional
-        df_obras = pd.concat(dfs_obras_processadas, ignore_index=True)
-        
-        # Agrupa novamente caso a mesma obra apareça em ambos os relatórios
-        # (usa CÓD. OBRA que agora contém tanto códigos nacionais quanto ISWCs)
-        df_obras = df_obras.groupby(['CÓD. OBRA', 'TÍTULO DA MUSICA']).agg({
-            'TOTAL': 'sum',
-            'AQUIRED': 'first',
-            'CONTROLLED': 'first'
-        }).reset_index()
-        
-        # Calcula resultados baseado no tipo de relatório
-        if self.tipo_relatorio == "Writer":
-            resultados = []
-            for _, obra in df_obras.iterrows():
-                if obra['AQUIRED'] == 'Y':
-                    resultados.extend([
-                        {
-                            'TITULAR': f'{self.autor} (Writer Share)',
-                            'PERCENTUAL': self.writer_share * 100,
-                            'TOTAL CALCULADO': round(obra['TOTAL'] * self.writer_share, 2)
-                        },
-                        {
-                            'TITULAR': 'NN Aquisição (Writer Share)',
-                            'PERCENTUAL': self.nnc_writer_share * 100,
-                            'TOTAL CALCULADO': round(obra['TOTAL'] * self.nnc_writer_share, 2)
-                        }
-                    ])
-                else:
-                    resultados.append({
-                        'TITULAR': 'Não Adquiridos (Writer Share) - Amortização',
-                        'PERCENTUAL': 100.0,
-                        'TOTAL CALCULADO': round(obra['TOTAL'], 2)
-                    })
-            
-            df_titulares = pd.DataFrame(resultados)
-            df_titulares = df_titulares.groupby('TITULAR').agg({
-                'PERCENTUAL': 'first',
-                'TOTAL CALCULADO': 'sum'
-            }).reset_index()
-            
-            return df_titulares, df_obras, resultados
-            
-        else:  # Publisher
-            resultados_aquisicao = []
-            resultados_administracao = []
-            
-            for _, obra in df_obras.iterrows():
-                if obra['AQUIRED'] == 'Y':
-                    # Todas as obras ADQUIRIDAS vão para AQUISIÇÃO
-                    resultados_aquisicao.extend([
-                        {
-                            'TITULAR': f'{self.editora} (Publisher Share)',
-                            'PERCENTUAL': self.publisher_share * self.publisher_admin_share * 100,
-                            'TOTAL CALCULADO': round(obra['TOTAL'] * self.publisher_share * self.publisher_admin_share, 2)
-                        },
-                        {
-                            'TITULAR': 'NN Aquisição (Publisher Share)',
-                            'PERCENTUAL': self.nnc_publisher_share * 100,
-                            'TOTAL CALCULADO': round(obra['TOTAL'] * self.nnc_publisher_share, 2)
-                        },
-                        {
-                            'TITULAR': 'NN Fee (Admin)',
-                            'PERCENTUAL': self.publisher_share * self.nnc_admin_share * 100,
-                            'TOTAL CALCULADO': round(obra['TOTAL'] * self.publisher_share * self.nnc_admin_share, 2)
-                        }
-                    ])
-                else:
-                    # Todas as obras NÃO ADQUIRIDAS vão para ADMINISTRAÇÃO
-                    # AQUIRED=N: Administração pura (sem aquisição)
-                    # Distribui TODO o valor: NN Fee (60%) + DC Editora (40%)
-                    resultados_administracao.extend([
-                        {
-                            'TITULAR': f'{self.editora} (Publisher Share)',
-                            'PERCENTUAL': self.publisher_admin_share * 100,
-                            'TOTAL CALCULADO': round(obra['TOTAL'] * self.publisher_admin_share, 2)
-                        },
-                        {
-                            'TITULAR': 'NN Fee (Admin)',
-                            'PERCENTUAL': self.nnc_admin_share * 100,
-                            'TOTAL CALCULADO': round(obra['TOTAL'] * self.nnc_admin_share, 2)
-                        }
-                    ])
-            
-            df_titulares_aquisicao = pd.DataFrame(resultados_aquisicao)
-            if not df_titulares_aquisicao.empty:
-                df_titulares_aquisicao = df_titulares_aquisicao.groupby('TITULAR').agg({
-                    'PERCENTUAL': 'first',
-                    'TOTAL CALCULADO': 'sum'
-                }).reset_index()
-            
-            df_titulares_administracao = pd.DataFrame(resultados_administracao)
-            if not df_titulares_administracao.empty:
-                df_titulares_administracao = df_titulares_administracao.groupby('TITULAR').agg({
-                    'PERCENTUAL': 'first',
-                    'TOTAL CALCULADO': 'sum'
-                }).reset_index()
-            
-            # Combina todos os resultados para retornar
-            resultados = resultados_aquisicao + resultados_administracao
-            
-            return df_titulares_aquisicao, df_titulares_administracao, df_obras, resultados
-
-def gerar_linhas_incomes(df_titulares, tipo_relatorio, periodo, total_nao_adquiridas=0, total_geral_real=None):
-    """Gera as linhas de incomes no formato do sistema externo
-    
-    Args:
-        df_titulares: DataFrame com os totais por titular
-        tipo_relatorio: "Writer" ou "Publisher"
-        periodo: String com o período (ex: "2025M8")
-        total_nao_adquiridas: Total de obras não adquiridas (usado no Writer)
-        total_geral_real: Total geral real para usar no Gross Amount (usado no Publisher para consolidar Aquisição + Administração)
-    """
-    incomes = []
-    
-    if tipo_relatorio == "Writer":
-        # Para Writer: Gera 2 linhas de income (Aquisição + Recuperável) e 2 linhas de money out
-        regras = get_regras(periodo)
-        regra_writer = regras.get(("DOUGLAS CEZAR", "Writer Share"))
-        
-        if regra_writer:
-            contract_money_in = regra_writer[0]["Contract - Money In"]
-            nome_income1 = regra_writer[1]["nome_income1"]
-            nome_income2 = regra_writer[2]["nome_income2"]
-            
-            # Separa os valores corretamente
-            # Linha 1: NN Aquisição (Writer Share) - vai para NAS NUVENS (WS)
-            total_nnc_acquirer = df_titulares[df_titulares['TITULAR'].str.contains('NN Aquisição \(Writer Share\)', na=False, regex=True)]['TOTAL CALCULADO'].sum()
-            
-            # Linha 2: Douglas Cezar (Writer Share) + Não Adquiridos - vai para DOUGLAS CEZAR AQUISIÇÃO
-            total_douglas = df_titulares[df_titulares['TITULAR'].str.contains('Douglas Cezar', na=False)]['TOTAL CALCULADO'].sum()
-            total_nao_adquiridos = df_titulares[df_titulares['TITULAR'].str.contains('Não Adquiridos \(Writer Share\) - Amortização', na=False, regex=True)]['TOTAL CALCULADO'].sum()
-            total_recuperavel = total_douglas + total_nao_adquiridos
-            
-            # Total geral - usa o total_geral_real se foi fornecido, senão calcula
-            if total_geral_real is not None:
-                total_geral_arredondado = round(total_geral_real, 2)
-            else:
-                total_geral = total_nnc_acquirer + total_recuperavel
-                total_geral_arredondado = round(total_geral, 2)
-            
-            # Arredonda o primeiro Net Amount
-            net_amount_1 = round(total_nnc_acquirer, 2)
-            
-            # Segundo Net Amount é ajustado para que a soma = Gross Amount exato
-            net_amount_2 = round(total_geral_arredondado - net_amount_1, 2)
-            
-            # Income 1 - Aquisição (50%) - NAS NUVENS
-            incomes.append({
-                'Name (*)': nome_income1,
-                'Contract - Money In (*)': contract_money_in,
-                'Sale Date (*)': '',
-                'Payment Date (*)': '',
-                'Net Amount (*)': net_amount_1,
-                'Gross Amount': total_geral_arredondado,
-                'Foreign Currency': '',
-                'Foreign Net Amount': '',
-                'Foreign Gross Amount': '',
-                'Contract - Money Out (*)': regra_writer[3]["Contract - Money Out"],
-                'SPLIT AMOUNT | Organization (*)': 0,
-                'SPLIT AMOUNT | Rights-Holder (*)': net_amount_1,
-                'Notes': f"Org: 0% | Rights: 50%"
-            })
-            
-            # Income 2 - Recuperável (50%) - DOUGLAS CEZAR AQUISIÇÃO
-            incomes.append({
-                'Name (*)': nome_income2,
-                'Contract - Money In (*)': contract_money_in,
-                'Sale Date (*)': '',
-                'Payment Date (*)': '',
-                'Net Amount (*)': net_amount_2,
-                'Gross Amount': total_geral_arredondado,
-                'Foreign Currency': '',
-                'Foreign Net Amount': '',
-                'Foreign Gross Amount': '',
-                'Contract - Money Out (*)': regra_writer[6]["Contract - Money Out"],
-                'SPLIT AMOUNT | Organization (*)': 0,
-                'SPLIT AMOUNT | Rights-Holder (*)': net_amount_2,
-                'Notes': f"Org: 0% | Rights: 50%"
-            })
-    
-    else:  # Publisher
-        # Para Publisher: Gera 2 linhas de income (Aquisição + Recuperável)
-        regras = get_regras(periodo)
-        regra_publisher = regras.get(("DOUGLAS CEZAR", "Publisher Share"))
-        
-        if regra_publisher:
-            contract_money_in = regra_publisher[0]["Contract - Money In"]
-            nome_income1 = regra_publisher[1]["nome_income1"]
-            nome_income2 = regra_publisher[2]["nome_income2"]
-            
-            # Linha 1: Apenas NN Aquisição (Publisher Share) - vai para NAS NUVENS (PS)
-            total_nnc_acquirer = df_titulares[df_titulares['TITULAR'].str.contains('NN Aquisição \(Publisher Share\)', na=False, regex=True)]['TOTAL CALCULADO'].sum()
-            
-            # Linha 2: TODO O RESTO (DC Editora + NN Fee + outros NNC) - vai para DC PRODUÇÕES
-            # Organization = NN Fee (Admin)
-            # Rights-Holder = DC Editora (Publisher Share)
-            total_admin = df_titulares[df_titulares['TITULAR'].str.contains('NN Fee \(Admin\)', na=False, regex=True)]['TOTAL CALCULADO'].sum()
-            total_dc = df_titulares[df_titulares['TITULAR'].str.contains('DC Editora \(Publisher Share\)', na=False, regex=True)]['TOTAL CALCULADO'].sum()
-            
-            # Outros NNC que não são NN Aquisição
-            total_nnc_outros = df_titulares[
-                (df_titulares['TITULAR'].str.contains('NNC', na=False) | df_titulares['TITULAR'].str.contains('Não Adquiridos', na=False)) & 
-                (~df_titulares['TITULAR'].str.contains('NN Aquisição \(Publisher Share\)', na=False, regex=True))
-            ]['TOTAL CALCULADO'].sum()
-            
-            # Total Recuperável = tudo que não é NN Aquisição
-            total_recuperavel = total_dc + total_admin + total_nnc_outros
-            
-            # Total geral - usa o total_geral_real se foi fornecido (para consolidação), senão calcula
-            if total_geral_real is not None:
-                total_geral = total_geral_real
-            else:
-                total_geral = total_nnc_acquirer + total_recuperavel
-            
-            total_geral_arredondado = round(total_geral, 2)
-            
-            # Arredonda o primeiro Net Amount
-            net_amount_1 = round(total_nnc_acquirer, 2)
-            
-            # Segundo Net Amount é ajustado para que a soma = Gross Amount exato
-            net_amount_2 = round(total_geral_arredondado - net_amount_1, 2)
-            
-            # Para os splits da linha 2, arredonda Organization primeiro e ajusta Rights-Holder
-            split_org = round(total_admin, 2)
-            split_rights = round(net_amount_2 - split_org, 2)
-            
-            # Income 1 - Aquisição (50%) - NAS NUVENS
-            incomes.append({
-                'Name (*)': nome_income1,
-                'Contract - Money In (*)': contract_money_in,
-                'Sale Date (*)': '',
-                'Payment Date (*)': '',
-                'Net Amount (*)': net_amount_1,
-                'Gross Amount': total_geral_arredondado,
-                'Foreign Currency': '',
-                'Foreign Net Amount': '',
-                'Foreign Gross Amount': '',
-                'Contract - Money Out (*)': regra_publisher[3]["Contract - Money Out"],
-                'SPLIT AMOUNT | Organization (*)': 0,
-                'SPLIT AMOUNT | Rights-Holder (*)': net_amount_1,
-                'Notes': f"Org: 0% | Rights: 50%"
-            })
-            
-            # Income 2 - Recuperável (50%) - DC PRODUÇÕES
-            # Organization = NN Fee (Admin)
-            # Rights-Holder = DC Editora (Publisher Share)
-            incomes.append({
-                'Name (*)': nome_income2,
-                'Contract - Money In (*)': contract_money_in,
-                'Sale Date (*)': '',
-                'Payment Date (*)': '',
-                'Net Amount (*)': net_amount_2,
-                'Gross Amount': total_geral_arredondado,
-                'Foreign Currency': '',
-                'Foreign Net Amount': '',
-                'Foreign Gross Amount': '',
-                'Contract - Money Out (*)': regra_publisher[6]["Contract - Money Out"],
-                'SPLIT AMOUNT | Organization (*)': split_org,
-                'SPLIT AMOUNT | Rights-Holder (*)': split_rights,
-                'Notes': f"Org (NN Fee): {split_org:.2f} | Rights (DC Editora): {split_rights:.2f}"
-            })
-    
-    return pd.DataFrame(incomes)
+        contrato = carregar_contrato(ARTISTA)
+    except Exception as e:
+        st.set_page_config(page_title="Royalties Processor", layout="wide")
+        st.title("Processador de Royalties")
+        st.error(f"Erro ao carregar o contrato de {ARTISTA} (data/catalogs/{ARTISTA}/contrato.json): {str(e)}")
+        return
+    autor = contrato.autor
+    editora = contrato.editora
 
-def main():
-    st.set_page_config(page_title="Royalties Processor - Douglas Cezar & DC Editora", layout="wide")
+    st.set_page_config(page_title=f"Royalties Processor - {autor} & {editora}", layout="wide")
     
     st.title("Processador de Royalties")
-    st.subheader(f"Autor: {AUTOR} | Editora: {EDITORA}")
+    st.subheader(f"Autor: {autor} | Editora: {editora}")
     
     # Inicializa session_state para manter os dados
     if 'dados_processados' not in st.session_state:
@@ -422,8 +51,11 @@ def main():
     periodo = st.text_input("Período para nomes de incomes", "2025M8")
     
     try:
-        obras_cadastradas = pd.read_excel(OBRAS_PATH)
+        # Catálogo indexado por CÓD. OBRA e ISWC (montado uma vez por processo)
+        obras_cadastradas = contrato.indice_obras()
         st.success(f"Obras cadastradas carregadas: {len(obras_cadastradas)} obras")
+        if obras_cadastradas.chaves_repetidas:
+            st.warning(f"Códigos/ISWCs repetidos no catálogo (vale a primeira obra): {', '.join(obras_cadastradas.chaves_repetidas)}")
     except Exception as e:
         st.error(f"Erro ao carregar obras cadastradas: {str(e)}")
         return
@@ -433,7 +65,7 @@ def main():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader("Douglas Cezar (Writer)")
+        st.subheader(f"{autor} (Writer)")
         uploaded_nacional_writer = st.file_uploader(
             "Relatório Nacional (CSV)", 
             type=['csv'],
@@ -446,7 +78,7 @@ def main():
         )
     
     with col2:
-        st.subheader("DC Editora (Publisher)")
+        st.subheader(f"{editora} (Publisher)")
         uploaded_nacional_publisher = st.file_uploader(
             "Relatório Nacional (CSV)", 
             type=['csv'],
@@ -462,30 +94,16 @@ def main():
         # Carrega relatórios Writer
         relatorios_writer = []
         if uploaded_nacional_writer:
-            relatorios_writer.append(pd.read_csv(
-                uploaded_nacional_writer,
-                sep=';',
-                encoding="ISO-8859-1",
-                decimal=',',
-                thousands='.',
-                header=4
-            ))
+            relatorios_writer.append(ler_relatorio(uploaded_nacional_writer))
         if uploaded_internacional_writer:
-            relatorios_writer.append(pd.read_excel(uploaded_internacional_writer))
+            relatorios_writer.append(ler_relatorio(uploaded_internacional_writer))
         
         # Carrega relatórios Publisher
         relatorios_publisher = []
         if uploaded_nacional_publisher:
-            relatorios_publisher.append(pd.read_csv(
-                uploaded_nacional_publisher,
-                sep=';',
-                encoding="ISO-8859-1",
-                decimal=',',
-                thousands='.',
-                header=4
-            ))
+            relatorios_publisher.append(ler_relatorio(uploaded_nacional_publisher))
         if uploaded_internacional_publisher:
-            relatorios_publisher.append(pd.read_excel(uploaded_internacional_publisher))
+            relatorios_publisher.append(ler_relatorio(uploaded_internacional_publisher))
         
         if not relatorios_writer and not relatorios_publisher:
             st.warning("Nenhum relatório foi carregado")
@@ -501,24 +119,13 @@ def main():
             if relatorios_writer:
                 # Concatena TODOS os relatórios primeiro (nacional + internacional)
                 relatorio_writer_completo = pd.concat(relatorios_writer, ignore_index=True)
-                processador_writer = ProcessadorRoyalties(obras_cadastradas, "Writer")
-                
-                # Calcula totais separados para exibição
-                total_nacional_writer = 0
-                total_internacional_writer = 0
+                processador_writer = ProcessadorRoyalties(obras_cadastradas, "Writer", contrato)
                 
-                for i, rel in enumerate(relatorios_writer):
-                    if 'RATEIO' in rel.columns and 'CÓD. OBRA' in rel.columns:  # Nacional
-                        total_nacional_writer += rel['RATEIO'].sum()
-                    elif 'Rendimento' in rel.columns:  # Internacional
-                        total_internacional_writer += rel['Rendimento'].sum()
-                
-                # Total geral considerando ambas as colunas
-                total_geral_writer = 0
-                if 'RATEIO' in relatorio_writer_completo.columns:
-                    total_geral_writer += relatorio_writer_completo['RATEIO'].fillna(0).sum()
-                if 'Rendimento' in relatorio_writer_completo.columns:
-                    total_geral_writer += relatorio_writer_completo['Rendimento'].fillna(0).sum()
+                # Calcula totais separados para exibição (nacional, internacional e geral)
+                totais_writer = calcular_totais(relatorios_writer, relatorio_writer_completo)
+                total_nacional_writer = totais_writer['total_nacional']
+                total_internacional_writer = totais_writer['total_internacional']
+                total_geral_writer = totais_writer['total_geral']
                 
                 # Processa o relatório completo (nacional + internacional juntos)
                 df_titulares_writer, df_obras_writer, resultados_writer = processador_writer.processar_relatorio(relatorio_writer_completo)
@@ -528,7 +135,7 @@ def main():
                 total_processado_writer = df_obras_writer['TOTAL'].sum()
                 total_nao_processado_writer = total_geral_writer - total_processado_writer
                 
-                df_incomes_writer = gerar_linhas_incomes(df_titulares_writer, "Writer", periodo, total_nao_acquired_writer, total_processado_writer)
+                df_incomes_writer = gerar_linhas_incomes(df_titulares_writer, "Writer", periodo, contrato, total_processado_writer)
                 
                 # Salva dados do Writer no session_state
                 dados['writer'] = {
@@ -540,6 +147,7 @@ def main():
                     'total_nao_acquired': total_nao_acquired_writer,
                     'total_nao_processado': total_nao_processado_writer,
                     'qtd_obras': len(df_obras_writer),
+                    'obras_nao_cadastradas': processador_writer.obras_nao_cadastradas,
                     'df_titulares': df_titulares_writer,
                     'df_obras': df_obras_writer,
                     'df_incomes': df_incomes_writer
@@ -549,24 +157,13 @@ def main():
             if relatorios_publisher:
                 # Concatena TODOS os relatórios primeiro (nacional + internacional)
                 relatorio_publisher_completo = pd.concat(relatorios_publisher, ignore_index=True)
-                processador_publisher = ProcessadorRoyalties(obras_cadastradas, "Publisher")
-                
-                # Calcula totais separados para exibição
-                total_nacional_publisher = 0
-                total_internacional_publisher = 0
+                processador_publisher = ProcessadorRoyalties(obras_cadastradas, "Publisher", contrato)
                 
-                for i, rel in enumerate(relatorios_publisher):
-                    if 'RATEIO' in rel.columns and 'CÓD. OBRA' in rel.columns:  # Nacional
-                        total_nacional_publisher += rel['RATEIO'].sum()
-                    elif 'Rendimento' in rel.columns:  # Internacional
-                        total_internacional_publisher += rel['Rendimento'].sum()
-                
-                # Total geral considerando ambas as colunas
-                total_geral_publisher = 0
-                if 'RATEIO' in relatorio_publisher_completo.columns:
-                    total_geral_publisher += relatorio_publisher_completo['RATEIO'].fillna(0).sum()
-                if 'Rendimento' in relatorio_publisher_completo.columns:
-                    total_geral_publisher += relatorio_publisher_completo['Rendimento'].fillna(0).sum()
+                # Calcula totais separados para exibição (nacional, internacional e geral)
+                totais_publisher = calcular_totais(relatorios_publisher, relatorio_publisher_completo)
+                total_nacional_publisher = totais_publisher['total_nacional']
+                total_internacional_publisher = totais_publisher['total_internacional']
+                total_geral_publisher = totais_publisher['total_geral']
                 
                 # Processa o relatório completo (nacional + internacional juntos)
                 df_titulares_aquisicao, df_titulares_administracao, df_obras_publisher, resultados_publisher = processador_publisher.processar_relatorio(relatorio_publisher_completo)
@@ -576,66 +173,15 @@ def main():
                 total_processado_publisher = df_obras_publisher['TOTAL'].sum()
                 total_nao_processado_publisher = total_geral_publisher - total_processado_publisher
                 
-                # Gera incomes passando o total_processado_publisher como total_geral_real
-                # para que ambas as tabelas (aquisição e administração) usem o mesmo Gross Amount
-                df_incomes_aquisicao = gerar_linhas_incomes(
-                    df_titulares_aquisicao, "Publisher", periodo, 
-                    total_geral_real=total_processado_publisher
-                ) if not df_titulares_aquisicao.empty else None
+                # Gera as incomes sobre os titulares de aquisição e administração juntos:
+                # a linha de NN AQUISICAO sai da aquisição e a RECUPERAVEL fecha o Gross Amount
+                titulares_publisher = [df for df in (df_titulares_aquisicao, df_titulares_administracao) if not df.empty]
+                df_titulares_publisher = pd.concat(titulares_publisher, ignore_index=True) if titulares_publisher else pd.DataFrame()
                 
-                df_incomes_administracao = gerar_linhas_incomes(
-                    df_titulares_administracao, "Publisher", periodo,
+                df_incomes_consolidado = gerar_linhas_incomes(
+                    df_titulares_publisher, "Publisher", periodo, contrato,
                     total_geral_real=total_processado_publisher
-                ) if not df_titulares_administracao.empty else None
-                
-                # Combina as incomes de aquisição e administração em uma única tabela consolidada
-                df_incomes_consolidado = None
-                if df_incomes_aquisicao is not None and df_incomes_administracao is not None:
-                    # Combina os dois DataFrames
-                    # A linha de NN AQUISICAO vem apenas da aquisição (linha 0)
-                    # A linha de NN RECUPERAVEL (linha 1) soma aquisição + administração
-                    df_incomes_consolidado = df_incomes_aquisicao.copy()
-                    
-                    # Identifica qual linha da administração é a RECUPERAVEL
-                    # Se administração tem 2 linhas, RECUPERAVEL é a linha 1
-                    # Se administração tem 1 linha, RECUPERAVEL é a linha 0
-                    idx_recuperavel_admin = 1 if len(df_incomes_administracao) > 1 else 0
-                    
-                    # Soma os valores da linha RECUPERAVEL
-                    df_incomes_consolidado.loc[1, 'Net Amount (*)'] += df_incomes_administracao.loc[idx_recuperavel_admin, 'Net Amount (*)']
-                    df_incomes_consolidado.loc[1, 'SPLIT AMOUNT | Organization (*)'] += df_incomes_administracao.loc[idx_recuperavel_admin, 'SPLIT AMOUNT | Organization (*)']
-                    df_incomes_consolidado.loc[1, 'SPLIT AMOUNT | Rights-Holder (*)'] += df_incomes_administracao.loc[idx_recuperavel_admin, 'SPLIT AMOUNT | Rights-Holder (*)']
-                elif df_incomes_aquisicao is not None:
-                    df_incomes_consolidado = df_incomes_aquisicao
-                elif df_incomes_administracao is not None:
-                    # Se só tem administração, cria uma linha de NN AQUISICAO zerada e uma de RECUPERAVEL
-                    regras = get_regras(periodo)
-                    regra_publisher = regras.get(("DOUGLAS CEZAR", "Publisher Share"))
-                    if regra_publisher:
-                        contract_money_in = regra_publisher[0]["Contract - Money In"]
-                        nome_income1 = regra_publisher[1]["nome_income1"]
-                        
-                        # Identifica a linha de RECUPERAVEL na administração
-                        idx_recuperavel_admin = 1 if len(df_incomes_administracao) > 1 else 0
-                        total_geral = df_incomes_administracao.loc[idx_recuperavel_admin, 'Gross Amount']
-                        
-                        # Linha de NN AQUISICAO zerada
-                        linha_aquisicao = {
-                            'Name (*)': nome_income1,
-                            'Contract - Money In (*)': contract_money_in,
-                            'Sale Date (*)': '',
-                            'Payment Date (*)': '',
-                            'Net Amount (*)': 0.0,
-                            'Gross Amount': total_geral,
-                            'Foreign Currency': '',
-                            'Foreign Net Amount': '',
-                            'Foreign Gross Amount': '',
-                            'Contract - Money Out (*)': regra_publisher[3]["Contract - Money Out"],
-                            'SPLIT AMOUNT | Organization (*)': 0,
-                            'SPLIT AMOUNT | Rights-Holder (*)': 0.0,
-                            'Notes': f"Org: 0% | Rights: 50%"
-                        }
-                        df_incomes_consolidado = pd.concat([pd.DataFrame([linha_aquisicao]), df_incomes_administracao.iloc[[idx_recuperavel_admin]].reset_index(drop=True)], ignore_index=True)
+                ) if not df_titulares_publisher.empty else None
                 
                 # Salva dados do Publisher no session_state
                 dados['publisher'] = {
@@ -647,11 +193,10 @@ def main():
                     'total_nao_acquired': total_nao_acquired_publisher,
                     'total_nao_processado': total_nao_processado_publisher,
                     'qtd_obras': len(df_obras_publisher),
+                    'obras_nao_cadastradas': processador_publisher.obras_nao_cadastradas,
                     'df_titulares_aquisicao': df_titulares_aquisicao,
                     'df_titulares_administracao': df_titulares_administracao,
                     'df_obras': df_obras_publisher,
-                    'df_incomes_aquisicao': df_incomes_aquisicao,
-                    'df_incomes_administracao': df_incomes_administracao,
                     'df_incomes_consolidado': df_incomes_consolidado
                 }
             
@@ -669,7 +214,7 @@ def main():
         
         # Exibe Writer se houver dados
         if dados['writer']:
-            st.header("Resultados - Writer (Douglas Cezar)")
+            st.header(f"Resultados - Writer ({autor})")
             d = dados['writer']
             
             # Exibe métricas com separação Nacional/Internacional
@@ -677,22 +222,22 @@ def main():
             
             with col1:
                 if d['total_nacional'] > 0:
-                    st.metric("Total Nacional", format_currency(d['total_nacional']))
+                    st.metric("Total Nacional", formatar_br(d['total_nacional']))
                 if d['total_internacional'] > 0:
-                    st.metric("Total Internacional", format_currency(d['total_internacional']))
+                    st.metric("Total Internacional", formatar_br(d['total_internacional']))
             
             with col2:
-                st.metric("Total Geral", format_currency(d['total_geral']))
-                st.metric("Total Processado", format_currency(d['total_processado']))
+                st.metric("Total Geral", formatar_br(d['total_geral']))
+                st.metric("Total Processado", formatar_br(d['total_processado']))
             
             with col3:
-                st.metric("Obras Adquiridas", format_currency(d['total_acquired']))
-                st.metric("Obras Não Adquiridas", format_currency(d['total_nao_acquired']), 
+                st.metric("Obras Adquiridas", formatar_br(d['total_acquired']))
+                st.metric("Obras Não Adquiridas", formatar_br(d['total_nao_acquired']), 
                          delta_color="inverse")
             
             with col4:
                 if d['total_nao_processado'] > 0:
-                    st.metric("Não Processado", format_currency(d['total_nao_processado']),
+                    st.metric("Não Processado", formatar_br(d['total_nao_processado']),
                              delta_color="inverse")
                 st.metric("Quantidade de Obras", d['qtd_obras'])
             
@@ -719,9 +264,7 @@ def main():
                 return [''] * len(row)
             
             st.dataframe(
-                df_titulares_display.style.format({
-                    'TOTAL CALCULADO': format_currency
-                }).apply(highlight_total, axis=1),
+                estilo_br(df_titulares_display, ['TOTAL CALCULADO']).apply(highlight_total, axis=1),
                 hide_index=True,
                 use_container_width=True
             )
@@ -760,13 +303,13 @@ def main():
                 st.metric(
                     "Gross Amount = Total Geral",
                     "✅" if check1 else "❌",
-                    f"{format_currency(gross_amount_income)} = {format_currency(total_geral)}"
+                    f"{formatar_br(gross_amount_income)} = {formatar_br(total_geral)}"
                 )
             with col2:
                 st.metric(
                     "Soma Net Amount = Gross Amount",
                     "✅" if check2 else "❌",
-                    f"{format_currency(soma_net_amount)}"
+                    f"{formatar_br(soma_net_amount)}"
                 )
             with col3:
                 st.metric(
@@ -794,18 +337,18 @@ def main():
             df_obras_writer_filtered = df_obras_writer_filtered.sort_values('TOTAL', ascending=False)
             
             st.dataframe(
-                df_obras_writer_filtered.style.format({
-                    'TOTAL': format_currency
-                }),
+                estilo_br(df_obras_writer_filtered, ['TOTAL']),
                 hide_index=True,
                 use_container_width=True
             )
             
+            exibir_obras_nao_cadastradas(d['obras_nao_cadastradas'])
+            
             st.divider()
         
         # Exibe Publisher se houver dados
         if dados['publisher']:
-            st.header("Resultados - Publisher (DC Editora)")
+            st.header(f"Resultados - Publisher ({editora})")
             d = dados['publisher']
             
             # Exibe métricas com separação Nacional/Internacional
@@ -813,22 +356,22 @@ def main():
             
             with col1:
                 if d['total_nacional'] > 0:
-                    st.metric("Total Nacional", format_currency(d['total_nacional']))
+                    st.metric("Total Nacional", formatar_br(d['total_nacional']))
                 if d['total_internacional'] > 0:
-                    st.metric("Total Internacional", format_currency(d['total_internacional']))
+                    st.metric("Total Internacional", formatar_br(d['total_internacional']))
             
             with col2:
-                st.metric("Total Geral", format_currency(d['total_geral']))
-                st.metric("Total Processado", format_currency(d['total_processado']))
+                st.metric("Total Geral", formatar_br(d['total_geral']))
+                st.metric("Total Processado", formatar_br(d['total_processado']))
             
             with col3:
-                st.metric("Obras Adquiridas", format_currency(d['total_acquired']))
-                st.metric("Obras Não Adquiridas", format_currency(d['total_nao_acquired']), 
+                st.metric("Obras Adquiridas", formatar_br(d['total_acquired']))
+                st.metric("Obras Não Adquiridas", formatar_br(d['total_nao_acquired']), 
                          delta_color="inverse")
             
             with col4:
                 if d['total_nao_processado'] > 0:
-                    st.metric("Não Processado", format_currency(d['total_nao_processado']),
+                    st.metric("Não Processado", formatar_br(d['total_nao_processado']),
                              delta_color="inverse")
                 st.metric("Quantidade de Obras", d['qtd_obras'])
             
@@ -856,9 +399,7 @@ def main():
                     return [''] * len(row)
                 
                 st.dataframe(
-                    df_aquisicao_display.style.format({
-                        'TOTAL CALCULADO': format_currency
-                    }).apply(highlight_total, axis=1),
+                    estilo_br(df_aquisicao_display, ['TOTAL CALCULADO']).apply(highlight_total, axis=1),
                     hide_index=True,
                     use_container_width=True
                 )
@@ -887,9 +428,7 @@ def main():
                     return [''] * len(row)
                 
                 st.dataframe(
-                    df_admin_display.style.format({
-                        'TOTAL CALCULADO': format_currency
-                    }).apply(highlight_total, axis=1),
+                    estilo_br(df_admin_display, ['TOTAL CALCULADO']).apply(highlight_total, axis=1),
                     hide_index=True,
                     use_container_width=True
                 )
@@ -929,13 +468,13 @@ def main():
                     st.metric(
                         "Gross Amount = Total Geral",
                         "✅" if check1 else "❌",
-                        f"{format_currency(gross_amount_income)} = {format_currency(total_geral)}"
+                        f"{formatar_br(gross_amount_income)} = {formatar_br(total_geral)}"
                     )
                 with col2:
                     st.metric(
                         "Soma Net Amount = Gross Amount",
                         "✅" if check2 else "❌",
-                        f"{format_currency(soma_net_amount)}"
+                        f"{formatar_br(soma_net_amount)}"
                     )
                 with col3:
                     st.metric(
@@ -963,12 +502,12 @@ def main():
             df_obras_publisher_filtered = df_obras_publisher_filtered.sort_values('TOTAL', ascending=False)
             
             st.dataframe(
-                df_obras_publisher_filtered.style.format({
-                    'TOTAL': format_currency
-                }),
+                estilo_br(df_obras_publisher_filtered, ['TOTAL']),
                 hide_index=True,
                 use_container_width=True
             )
+            
+            exibir_obras_nao_cadastradas(d['obras_nao_cadastradas'])
         
         # Exportação de CSV com todas as incomes (Writer + Publisher)
         if dados['writer'] or dados['publisher']:
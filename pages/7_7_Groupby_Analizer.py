@@ -1,12 +1,133 @@
 import streamlit as st
 import pandas as pd
 import io
-from typing import List, Optional
+from typing import Hashable, List, Optional
+
+from utils.agregacao import OPERACOES, agregar, agregar_em_blocos, categorizar, ler_em_blocos, nome_metrica
 
 st.set_page_config(page_title="Royalties GroupBy Analyzer", layout="wide")
 
 st.title("📊 Análise de Relatórios de Royalties")
 
+MODO_MEMORIA = "Em memória"
+MODO_BLOCOS = "Em blocos (arquivos grandes)"
+
+# Linhas lidas de cada arquivo no modo em blocos, só para conhecer as colunas
+LINHAS_AMOSTRA = 200
+
+
+def chave_arquivo(file) -> Hashable:
+    """
+    Identifica o upload entre reruns sem ler o conteúdo: nome, tamanho e o
+    id que o Streamlit dá a cada envio (um novo envio do mesmo arquivo
+    ganha outro id)
+    """
+    return (file.name, file.size, getattr(file, 'file_id', None))
+
+
+def listar_planilhas(file, chave: Hashable) -> List[str]:
+    """Nomes das planilhas de um Excel, lidos uma única vez por arquivo"""
+    planilhas = st.session_state.setdefault('groupby_planilhas', {})
+    if chave not in planilhas:
+        planilhas[chave] = pd.ExcelFile(io.BytesIO(file.getvalue())).sheet_names
+    return planilhas[chave]
+
+
+def carregar_arquivo(file, csv_encoding: str, header_row: int, sheet_name) -> pd.DataFrame:
+    if file.name.endswith('.csv'):
+        return pd.read_csv(io.BytesIO(file.getvalue()), encoding=csv_encoding, header=header_row)
+    return pd.read_excel(io.BytesIO(file.getvalue()), sheet_name=sheet_name, header=header_row)
+
+
+def blocos_arquivo(file, csv_encoding: str, header_row: int, sheet_name, tamanho: Optional[int] = None):
+    """Lê o arquivo em blocos de linhas, sem carregá-lo inteiro num DataFrame"""
+    opcoes = {'tamanho': tamanho} if tamanho else {}
+    return ler_em_blocos(
+        io.BytesIO(file.getvalue()),
+        file.name,
+        linha_cabecalho=header_row,
+        sheet_name=sheet_name,
+        encoding=csv_encoding,
+        **opcoes
+    )
+
+
+def configurar_analise(all_columns: list, numeric_columns: list):
+    """Widgets de colunas de agrupamento, métricas e pivô"""
+    st.subheader("⚙️ Configurações de Análise")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        groupby_cols = st.multiselect(
+            "Colunas para agrupar (GroupBy)",
+            options=all_columns,
+            default=all_columns[:1]
+        )
+
+        metric_operations = st.multiselect(
+            "Operações",
+            options=list(OPERACOES.keys()),
+            default=["Soma"]
+        )
+
+    with col2:
+        value_cols = st.multiselect(
+            "Colunas de valores",
+            options=all_columns,
+            default=numeric_columns[:1]
+        )
+
+        pivot_col: Optional[str] = st.selectbox(
+            "Coluna para pivotar (opcional)",
+            options=[None] + [col for col in all_columns if col not in groupby_cols],
+            format_func=lambda col: "Nenhuma" if col is None else str(col),
+            help="Os valores dessa coluna viram colunas do resultado"
+        )
+
+    metricas = [(value_col, operation) for value_col in value_cols for operation in metric_operations]
+    return groupby_cols, metricas, pivot_col
+
+
+def exibir_resultado(result_df: pd.DataFrame, groupby_cols: list, metricas: list, pivot_col: Optional[str]):
+    # Mostrar resultados
+    st.subheader("📈 Resultados")
+    st.dataframe(
+        result_df,
+        use_container_width=True,
+        height=400
+    )
+
+    # Estatísticas da primeira métrica
+    first_metric = nome_metrica(metricas[0][1], metricas[0][0])
+    if pivot_col is None:
+        metric_values = result_df[first_metric]
+    else:
+        metric_values = result_df.drop(columns=groupby_cols)
+        if len(metricas) > 1:
+            metric_values = metric_values.loc[:, metric_values.columns.str.startswith(f"{first_metric} | ")]
+        metric_values = metric_values.sum(axis=1, min_count=1)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total de grupos", len(result_df))
+    with col2:
+        st.metric(f"Valor total ({first_metric})", f"{metric_values.sum():,.2f}")
+    with col3:
+        st.metric(f"Valor médio ({first_metric})", f"{metric_values.mean():,.2f}")
+
+    # Download
+    csv_buffer = io.StringIO()
+    result_df.to_csv(csv_buffer, index=False)
+
+    st.download_button(
+        label="⬇️ Download CSV",
+        data=csv_buffer.getvalue(),
+        file_name="royalties_analysis.csv",
+        mime="text/csv"
+    )
+
+
 # Upload de arquivos
 uploaded_files = st.file_uploader(
     "Carregue um ou mais arquivos (CSV ou XLSX)",
@@ -21,7 +142,7 @@ if uploaded_files:
         ["utf-8", "latin-1", "iso-8859-1", "cp1252", "utf-16"],
         index=0
     )
-    
+
     # Campo para linha do cabeçalho
     header_row = st.number_input(
         "Linha do cabeçalho (0 = primeira linha)",
@@ -29,15 +150,24 @@ if uploaded_files:
         value=0,
         step=1
     )
-    
+
+    modo_leitura = st.radio(
+        "Modo de leitura",
+        [MODO_MEMORIA, MODO_BLOCOS],
+        horizontal=True,
+        help="Em blocos: os arquivos são lidos aos poucos e só os totais por grupo ficam em memória (sem filtros nem prévia)"
+    )
+
+    chaves = [chave_arquivo(file) for file in uploaded_files]
+
     # Verificar planilhas em arquivos Excel
     excel_sheets = {}
-    for file in uploaded_files:
+    for file, chave in zip(uploaded_files, chaves):
         if file.name.endswith(('.xlsx', '.xls')):
-            excel_file = pd.ExcelFile(file)
-            if len(excel_file.sheet_names) > 1:
-                excel_sheets[file.name] = excel_file.sheet_names
-    
+            sheet_names = listar_planilhas(file, chave)
+            if len(sheet_names) > 1:
+                excel_sheets[file.name] = sheet_names
+
     # Seletor de planilhas se necessário
     sheet_selections = {}
     if excel_sheets:
@@ -48,146 +178,167 @@ if uploaded_files:
                 options=sheets,
                 key=f"sheet_{filename}"
             )
-    
-    # Carregar arquivos
-    dfs = []
-    errors = []
-    
-    for file in uploaded_files:
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file, encoding=csv_encoding, header=header_row)
-            else:
-                sheet_name = sheet_selections.get(file.name, 0)
-                df = pd.read_excel(file, sheet_name=sheet_name, header=header_row)
-            dfs.append((file.name, df))
-        except Exception as e:
-            errors.append(f"{file.name}: {str(e)}")
-    
-    if errors:
-        st.error("Erros ao carregar arquivos:")
-        for error in errors:
-            st.write(f"- {error}")
-    
-    if dfs:
-        st.success(f"{len(dfs)} arquivo(s) carregado(s) com sucesso")
-        
-        # Validar estrutura dos dataframes
+
+    # Os arquivos só são lidos e concatenados de novo quando o envio ou
+    # as opções de leitura mudam; filtros e métricas reaproveitam o DataFrame
+    assinatura = (
+        tuple(chaves),
+        csv_encoding,
+        int(header_row),
+        tuple(sorted(sheet_selections.items())),
+    )
+
+    if modo_leitura == MODO_BLOCOS:
+        # Libera o DataFrame combinado do modo em memória, se houver
+        st.session_state.pop('groupby_dados', None)
+
+        # Só as primeiras linhas de cada arquivo, para conhecer e validar as colunas
+        amostras = []
+        for file in uploaded_files:
+            try:
+                amostra = next(iter(blocos_arquivo(file, csv_encoding, header_row, sheet_selections.get(file.name, 0), LINHAS_AMOSTRA)), None)
+            except Exception as e:
+                st.error(f"Erro ao ler {file.name}: {str(e)}")
+                st.stop()
+            amostras.append((file.name, amostra if amostra is not None else pd.DataFrame()))
+
+        first_cols = set(amostras[0][1].columns)
+        mismatches = [name for name, amostra in amostras[1:] if set(amostra.columns) != first_cols]
+        if mismatches:
+            st.error(f"❌ Arquivos com estrutura diferente: {', '.join(mismatches)}")
+            st.stop()
+
+        sample_df = amostras[0][1]
+        groupby_cols, metricas, pivot_col = configurar_analise(
+            sample_df.columns.tolist(),
+            sample_df.select_dtypes(include='number').columns.tolist()
+        )
+        st.caption("No modo em blocos os filtros não estão disponíveis: todas as linhas entram na análise.")
+
+        configuracao = (assinatura, tuple(groupby_cols), tuple(metricas), pivot_col)
+        if not groupby_cols or not metricas:
+            st.warning("Selecione ao menos uma coluna para agrupar, uma coluna de valores e uma operação")
+        elif st.button("🚀 Gerar Análise", type="primary"):
+            def blocos():
+                for file in uploaded_files:
+                    yield from blocos_arquivo(file, csv_encoding, header_row, sheet_selections.get(file.name, 0))
+
+            progresso = st.empty()
+            try:
+                with st.spinner("Agregando arquivos em blocos..."):
+                    result_df = agregar_em_blocos(
+                        blocos(),
+                        groupby_cols,
+                        metricas,
+                        pivo=pivot_col,
+                        ao_processar=lambda linhas: progresso.text(f"{linhas:,} registros lidos")
+                    )
+                st.session_state['groupby_blocos'] = {'configuracao': configuracao, 'resultado': result_df}
+            except Exception as e:
+                st.error(f"Erro ao processar: {str(e)}")
+            finally:
+                progresso.empty()
+
+        # O resultado fica guardado enquanto arquivos e configuração não mudam
+        salvo = st.session_state.get('groupby_blocos')
+        if salvo is not None and salvo['configuracao'] == configuracao:
+            exibir_resultado(salvo['resultado'], groupby_cols, metricas, pivot_col)
+        st.stop()
+
+    carregado = st.session_state.get('groupby_dados')
+
+    if carregado is None or carregado['assinatura'] != assinatura:
+        st.session_state['groupby_dados'] = None
+        dfs = []
+        errors = []
+
+        with st.spinner("Carregando arquivos..."):
+            for file in uploaded_files:
+                try:
+                    df = carregar_arquivo(file, csv_encoding, header_row, sheet_selections.get(file.name, 0))
+                    dfs.append((file.name, df))
+                except Exception as e:
+                    errors.append(f"{file.name}: {str(e)}")
+
+        mismatches = []
         if len(dfs) > 1:
             first_cols = set(dfs[0][1].columns)
-            mismatches = []
-            
             for name, df in dfs[1:]:
                 if set(df.columns) != first_cols:
                     mismatches.append(name)
-            
-            if mismatches:
-                st.error(f"❌ Arquivos com estrutura diferente: {', '.join(mismatches)}")
-                st.stop()
-        
-        # Concatenar dataframes
-        combined_df = pd.concat([df for _, df in dfs], ignore_index=True)
+
+        combined_df = None
+        if dfs and not mismatches:
+            # Concatenar dataframes e converter as colunas de texto repetitivas em category
+            combined_df = categorizar(pd.concat([df for _, df in dfs], ignore_index=True))
+
+        carregado = {
+            'assinatura': assinatura,
+            'qtd_arquivos': len(dfs),
+            'errors': errors,
+            'mismatches': mismatches,
+            'dados': combined_df,
+        }
+        st.session_state['groupby_dados'] = carregado
+
+    if carregado['errors']:
+        st.error("Erros ao carregar arquivos:")
+        for error in carregado['errors']:
+            st.write(f"- {error}")
+
+    if carregado['qtd_arquivos']:
+        st.success(f"{carregado['qtd_arquivos']} arquivo(s) carregado(s) com sucesso")
+
+        # Validar estrutura dos dataframes
+        if carregado['mismatches']:
+            st.error(f"❌ Arquivos com estrutura diferente: {', '.join(carregado['mismatches'])}")
+            st.stop()
+
+        combined_df = carregado['dados']
         st.info(f"Total de registros: {len(combined_df):,}")
-        
+
         # Mostrar preview
         with st.expander("Preview dos dados combinados"):
             st.dataframe(combined_df.head(20))
-        
+
         # Configurações de análise
-        st.subheader("⚙️ Configurações de Análise")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            groupby_col = st.selectbox(
-                "Coluna para agrupar (GroupBy)",
-                options=combined_df.columns.tolist()
-            )
-            
-            metric_operation = st.selectbox(
-                "Operação",
-                options=["Soma", "Média", "Máximo", "Mínimo", "Contagem"]
-            )
-        
-        with col2:
-            value_col = st.selectbox(
-                "Coluna de valores",
-                options=combined_df.columns.tolist(),
-                index=min(1, len(combined_df.columns) - 1)
-            )
-        
-        # Filtro
-        st.subheader("🔍 Filtros")
-        
-        unique_values = combined_df[groupby_col].dropna().unique()
-        unique_values_sorted = sorted(unique_values.astype(str))
-        
-        selected_values = st.multiselect(
-            f"Filtrar valores em '{groupby_col}' (deixe vazio para todos)",
-            options=unique_values_sorted,
-            help="Digite para buscar e selecione múltiplos valores"
+        groupby_cols, metricas, pivot_col = configurar_analise(
+            combined_df.columns.tolist(),
+            combined_df.select_dtypes(include='number').columns.tolist()
         )
-        
-        # Aplicar filtro
-        if selected_values:
-            filtered_df = combined_df[
-                combined_df[groupby_col].astype(str).isin(selected_values)
-            ]
+
+        # Filtros
+        st.subheader("🔍 Filtros")
+
+        filtered_df = combined_df
+        for groupby_col in groupby_cols:
+            valores = combined_df[groupby_col]
+            if isinstance(valores.dtype, pd.CategoricalDtype):
+                valores = valores.cat.categories.to_series()
+            unique_values_sorted = sorted(valores.dropna().unique().astype(str))
+
+            selected_values = st.multiselect(
+                f"Filtrar valores em '{groupby_col}' (deixe vazio para todos)",
+                options=unique_values_sorted,
+                help="Digite para buscar e selecione múltiplos valores",
+                key=f"filtro_{groupby_col}"
+            )
+
+            # Aplicar filtro
+            if selected_values:
+                filtered_df = filtered_df[filtered_df[groupby_col].astype(str).isin(selected_values)]
+
+        if len(filtered_df) != len(combined_df):
             st.info(f"Registros após filtro: {len(filtered_df):,}")
+
+        # Executar análise (só a agregação roda de novo quando filtros ou métricas mudam)
+        if not groupby_cols or not metricas:
+            st.warning("Selecione ao menos uma coluna para agrupar, uma coluna de valores e uma operação")
         else:
-            filtered_df = combined_df
-        
-        # Executar análise
-        if st.button("🚀 Gerar Análise", type="primary"):
             try:
-                # Mapear operações
-                operations = {
-                    "Soma": "sum",
-                    "Média": "mean",
-                    "Máximo": "max",
-                    "Mínimo": "min",
-                    "Contagem": "count"
-                }
-                
-                result_df = filtered_df.groupby(groupby_col)[value_col].agg(
-                    operations[metric_operation]
-                ).reset_index()
-                
-                result_df.columns = [groupby_col, f"{metric_operation} de {value_col}"]
-                result_df = result_df.sort_values(
-                    by=f"{metric_operation} de {value_col}",
-                    ascending=False
-                )
-                
-                # Mostrar resultados
-                st.subheader("📈 Resultados")
-                st.dataframe(
-                    result_df,
-                    use_container_width=True,
-                    height=400
-                )
-                
-                # Estatísticas
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Total de grupos", len(result_df))
-                with col2:
-                    st.metric("Valor total", f"{result_df.iloc[:, 1].sum():,.2f}")
-                with col3:
-                    st.metric("Valor médio", f"{result_df.iloc[:, 1].mean():,.2f}")
-                
-                # Download
-                csv_buffer = io.StringIO()
-                result_df.to_csv(csv_buffer, index=False)
-                
-                st.download_button(
-                    label="⬇️ Download CSV",
-                    data=csv_buffer.getvalue(),
-                    file_name=f"royalties_analysis_{metric_operation.lower()}.csv",
-                    mime="text/csv"
-                )
-                
+                result_df = agregar(filtered_df, groupby_cols, metricas, pivo=pivot_col)
+                exibir_resultado(result_df, groupby_cols, metricas, pivot_col)
             except Exception as e:
                 st.error(f"Erro ao processar: {str(e)}")
 else:
-    st.info("👆 Carregue um ou mais arquivos para começar")
\ No newline at end of file
+    st.info("👆 Carregue um ou mais arquivos para começar")
@@ -1,9 +1,28 @@
 import streamlit as st
 import pandas as pd
-import io
+import os
 import base64
 from typing import List, Dict
 
+from utils.agregacao import OPERACOES, agregar_em_blocos, detectar_encoding, ler_em_blocos
+from utils.concatenacao import (
+    MODOS_ALINHAMENTO,
+    alinhar_colunas,
+    aplicar_esquema,
+    concatenar_para_disco,
+    criar_caminho_temporario,
+    inferir_dtypes,
+    remover_temporario,
+)
+
+MIME_SAIDA = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
+# Linhas lidas de cada arquivo para definir o esquema antes da concatenação
+LINHAS_AMOSTRA = 200
+
 def check_column_consistency(dfs: List[pd.DataFrame]) -> Dict:
     """Verifica se todos os DataFrames têm as mesmas colunas"""
     all_columns = set(dfs[0].columns)
@@ -21,7 +40,7 @@ def check_column_consistency(dfs: List[pd.DataFrame]) -> Dict:
     
     return inconsistencies
 
-def read_file(file, sep=',', decimal='.', thousands=','):
+def read_file(file, sep=',', decimal='.', thousands=',', nrows=None):
     """Lê arquivo com parâmetros personalizados"""
     file_extension = file.name.split('.')[-1].lower()
     
@@ -29,12 +48,14 @@ def read_file(file, sep=',', decimal='.', thousands=','):
         encodings = ['utf-8', 'latin1', 'iso-8859-1']
         for encoding in encodings:
             try:
+                file.seek(0)
                 return pd.read_csv(
                     file,
                     encoding=encoding,
                     sep=sep,
                     decimal=decimal,
-                    thousands=thousands
+                    thousands=thousands,
+                    nrows=nrows
                 )
             except UnicodeDecodeError:
                 continue
@@ -42,18 +63,58 @@ def read_file(file, sep=',', decimal='.', thousands=','):
         return None
     
     elif file_extension in ['xlsx', 'xls']:
-        return pd.read_excel(file)
+        file.seek(0)
+        return pd.read_excel(file, nrows=nrows)
     
     else:
         st.error(f"Formato de arquivo não suportado: {file_extension}")
         return None
 
-def get_download_link(df):
-    """Gera bytes do arquivo Excel para download"""
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-    return output.getvalue()
+def read_file_blocks(file, sep=',', decimal='.', thousands=','):
+    """Lê o arquivo em blocos de linhas (arquivos que não cabem inteiros em memória)"""
+    file_extension = file.name.split('.')[-1].lower()
+    
+    if file_extension == 'csv':
+        encoding = detectar_encoding(file.getvalue(), ['utf-8', 'latin1', 'iso-8859-1'])
+        if encoding is None:
+            st.error(f"Não foi possível ler o arquivo {file.name}. Tente converter para UTF-8.")
+            return None
+        file.seek(0)
+        return ler_em_blocos(
+            file,
+            file.name,
+            encoding=encoding,
+            sep=sep,
+            decimal=decimal,
+            thousands=thousands
+        )
+    
+    file.seek(0)
+    return ler_em_blocos(file, file.name)
+
+def acumular_estatisticas(estatisticas: Dict, df: pd.DataFrame):
+    """
+    Atualiza soma, contagem, mínimo e máximo por coluna com as linhas de
+    um arquivo, para que as agregações não dependam do DataFrame completo.
+    """
+    for col in df.columns:
+        serie = df[col]
+        stats = estatisticas.setdefault(col, {'Contagem': 0, 'numerica': True})
+        stats['Contagem'] += int(serie.count())
+        
+        if not stats['numerica']:
+            continue
+        if not pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+            if serie.notna().any():
+                stats['numerica'] = False
+            continue
+        
+        validos = serie.dropna()
+        if validos.empty:
+            continue
+        stats['Soma'] = stats.get('Soma', 0) + validos.sum()
+        stats['Mínimo'] = min(stats.get('Mínimo', validos.min()), validos.min())
+        stats['Máximo'] = max(stats.get('Máximo', validos.max()), validos.max())
 
 def get_possible_aggregations():
     """Retorna lista de agregações possíveis"""
@@ -64,22 +125,18 @@ def get_possible_aggregations():
        
     ]
 
-def apply_aggregation(df, column, agg_type):
-    """Aplica agregação selecionada"""
-    agg_map = {
-        'Soma': 'sum',
-        'Média': 'mean',
-        'Mediana': 'median',
-        'Mínimo': 'min',
-        'Máximo': 'max',
-        'Contagem': 'count',
-        'Desvio Padrão': 'std',
-        'Primeiro': 'first',
-        'Último': 'last'
-    }
-    
+def apply_aggregation(estatisticas, column, agg_type):
+    """Aplica agregação selecionada a partir das estatísticas acumuladas"""
     try:
-        result = df[column].agg(agg_map[agg_type])
+        stats = estatisticas[column]
+        if agg_type == 'Contagem':
+            result = stats['Contagem']
+        elif not stats['numerica']:
+            raise ValueError(column)
+        elif agg_type == 'Média':
+            result = stats['Soma'] / stats['Contagem']
+        else:
+            result = stats.get(agg_type, 0 if agg_type == 'Soma' else float('nan'))
         return f"{agg_type} de {column}: {result:.2f}"
     except:
         return f"Não foi possível calcular {agg_type} para {column}"
@@ -128,69 +185,174 @@ def main():
 
     #'xlsx', 'xls', 
     
+    col1, col2 = st.columns(2)
+    with col1:
+        modo_alinhamento = st.selectbox(
+            "Estrutura de colunas",
+            ["Mesmas colunas"] + list(MODOS_ALINHAMENTO.keys()),
+            index=0,
+            help="Mesmas colunas: os arquivos devem ter a mesma estrutura. União/Interseção: alinha arquivos com colunas diferentes."
+        )
+    with col2:
+        formato_saida = st.selectbox("Formato de saída", ["xlsx", "csv"], index=0)
+    
+    if not uploaded_files:
+        # Arquivos removidos: a saída anterior não será mais baixada
+        resultado = st.session_state.pop('concat_resultado', None)
+        if resultado is not None:
+            remover_temporario(resultado['caminho'])
+
     if uploaded_files:
-        dfs = []
-        all_columns = set()
-        
-        # Primeira passagem: coletar todas as colunas
-        for file in uploaded_files:
-            df = read_file(file, sep, decimal, thousands)
-            if df is not None:
-                all_columns.update(df.columns)
-                dfs.append(df)
+        assinatura = (
+            tuple((file.name, file.size) for file in uploaded_files),
+            sep, decimal, thousands, modo_alinhamento, formato_saida
+        )
+        resultado = st.session_state.get('concat_resultado')
         
-        if dfs:
-            # Verificar consistência das colunas
-            inconsistencies = check_column_consistency(dfs)
+        # Só refaz a concatenação quando os arquivos ou as opções mudam
+        # (ou quando a saída expirou e foi apagada)
+        if resultado is None or resultado['assinatura'] != assinatura or not os.path.exists(resultado['caminho']):
+            if resultado is not None:
+                remover_temporario(resultado['caminho'])
+            st.session_state['concat_resultado'] = None
             
-            if inconsistencies:
-                st.error("### Estrutura de colunas inconsistente!")
-                for df_num, issues in inconsistencies.items():
-                    st.write(f"Arquivo {df_num}:")
-                    if issues['missing']:
-                        st.write("Colunas faltantes:", ", ".join(issues['missing']))
-                    if issues['extra']:
-                        st.write("Colunas extras:", ", ".join(issues['extra']))
-                st.stop()
+            # Primeira passagem: apenas as primeiras linhas, para definir o esquema
+            amostras = []
+            arquivos_validos = []
+            for file in uploaded_files:
+                amostra = read_file(file, sep, decimal, thousands, nrows=LINHAS_AMOSTRA)
+                if amostra is not None:
+                    amostras.append(amostra)
+                    arquivos_validos.append(file)
             
-            # Concatenar todos os DataFrames
-            final_df = pd.concat(dfs, ignore_index=True)
+            if not amostras:
+                return
             
-            st.divider()
-
-            st.write("##### Resultados da concatenação:")
-            st.write(f"Qntd de arquivos: {len(uploaded_files)}")
-            st.write(f"Total de linhas: {len(final_df)}")
-            st.write(f"Total de colunas: {len(final_df.columns)}")
+            if modo_alinhamento == "Mesmas colunas":
+                # Verificar consistência das colunas
+                inconsistencies = check_column_consistency(amostras)
+                
+                if inconsistencies:
+                    st.error("### Estrutura de colunas inconsistente!")
+                    for df_num, issues in inconsistencies.items():
+                        st.write(f"Arquivo {df_num}:")
+                        if issues['missing']:
+                            st.write("Colunas faltantes:", ", ".join(issues['missing']))
+                        if issues['extra']:
+                            st.write("Colunas extras:", ", ".join(issues['extra']))
+                    st.stop()
+                modo = "uniao"
+            else:
+                modo = MODOS_ALINHAMENTO[modo_alinhamento]
             
-            st.divider()
-
-            # Seleção de coluna e agregação
-            col1, col2 = st.columns(2)
-            with col1:
-                selected_column = st.selectbox(
-                    "Selecione a coluna para agregação",
-                    options=final_df.columns
-                )
-            with col2:
-                selected_agg = st.selectbox(
-                    "Selecione a agregação",
-                    options=get_possible_aggregations()
+            colunas = alinhar_colunas([amostra.columns for amostra in amostras], modo)
+            dtypes = inferir_dtypes(amostras, colunas)
+            
+            # Segunda passagem: cada arquivo é lido e gravado direto no disco
+            estatisticas = {}
+            caminho = criar_caminho_temporario(formato_saida)
+            with st.spinner("Concatenando arquivos..."):
+                total_linhas, df_previa, resultados = concatenar_para_disco(
+                    arquivos_validos,
+                    lambda file: read_file_blocks(file, sep, decimal, thousands),
+                    colunas,
+                    caminho,
+                    formato=formato_saida,
+                    dtypes=dtypes,
+                    ao_gravar=lambda df: acumular_estatisticas(estatisticas, df),
                 )
             
-            if selected_column and selected_agg:
-                st.text(apply_aggregation(final_df, selected_column, selected_agg))
+            for nome, erro in resultados:
+                if erro is not None:
+                    st.error(f"Erro ao processar {nome}: {erro}")
             
-            # Botão para download com estilo primário
+            resultado = {
+                'assinatura': assinatura,
+                'caminho': caminho,
+                'colunas': colunas,
+                'dtypes': dtypes,
+                'arquivos': [nome for nome, erro in resultados if erro is None],
+                'total_linhas': total_linhas,
+                'previa': df_previa,
+                'estatisticas': estatisticas,
+            }
+            st.session_state['concat_resultado'] = resultado
+        
+        st.divider()
+
+        st.write("##### Resultados da concatenação:")
+        st.write(f"Qntd de arquivos: {len(uploaded_files)}")
+        st.write(f"Total de linhas: {resultado['total_linhas']}")
+        st.write(f"Total de colunas: {len(resultado['colunas'])}")
+        
+        st.divider()
+
+        # Seleção de coluna e agregação
+        col1, col2 = st.columns(2)
+        with col1:
+            selected_column = st.selectbox(
+                "Selecione a coluna para agregação",
+                options=resultado['colunas']
+            )
+        with col2:
+            selected_agg = st.selectbox(
+                "Selecione a agregação",
+                options=get_possible_aggregations()
+            )
+        
+        if selected_column and selected_agg:
+            st.text(apply_aggregation(resultado['estatisticas'], selected_column, selected_agg))
+        
+        # Agrupamento em blocos: os arquivos são lidos de novo, bloco a bloco,
+        # e só as parciais por grupo ficam em memória
+        with st.expander("Agrupar (GroupBy)"):
             col1, col2, col3 = st.columns(3)
+            with col1:
+                groupby_cols = st.multiselect("Colunas para agrupar", options=resultado['colunas'])
             with col2:
+                value_cols = st.multiselect("Colunas de valores", options=resultado['colunas'])
+            with col3:
+                operations = st.multiselect("Operações", options=list(OPERACOES.keys()), default=["Soma"])
+            
+            if st.button("Agrupar"):
+                arquivos = [file for file in uploaded_files if file.name in resultado['arquivos']]
+                
+                def blocos():
+                    for file in arquivos:
+                        for df in read_file_blocks(file, sep, decimal, thousands) or []:
+                            yield aplicar_esquema(df, resultado['colunas'], resultado['dtypes'])
+                
+                progresso = st.empty()
+                try:
+                    with st.spinner("Agrupando..."):
+                        df_grupos = agregar_em_blocos(
+                            blocos(),
+                            groupby_cols,
+                            [(col, operation) for col in value_cols for operation in operations],
+                            ao_processar=lambda linhas: progresso.text(f"{linhas:,} de {resultado['total_linhas']:,} linhas")
+                        )
+                    st.dataframe(df_grupos, use_container_width=True)
+                    st.download_button(
+                        label="Baixar agrupamento (CSV)",
+                        data=df_grupos.to_csv(index=False).encode('utf-8-sig'),
+                        file_name="agrupamento.csv",
+                        mime="text/csv"
+                    )
+                except Exception as e:
+                    st.error(f"Erro ao agrupar: {str(e)}")
+                finally:
+                    progresso.empty()
+        
+        # Botão para download com estilo primário
+        col1, col2, col3 = st.columns(3)
+        with col2:
 
-                excel_data = get_download_link(final_df)
+            with open(resultado['caminho'], 'rb') as f:
                 st.download_button(
                     label="Baixar arquivo concatenado",
-                    data=excel_data,
-                    file_name="arquivos_concatenados.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    data=f.read(),
+                    file_name=f"arquivos_concatenados.{formato_saida}",
+                    mime=MIME_SAIDA[formato_saida],
                     type='primary'
                 )
 
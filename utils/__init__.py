@@ -0,0 +1 @@
+"""Rotinas compartilhadas entre as páginas do Nas Nuvens App."""
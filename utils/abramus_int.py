@@ -0,0 +1,296 @@
+"""
+Extração do demonstrativo internacional da ABRAMUS (PDF).
+
+A extração é feita em duas etapas:
+    1. Texto de cada página com o pdfplumber (análise de layout, a parte cara),
+       distribuída em blocos de páginas entre os processos de um pool único
+       do módulo (criado na primeira extração e reaproveitado nas seguintes).
+    2. Tokenização das linhas em registros, feita em ordem de página para que
+       o título/ISRC corrente atravesse corretamente as quebras de página.
+
+O texto extraído de cada página é guardado em cache (memória e disco),
+indexado pelo hash do arquivo e pelo número da página. Reenviar o mesmo PDF,
+ou reprocessá-lo após uma mudança na tokenização, refaz apenas a etapa 2.
+Os dois caches são limitados: ficam os arquivos usados mais recentemente
+(MAX_ARQUIVOS_MEMORIA em memória, MAX_ARQUIVOS_DISCO em disco).
+
+As funções ficam neste módulo (e não na página) para que possam ser
+enviadas aos processos do pool. O pool usa o método "spawn": o servidor do
+Streamlit tem várias threads, e um fork copiaria locks possivelmente em uso
+por elas; os processos novos só importam este módulo.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pdfplumber
+
+from utils.referencias import PASTA_CACHE
+
+# Linhas de cabeçalho/rodapé que não contêm dados
+RE_IGNORAR = re.compile('|'.join(re.escape(x) for x in [
+    'DISTRIBUIÇÃO DE DIREITOS', 'DATA :', 'TOTAL:', 'DEMONSTRATIVO', 'CPF:', 'ABRAMUS:', 'ECAD:'
+]))
+RE_ISRC = re.compile(r'T\d{10}')
+RE_PERIODO = re.compile(r'\d{4}/\d{2}\s*-\s*\d{4}/\d{2}')
+
+# Abaixo disso o custo de enviar o PDF aos processos não compensa
+MIN_PAGINAS_PARALELO = 8
+
+# Processos do pool de extração, compartilhado por todas as sessões
+MAX_WORKERS_EXTRACAO = min(os.cpu_count() or 1, 8)
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Cache de páginas extraídas. Incrementar VERSAO_EXTRACAO se a etapa 1 mudar
+# (ex.: parâmetros do extract_text), para invalidar o que já está gravado.
+VERSAO_EXTRACAO = 1
+PASTA_CACHE_PAGINAS = PASTA_CACHE / "abramus_int"
+# Arquivos mantidos em cada cache; os usados há mais tempo são descartados
+MAX_ARQUIVOS_MEMORIA = 8
+MAX_ARQUIVOS_DISCO = 100
+_cache_lock = threading.Lock()
+# hash do arquivo -> (total de páginas, {página: linhas}), do menos ao mais recente
+_cache_paginas: "OrderedDict[str, Tuple[int, Dict[int, List[str]]]]" = OrderedDict()
+
+
+def extrair_texto_paginas(pdf_bytes: bytes, inicio: int, fim: int) -> List[List[str]]:
+    """Extrai as linhas de texto das páginas [inicio, fim) do PDF."""
+    paginas = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages[inicio:fim]:
+            text = page.extract_text() or ''
+            paginas.append(text.split('\n'))
+            # Libera os objetos de layout da página já processada
+            page.close()
+    return paginas
+
+
+def contar_paginas(pdf_bytes: bytes) -> int:
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages)
+
+
+def hash_arquivo(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _caminho_cache(chave: str):
+    return PASTA_CACHE_PAGINAS / f"{chave}.json"
+
+
+def _guardar_em_memoria(chave: str, entrada: Tuple[int, Dict[int, List[str]]]):
+    with _cache_lock:
+        _cache_paginas[chave] = entrada
+        _cache_paginas.move_to_end(chave)
+        while len(_cache_paginas) > MAX_ARQUIVOS_MEMORIA:
+            _cache_paginas.popitem(last=False)
+
+
+def _podar_disco():
+    """Mantém em disco só os MAX_ARQUIVOS_DISCO arquivos usados mais recentemente."""
+    try:
+        gravados = sorted(PASTA_CACHE_PAGINAS.glob("*.json"), key=lambda caminho: caminho.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for caminho in gravados[MAX_ARQUIVOS_DISCO:]:
+        try:
+            caminho.unlink()
+        except OSError:
+            pass
+
+
+def _ler_cache(chave: str) -> Optional[Tuple[int, Dict[int, List[str]]]]:
+    """Busca as páginas já extraídas desse arquivo (memória, depois disco)."""
+    with _cache_lock:
+        if chave in _cache_paginas:
+            _cache_paginas.move_to_end(chave)
+            return _cache_paginas[chave]
+    caminho = _caminho_cache(chave)
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        if dados.get("versao") != VERSAO_EXTRACAO:
+            return None
+        entrada = (dados["total_paginas"], {int(p): linhas for p, linhas in dados["paginas"].items()})
+        # O mtime marca o último uso, para a poda manter os mais recentes
+        os.utime(caminho)
+    except (OSError, ValueError, KeyError):
+        return None
+    _guardar_em_memoria(chave, entrada)
+    return entrada
+
+
+def _gravar_cache(chave: str, total_paginas: int, paginas: Dict[int, List[str]]):
+    _guardar_em_memoria(chave, (total_paginas, paginas))
+    try:
+        PASTA_CACHE_PAGINAS.mkdir(parents=True, exist_ok=True)
+        destino = _caminho_cache(chave)
+        temporario = destino.with_suffix(".tmp")
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"versao": VERSAO_EXTRACAO, "total_paginas": total_paginas, "paginas": paginas}, f, ensure_ascii=False)
+        os.replace(temporario, destino)
+    except OSError:
+        # Sem permissão de escrita: o cache em memória continua valendo
+        return
+    _podar_disco()
+
+
+def _blocos_contiguos(paginas: List[int], tamanho_maximo: int) -> List[Tuple[int, int]]:
+    """Agrupa números de página em intervalos [inicio, fim) contíguos de até tamanho_maximo páginas."""
+    blocos = []
+    for pagina in paginas:
+        if blocos and blocos[-1][1] == pagina and blocos[-1][1] - blocos[-1][0] < tamanho_maximo:
+            blocos[-1][1] = pagina + 1
+        else:
+            blocos.append([pagina, pagina + 1])
+    return [tuple(bloco) for bloco in blocos]
+
+
+def _pool_extracao() -> ProcessPoolExecutor:
+    """Pool de processos do módulo, criado na primeira chamada."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS_EXTRACAO,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _descartar_pool(pool: ProcessPoolExecutor):
+    """Descarta um pool quebrado; a próxima extração cria outro."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extrair_blocos(pdf_bytes: bytes, blocos: List[Tuple[int, int]]) -> Dict[int, List[str]]:
+    """Extrai os blocos de páginas, em paralelo quando há vários blocos."""
+    extraidas = {}
+    if len(blocos) > 1:
+        try:
+            pool = _pool_extracao()
+        except (OSError, ValueError):
+            # Ambiente sem suporte a processos: extrai em série
+            pool = None
+        if pool is not None:
+            try:
+                futuros = {pool.submit(extrair_texto_paginas, pdf_bytes, inicio, fim): inicio for inicio, fim in blocos}
+                for futuro, inicio in futuros.items():
+                    for deslocamento, linhas in enumerate(futuro.result()):
+                        extraidas[inicio + deslocamento] = linhas
+                return extraidas
+            except (BrokenProcessPool, RuntimeError):
+                # Processo do pool encerrado (ex.: falta de memória): extrai em série
+                _descartar_pool(pool)
+                extraidas = {}
+
+    for inicio, fim in blocos:
+        for deslocamento, linhas in enumerate(extrair_texto_paginas(pdf_bytes, inicio, fim)):
+            extraidas[inicio + deslocamento] = linhas
+    return extraidas
+
+
+def extrair_linhas_pdf(
+    pdf_bytes: bytes,
+    max_workers: Optional[int] = None,
+    usar_cache: bool = True,
+    chave: Optional[str] = None,
+) -> List[List[str]]:
+    """
+    Extrai as linhas de todas as páginas, dividindo as páginas em blocos
+    contíguos entre os processos do pool. O resultado mantém a ordem das páginas.
+
+    Páginas já presentes no cache (mesmo hash de arquivo) não são extraídas
+    novamente. `chave` é o hash_arquivo(pdf_bytes), se quem chama já o tem.
+    """
+    chave = chave or hash_arquivo(pdf_bytes)
+    em_cache = _ler_cache(chave) if usar_cache else None
+
+    if em_cache is not None:
+        total_paginas, paginas = em_cache
+        paginas = dict(paginas)
+    else:
+        total_paginas, paginas = contar_paginas(pdf_bytes), {}
+
+    faltantes = [p for p in range(total_paginas) if p not in paginas]
+    if faltantes:
+        max_workers = max_workers or MAX_WORKERS_EXTRACAO
+        if len(faltantes) < MIN_PAGINAS_PARALELO or max_workers <= 1:
+            tamanho_bloco = len(faltantes)
+        else:
+            tamanho_bloco = -(-len(faltantes) // max_workers)
+
+        paginas.update(_extrair_blocos(pdf_bytes, _blocos_contiguos(faltantes, tamanho_bloco)))
+        if usar_cache:
+            _gravar_cache(chave, total_paginas, paginas)
+
+    return [paginas[p] for p in range(total_paginas)]
+
+
+def tokenizar_paginas(paginas: List[List[str]]) -> pd.DataFrame:
+    """
+    Converte as linhas extraídas (em ordem de página) nos registros do
+    demonstrativo. Uma linha com ISRC/ISWC define o título corrente, que vale
+    para as linhas seguintes, inclusive nas páginas seguintes.
+    """
+    data = []
+    current_title = None
+    current_isrc = None
+
+    for lines in paginas:
+        for line in lines:
+            if RE_IGNORAR.search(line):
+                continue
+
+            # Detecta linha de título + ISRC
+            isrc_match = RE_ISRC.search(line)
+            if isrc_match:
+                current_title = ' '.join(line[:isrc_match.start()].split())
+                current_isrc = isrc_match.group(0)
+                continue
+
+            parts = line.split()
+            if len(parts) >= 6 and current_title:
+                try:
+                    # Captura valor e período
+                    value = float(parts[-1].replace(',', '.'))
+                    period_match = RE_PERIODO.search(line)
+                    if not period_match:
+                        continue
+                    period = period_match.group(0)
+
+                    # Posições fixas apenas para sociedade e território
+                    society = parts[0]
+                    territory = parts[1]
+
+                    # Captura rubrica usando tudo que está entre território e período
+                    rubrica_text = line[len(society) + len(territory) + 2 : period_match.start()].strip()
+
+                    data.append({
+                        'Título': current_title,
+                        'ISRC/ISWC': current_isrc,
+                        'Sociedade': society,
+                        'Território': territory,
+                        'Rubrica': rubrica_text,
+                        'Direito': 'AUTORAL',
+                        'Período': period,
+                        'Rendimento': value
+                    })
+                except ValueError:
+                    continue
+
+    return pd.DataFrame(data)
@@ -0,0 +1,275 @@
+"""
+Agregações do GroupBy Analyzer e do Concat Arquivos.
+
+Em memória, o DataFrame combinado é montado uma vez por conjunto de
+arquivos e tem as colunas de texto repetitivas convertidas para category.
+Os agrupamentos por várias colunas, com várias métricas e uma coluna de
+pivô opcional, são feitos em uma única passada de groupby.
+
+Para arquivos que não cabem em memória, `ler_em_blocos` lê CSV e xlsx em
+blocos de linhas e o `AgregadorParcial` mantém, por grupo, apenas soma,
+contagem, mínimo e máximo de cada coluna de valores. As parciais são
+combinadas ao final (a média é soma / contagem), então a memória depende
+do número de grupos e do tamanho do bloco, e não do tamanho dos arquivos.
+"""
+import codecs
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+
+OPERACOES = {
+    "Soma": "sum",
+    "Média": "mean",
+    "Máximo": "max",
+    "Mínimo": "min",
+    "Contagem": "count",
+}
+
+# Colunas de texto com até essa fração de valores distintos viram category
+LIMITE_CATEGORIA = 0.5
+
+# Linhas por bloco na leitura out-of-core
+LINHAS_BLOCO = 200_000
+
+# Estatísticas parciais mantidas por grupo e como cada uma é combinada
+PARCIAIS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+
+def categorizar(df: pd.DataFrame, limite: float = LIMITE_CATEGORIA) -> pd.DataFrame:
+    """Converte as colunas de texto com poucos valores distintos para category."""
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_numeric_dtype(serie) or isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            continue
+        if serie.nunique(dropna=True) <= limite * max(len(serie), 1):
+            try:
+                df[col] = serie.astype('category')
+            except TypeError:
+                # Valores de tipos misturados que não podem ser ordenados
+                df[col] = serie.astype(str).where(serie.notna()).astype('category')
+    return df
+
+
+def nome_metrica(operacao: str, coluna: str) -> str:
+    return f"{operacao} de {coluna}"
+
+
+def _formatar(resultado: pd.DataFrame, pivo: Optional[str]) -> pd.DataFrame:
+    """Ordena o resultado agregado e, com pivô, transforma os valores do pivô em colunas."""
+    if not pivo:
+        return resultado.reset_index().sort_values(by=resultado.columns[0], ascending=False, ignore_index=True)
+
+    # Só os valores presentes viram colunas (categorias sem linhas são descartadas)
+    resultado.index = resultado.index.remove_unused_levels()
+    uma_metrica = resultado.shape[1] == 1
+    resultado = resultado.unstack(pivo)
+    if uma_metrica:
+        resultado.columns = [str(valor) for _, valor in resultado.columns]
+    else:
+        resultado.columns = [f"{nome} | {valor}" for nome, valor in resultado.columns]
+    return resultado.sort_index().reset_index()
+
+
+def _validar(chaves: List[str], metricas: List[Tuple[str, str]]):
+    if not chaves:
+        raise ValueError("Selecione ao menos uma coluna para agrupar")
+    if not metricas:
+        raise ValueError("Selecione ao menos uma métrica")
+
+
+def agregar(
+    df: pd.DataFrame,
+    chaves: List[str],
+    metricas: List[Tuple[str, str]],
+    pivo: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Agrupa por `chaves` calculando cada métrica (coluna, operação) em uma
+    única passada. Com `pivo`, os valores dessa coluna viram colunas do
+    resultado ("<métrica> | <valor>", ou só o valor se houver uma métrica).
+
+    Linhas com chave vazia ficam de fora, como no groupby padrão.
+    """
+    _validar(chaves, metricas)
+    nomes = {nome_metrica(operacao, coluna): (coluna, OPERACOES[operacao]) for coluna, operacao in metricas}
+    agrupar_por = list(chaves) + ([pivo] if pivo else [])
+
+    resultado = df.groupby(agrupar_por, observed=True, sort=False).agg(**nomes)
+    return _formatar(resultado, pivo)
+
+
+class AgregadorParcial:
+    """
+    Agregação out-of-core: recebe o arquivo em blocos (`adicionar`) e
+    mantém por grupo apenas as estatísticas parciais necessárias para as
+    métricas pedidas. `resultado()` tem o mesmo formato de `agregar`.
+
+    As parciais dos blocos são combinadas sempre que acumulam mais linhas
+    que `limite_linhas`, para que a memória fique limitada ao número de
+    grupos distintos.
+    """
+
+    def __init__(
+        self,
+        chaves: List[str],
+        metricas: List[Tuple[str, str]],
+        pivo: Optional[str] = None,
+        limite_linhas: int = LINHAS_BLOCO,
+    ):
+        _validar(chaves, metricas)
+        self.chaves = list(chaves) + ([pivo] if pivo else [])
+        self.metricas = list(metricas)
+        self.pivo = pivo
+        self.limite_linhas = limite_linhas
+        self.valores = list(dict.fromkeys(coluna for coluna, _ in metricas))
+        # Só a contagem aceita colunas de texto; as demais operações exigem números
+        self._numericas = {coluna for coluna, operacao in metricas if operacao != "Contagem"}
+        self.total_linhas = 0
+        self._parciais: List[pd.DataFrame] = []
+        self._linhas_parciais = 0
+
+    def adicionar(self, df: pd.DataFrame):
+        """Acumula as estatísticas parciais de um bloco de linhas."""
+        if df.empty:
+            return
+        self.total_linhas += len(df)
+
+        faltando = [col for col in self.chaves + self.valores if col not in df.columns]
+        if faltando:
+            raise KeyError(f"Colunas não encontradas: {', '.join(map(str, faltando))}")
+
+        chaves = [df[col] for col in self.chaves]
+        partes = {}
+        for col in self.valores:
+            serie = df[col]
+            if col in self._numericas:
+                serie = pd.to_numeric(serie, errors='raise')
+                estatisticas = list(PARCIAIS)
+            else:
+                estatisticas = ["count"]
+            agregado = serie.groupby(chaves, sort=False).agg(estatisticas)
+            for estatistica in estatisticas:
+                partes[(col, estatistica)] = agregado[estatistica]
+        parcial = pd.DataFrame(partes)
+
+        self._parciais.append(parcial)
+        self._linhas_parciais += len(parcial)
+        if self._linhas_parciais > self.limite_linhas and len(self._parciais) > 1:
+            self._combinar()
+
+    def _combinar(self) -> pd.DataFrame:
+        """Junta as parciais acumuladas em uma única tabela por grupo."""
+        if len(self._parciais) > 1:
+            parciais = pd.concat(self._parciais)
+            combinacao = {coluna: PARCIAIS[coluna[1]] for coluna in parciais.columns}
+            self._parciais = [parciais.groupby(level=list(range(len(self.chaves))), sort=False).agg(combinacao)]
+            self._linhas_parciais = len(self._parciais[0])
+        return self._parciais[0]
+
+    def resultado(self) -> pd.DataFrame:
+        """Calcula as métricas finais a partir das parciais combinadas."""
+        if not self._parciais:
+            colunas = self.chaves + [nome_metrica(operacao, coluna) for coluna, operacao in self.metricas]
+            return pd.DataFrame(columns=colunas)
+
+        parciais = self._combinar()
+        metricas = {}
+        for coluna, operacao in self.metricas:
+            if operacao == "Média":
+                contagem = parciais[(coluna, "count")]
+                valor = parciais[(coluna, "sum")] / contagem.where(contagem > 0)
+            elif operacao == "Contagem":
+                valor = parciais[(coluna, "count")]
+            else:
+                valor = parciais[(coluna, OPERACOES[operacao])]
+            metricas[nome_metrica(operacao, coluna)] = valor
+
+        return _formatar(pd.DataFrame(metricas), self.pivo)
+
+
+def detectar_encoding(conteudo: bytes, encodings: Iterable[str], tamanho_bloco: int = 1 << 20) -> Optional[str]:
+    """
+    Primeiro encoding que decodifica o conteúdo inteiro, verificado em
+    pedaços (sem montar a string completa em memória).
+    """
+    for encoding in encodings:
+        decodificador = codecs.getincrementaldecoder(encoding)()
+        try:
+            for inicio in range(0, len(conteudo), tamanho_bloco):
+                decodificador.decode(conteudo[inicio:inicio + tamanho_bloco])
+            decodificador.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def _blocos_xlsx(arquivo, linha_cabecalho: int, tamanho: int, sheet_name=0) -> Iterator[pd.DataFrame]:
+    """Lê uma planilha xlsx em modo read_only, montando DataFrames de `tamanho` linhas."""
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        linhas = worksheet.iter_rows(values_only=True)
+        for _ in range(linha_cabecalho):
+            next(linhas, None)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = [f"Unnamed: {i}" if nome is None else nome for i, nome in enumerate(cabecalho)]
+
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha[:len(colunas)])
+            if len(bloco) >= tamanho:
+                yield pd.DataFrame(bloco, columns=colunas)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=colunas)
+    finally:
+        workbook.close()
+
+
+def ler_em_blocos(
+    arquivo,
+    nome: str,
+    tamanho: int = LINHAS_BLOCO,
+    linha_cabecalho: int = 0,
+    sheet_name=0,
+    **opcoes_csv,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê um CSV ou xlsx em blocos de até `tamanho` linhas.
+
+    `arquivo` é um caminho ou um objeto com leitura binária; `nome` define o
+    formato pela extensão. As opções extras (encoding, sep, decimal...) vão
+    para o read_csv.
+    """
+    if nome.lower().endswith('.csv'):
+        with pd.read_csv(arquivo, header=linha_cabecalho, chunksize=tamanho, **opcoes_csv) as leitor:
+            yield from leitor
+    elif nome.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _blocos_xlsx(arquivo, linha_cabecalho, tamanho, sheet_name)
+    else:
+        raise ValueError(f"Formato não suportado na leitura em blocos: {nome}")
+
+
+def agregar_em_blocos(
+    blocos: Iterable[pd.DataFrame],
+    chaves: List[str],
+    metricas: List[Tuple[str, str]],
+    pivo: Optional[str] = None,
+    ao_processar=None,
+) -> pd.DataFrame:
+    """
+    Agrega uma sequência de blocos com o AgregadorParcial.
+    `ao_processar(linhas)` recebe o total de linhas lidas após cada bloco.
+    """
+    agregador = AgregadorParcial(chaves, metricas, pivo)
+    for bloco in blocos:
+        agregador.adicionar(bloco)
+        if ao_processar is not None:
+            ao_processar(agregador.total_linhas)
+    return agregador.resultado()
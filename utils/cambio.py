@@ -0,0 +1,211 @@
+"""
+Conversão de valores para BRL a partir de taxas de câmbio por moeda.
+
+A taxa de cada linha vem de um único map da coluna de moeda sobre o
+dicionário de taxas; as colunas de valores são multiplicadas inteiras por
+essa Series. Linhas em BRL usam taxa 1 e moedas sem taxa (ou vazias)
+ficam com NaN, assim como valores vazios.
+
+Quando a planilha tem uma coluna de data (COLUNAS_PERIODO), a taxa de
+cada linha vem da tabela salva pelo período da própria linha, num único
+join por (moeda, período); o dicionário informado na página vale para as
+linhas sem data ou sem taxa salva para o seu período.
+
+As taxas informadas nas páginas ficam guardadas em data/fx/taxas-cambio.csv
+por moeda e período (AAAA-MM). O arquivo só recebe linhas novas: cada
+alteração é uma nova versão com data de atualização e vale a versão mais
+recente de cada (moeda, período). A tabela vigente fica em memória
+enquanto o arquivo não mudar (validação pelo mtime), e relatórios com
+vários períodos são convertidos com um único join por (moeda, período).
+"""
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+MOEDA_BASE = 'BRL'
+
+# Colunas de data dos relatórios (ONERPM), em ordem de preferência, que
+# definem o período de cada linha: o mês contábil do demonstrativo e, na
+# falta dele, o mês da transação
+COLUNAS_PERIODO = ('Accounted Date', 'Transaction Month')
+
+RAIZ_APP = Path(__file__).resolve().parent.parent
+ARQUIVO_TAXAS = RAIZ_APP / "data" / "fx" / "taxas-cambio.csv"
+COLUNAS_TAXAS = ['moeda', 'periodo', 'taxa', 'atualizado_em']
+RE_PERIODO = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+_lock = threading.Lock()
+# (mtime do arquivo, tabela vigente indexada por (moeda, periodo))
+_tabela: Optional[Tuple[float, pd.Series]] = None
+
+
+def taxas_por_linha(moedas: pd.Series, taxas_cambio: Mapping[str, float]) -> pd.Series:
+    """Taxa de conversão para BRL de cada linha (NaN para moedas desconhecidas)."""
+    taxas = {**taxas_cambio, MOEDA_BASE: 1.0}
+    return moedas.map(taxas).astype(float)
+
+
+def taxas_das_linhas(
+    df: pd.DataFrame,
+    taxas_cambio: Mapping[str, float],
+    coluna_moeda: str = 'Currency',
+    colunas_periodo: Iterable[str] = COLUNAS_PERIODO,
+) -> pd.Series:
+    """
+    Taxa de cada linha: a salva para a moeda e o período da linha (pela
+    primeira das `colunas_periodo` presente em `df`) ou, na falta dela, a
+    de `taxas_cambio`.
+    """
+    taxas = taxas_por_linha(df[coluna_moeda], taxas_cambio)
+    coluna_periodo = next((coluna for coluna in colunas_periodo if coluna in df.columns), None)
+    if coluna_periodo is None:
+        return taxas
+    return taxas_por_periodo(df[coluna_moeda], normalizar_periodo(df[coluna_periodo])).fillna(taxas)
+
+
+def converter_para_brl(valores: pd.Series, moedas: pd.Series, taxas_cambio: Mapping[str, float]) -> pd.Series:
+    """Converte uma coluna de valores para BRL usando a moeda de cada linha."""
+    return pd.to_numeric(valores, errors='coerce') * taxas_por_linha(moedas, taxas_cambio)
+
+
+def _aplicar_taxas(df: pd.DataFrame, colunas: Dict[str, str], taxas: pd.Series) -> pd.DataFrame:
+    for origem, destino in colunas.items():
+        df[destino] = pd.to_numeric(df[origem], errors='coerce') * taxas
+    return df
+
+
+def converter_colunas(
+    df: pd.DataFrame,
+    colunas: Dict[str, str],
+    taxas_cambio: Mapping[str, float],
+    coluna_moeda: str = 'Currency',
+    colunas_periodo: Iterable[str] = COLUNAS_PERIODO,
+) -> pd.DataFrame:
+    """
+    Grava em `df` as conversões para BRL de várias colunas de uma vez
+    ({coluna de origem: coluna de destino}), calculando a taxa de cada
+    linha uma única vez (taxas_das_linhas: pelo período da linha quando
+    há taxa salva). Colunas de origem ausentes são ignoradas.
+    """
+    colunas = {origem: destino for origem, destino in colunas.items() if origem in df.columns}
+    if not colunas or coluna_moeda not in df.columns:
+        return df
+
+    return _aplicar_taxas(df, colunas, taxas_das_linhas(df, taxas_cambio, coluna_moeda, colunas_periodo))
+
+
+def normalizar_periodo(valores) -> pd.Series:
+    """Converte datas ou textos de mês (2025-06, 2025-06-30, 06/2025, 30/06/2025) em AAAA-MM."""
+    valores = pd.Series(valores)
+    if pd.api.types.is_datetime64_any_dtype(valores):
+        return valores.dt.strftime('%Y-%m')
+
+    textos = valores.astype(str).str.strip().where(valores.notna())
+    # Datas ISO primeiro; o restante no formato brasileiro (dia/mês/ano ou mês/ano)
+    datas = pd.to_datetime(textos, errors='coerce', format='ISO8601')
+    restantes = datas.isna() & textos.notna()
+    if restantes.any():
+        brasileiros = textos[restantes].where(~textos[restantes].str.fullmatch(r'\d{1,2}/\d{4}'), '01/' + textos[restantes])
+        datas[restantes] = pd.to_datetime(brasileiros, errors='coerce', dayfirst=True, format='mixed')
+    return datas.dt.strftime('%Y-%m')
+
+
+def periodo_valido(periodo: str) -> bool:
+    return bool(RE_PERIODO.fullmatch(str(periodo).strip()))
+
+
+def periodo_do_relatorio(dfs: Iterable[pd.DataFrame], colunas: Iterable[str]) -> str:
+    """
+    Período (AAAA-MM) mais recente encontrado na primeira coluna de data
+    disponível de cada planilha; sem datas reconhecidas, texto vazio (o
+    período tem de ser informado, em vez de cair no mês atual).
+    """
+    periodos = []
+    for df in dfs:
+        for coluna in colunas:
+            if coluna in df.columns:
+                periodos.append(normalizar_periodo(df[coluna]).dropna())
+                break
+    periodos = pd.concat(periodos) if periodos else pd.Series(dtype=str)
+    return periodos.max() if not periodos.empty else ''
+
+
+def _ler_tabela() -> pd.Series:
+    """Lê o arquivo de taxas e mantém só a versão mais recente de cada (moeda, período)."""
+    historico = pd.read_csv(ARQUIVO_TAXAS, dtype={'moeda': str, 'periodo': str, 'taxa': float, 'atualizado_em': str})
+    vigentes = historico.drop_duplicates(subset=['moeda', 'periodo'], keep='last')
+    return vigentes.set_index(['moeda', 'periodo'])['taxa'].sort_index()
+
+
+def tabela_taxas() -> pd.Series:
+    """
+    Taxas vigentes indexadas por (moeda, periodo). A leitura do disco só
+    acontece na primeira chamada ou quando o arquivo muda.
+    """
+    global _tabela
+    try:
+        mtime = ARQUIVO_TAXAS.stat().st_mtime
+    except FileNotFoundError:
+        return pd.Series(dtype=float, index=pd.MultiIndex.from_tuples([], names=['moeda', 'periodo']), name='taxa')
+
+    with _lock:
+        if _tabela is None or _tabela[0] != mtime:
+            _tabela = (mtime, _ler_tabela())
+        return _tabela[1]
+
+
+def taxas_do_periodo(periodo: str) -> Dict[str, float]:
+    """Taxas salvas de cada moeda para o período (dicionário vazio se não houver)."""
+    tabela = tabela_taxas()
+    if tabela.empty:
+        return {}
+    do_periodo = tabela[tabela.index.get_level_values('periodo') == periodo]
+    return {moeda: float(taxa) for (moeda, _), taxa in do_periodo.items()}
+
+
+def salvar_taxas(periodo: str, taxas_cambio: Mapping[str, float]) -> int:
+    """
+    Grava as taxas do período que forem novas ou diferentes das vigentes
+    (BRL e taxas zeradas são ignoradas). Retorna quantas versões foram gravadas.
+    """
+    global _tabela
+    vigentes = taxas_do_periodo(periodo)
+    agora = datetime.now().isoformat(timespec='seconds')
+    novas = [
+        {'moeda': moeda, 'periodo': periodo, 'taxa': float(taxa), 'atualizado_em': agora}
+        for moeda, taxa in taxas_cambio.items()
+        if moeda != MOEDA_BASE and taxa and vigentes.get(moeda) != float(taxa)
+    ]
+    if not novas:
+        return 0
+
+    with _lock:
+        ARQUIVO_TAXAS.parent.mkdir(parents=True, exist_ok=True)
+        novo_arquivo = not ARQUIVO_TAXAS.exists() or os.path.getsize(ARQUIVO_TAXAS) == 0
+        pd.DataFrame(novas, columns=COLUNAS_TAXAS).to_csv(
+            ARQUIVO_TAXAS, mode='a', header=novo_arquivo, index=False
+        )
+        _tabela = None
+    return len(novas)
+
+
+def taxas_por_periodo(moedas: pd.Series, periodos: pd.Series) -> pd.Series:
+    """
+    Taxa de cada linha pela tabela salva, com um único join por (moeda,
+    período). BRL usa taxa 1; combinações sem taxa ficam com NaN.
+    """
+    tabela = tabela_taxas()
+    chaves = pd.MultiIndex.from_arrays([moedas.astype(object), periodos.astype(object)])
+    posicoes = tabela.index.get_indexer(chaves)
+    # Posição -1 (sem taxa) cai no NaN acrescentado ao final
+    valores = np.append(tabela.to_numpy(dtype=float), np.nan)
+    taxas = pd.Series(valores[posicoes], index=moedas.index)
+    taxas[(moedas == MOEDA_BASE).to_numpy()] = 1.0
+    return taxas
+
@@ -0,0 +1,302 @@
+"""
+Concatenação em streaming para disco.
+
+Os arquivos são lidos um a um, alinhados a um esquema único (colunas e
+dtypes definidos antes da leitura completa) e gravados imediatamente no
+arquivo de saída. O pico de memória fica em torno de um arquivo de entrada
+(ou de um bloco de linhas, quando o arquivo é lido em blocos), e não da
+soma de todos.
+"""
+import atexit
+import csv
+import glob
+import os
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import xlsxwriter
+
+# Limite de linhas de uma planilha do Excel (incluindo o cabeçalho)
+MAX_LINHAS_XLSX = 1_048_576
+
+# Saídas temporárias ficam numa pasta só do app, dentro da pasta
+# temporária do sistema; as mais antigas que isso são de sessões encerradas
+PASTA_TEMPORARIOS = os.path.join(tempfile.gettempdir(), "nasnuvens-concat")
+IDADE_MAXIMA_TEMPORARIO = 6 * 60 * 60
+PREFIXO_TEMPORARIO = "concat_"
+
+MODOS_ALINHAMENTO = {
+    "União": "uniao",
+    "Interseção": "intersecao",
+}
+
+
+def alinhar_colunas(listas_colunas: Iterable[List[str]], modo: str = "uniao") -> List[str]:
+    """
+    Define a lista final de colunas a partir dos cabeçalhos de cada arquivo.
+
+    - "uniao": todas as colunas, na ordem em que aparecem pela primeira vez
+    - "intersecao": apenas as colunas presentes em todos os arquivos,
+      na ordem do primeiro arquivo
+    """
+    listas_colunas = [list(colunas) for colunas in listas_colunas]
+    if not listas_colunas:
+        return []
+
+    if modo == "uniao":
+        colunas_finais = []
+        vistas = set()
+        for colunas in listas_colunas:
+            for col in colunas:
+                if col not in vistas:
+                    vistas.add(col)
+                    colunas_finais.append(col)
+        return colunas_finais
+
+    if modo == "intersecao":
+        comuns = set(listas_colunas[0])
+        for colunas in listas_colunas[1:]:
+            comuns &= set(colunas)
+        return [col for col in listas_colunas[0] if col in comuns]
+
+    raise ValueError(f"Modo de alinhamento desconhecido: {modo}")
+
+
+def inferir_dtypes(amostras: Iterable[pd.DataFrame], colunas: List[str]) -> Dict[str, str]:
+    """
+    Define um dtype explícito por coluna a partir de amostras (primeiras
+    linhas) de cada arquivo.
+
+    Colunas inteiras em todas as amostras viram "Int64" (aceita vazios sem
+    virar float), numéricas viram "float64" e o restante fica "object".
+    """
+    tipos_por_coluna = {col: set() for col in colunas}
+    for amostra in amostras:
+        for col in colunas:
+            if col not in amostra.columns:
+                continue
+            serie = amostra[col].dropna()
+            if serie.empty:
+                continue
+            if pd.api.types.is_bool_dtype(serie):
+                tipos_por_coluna[col].add("object")
+            elif pd.api.types.is_integer_dtype(serie):
+                tipos_por_coluna[col].add("int")
+            elif pd.api.types.is_float_dtype(serie):
+                tipos_por_coluna[col].add("float")
+            else:
+                tipos_por_coluna[col].add("object")
+
+    dtypes = {}
+    for col, tipos in tipos_por_coluna.items():
+        if tipos == {"int"}:
+            dtypes[col] = "Int64"
+        elif tipos and tipos <= {"int", "float"}:
+            dtypes[col] = "float64"
+        else:
+            dtypes[col] = "object"
+    return dtypes
+
+
+def aplicar_esquema(df: pd.DataFrame, colunas: List[str], dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Reordena o DataFrame para o esquema final com um único reindex
+    (colunas ausentes ficam vazias, extras são descartadas) e aplica os
+    dtypes explícitos.
+
+    A conversão nunca perde dados: uma coluna de texto não é forçada para
+    número e, se a conversão falhar (ex.: decimais numa coluna "Int64"),
+    os valores do arquivo são mantidos como vieram.
+    """
+    df = df.reindex(columns=colunas)
+    if dtypes:
+        for col, dtype in dtypes.items():
+            if col not in df.columns or str(df[col].dtype) == dtype:
+                continue
+            serie = df[col]
+            if dtype != "object" and not (pd.api.types.is_numeric_dtype(serie) or serie.isna().all()):
+                continue
+            try:
+                df[col] = serie.astype(dtype)
+            except (ValueError, TypeError):
+                continue
+    return df
+
+
+class SaidaConcatenada:
+    """
+    Arquivo de saída que recebe os DataFrames à medida que são lidos.
+
+    Formatos suportados:
+        - "csv": anexa as linhas ao arquivo CSV (UTF-8 com BOM, para o Excel)
+        - "xlsx": grava com o xlsxwriter em modo constant_memory, abrindo uma
+          nova aba quando o limite de linhas do Excel é atingido
+    """
+
+    def __init__(self, caminho: str, colunas: List[str], formato: str = "xlsx", sheet_name: str = "Dados Concatenados"):
+        if formato not in ("csv", "xlsx"):
+            raise ValueError(f"Formato de saída não suportado: {formato}")
+
+        self.caminho = caminho
+        self.colunas = list(colunas)
+        self.formato = formato
+        self.sheet_name = sheet_name
+        self.total_linhas = 0
+
+        if formato == "csv":
+            self._arquivo = open(caminho, "w", encoding="utf-8-sig", newline="")
+            csv.writer(self._arquivo).writerow(self.colunas)
+        else:
+            self._workbook = xlsxwriter.Workbook(
+                caminho,
+                {"constant_memory": True, "default_date_format": "dd/mm/yyyy", "nan_inf_to_errors": True},
+            )
+            self._num_abas = 0
+            self._nova_aba()
+
+    def _nova_aba(self):
+        self._num_abas += 1
+        nome = self.sheet_name if self._num_abas == 1 else f"{self.sheet_name[:27]} {self._num_abas}"
+        self._worksheet = self._workbook.add_worksheet(nome)
+        self._worksheet.write_row(0, 0, self.colunas)
+        self._linha_atual = 1
+
+    def escrever(self, df: pd.DataFrame):
+        """Anexa as linhas do DataFrame (já alinhado ao esquema) à saída."""
+        if df.empty:
+            return
+
+        if self.formato == "csv":
+            df.to_csv(self._arquivo, header=False, index=False)
+        else:
+            # Converte para tipos Python, trocando vazios por None (células em branco)
+            valores = df.astype(object).where(df.notna(), None).values.tolist()
+            for linha in valores:
+                if self._linha_atual >= MAX_LINHAS_XLSX:
+                    self._nova_aba()
+                self._worksheet.write_row(self._linha_atual, 0, linha)
+                self._linha_atual += 1
+
+        self.total_linhas += len(df)
+
+    def fechar(self):
+        if self.formato == "csv":
+            self._arquivo.close()
+        else:
+            self._workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fechar()
+
+
+_temporarios = set()
+
+
+def remover_temporario(caminho: Optional[str]):
+    """Apaga uma saída temporária (ignora se ela já não existe)."""
+    if not caminho:
+        return
+    _temporarios.discard(caminho)
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def _remover_temporarios_antigos():
+    """Apaga saídas de sessões que terminaram sem substituí-las (só na pasta do app)."""
+    limite = time.time() - IDADE_MAXIMA_TEMPORARIO
+    for caminho in glob.glob(os.path.join(PASTA_TEMPORARIOS, f"{PREFIXO_TEMPORARIO}*")):
+        try:
+            if os.path.getmtime(caminho) < limite:
+                remover_temporario(caminho)
+        except OSError:
+            pass
+
+
+@atexit.register
+def _remover_temporarios_do_processo():
+    for caminho in list(_temporarios):
+        remover_temporario(caminho)
+
+
+def criar_caminho_temporario(formato: str) -> str:
+    """
+    Cria um arquivo temporário vazio para a saída, em PASTA_TEMPORARIOS,
+    e retorna o caminho. Quem guarda o caminho apaga o arquivo ao substituí-lo
+    (`remover_temporario`); os que sobram de sessões encerradas são
+    apagados aqui depois de IDADE_MAXIMA_TEMPORARIO e ao fim do processo.
+    """
+    os.makedirs(PASTA_TEMPORARIOS, exist_ok=True)
+    _remover_temporarios_antigos()
+    fd, caminho = tempfile.mkstemp(prefix=PREFIXO_TEMPORARIO, suffix=f".{formato}", dir=PASTA_TEMPORARIOS)
+    os.close(fd)
+    _temporarios.add(caminho)
+    return caminho
+
+
+def concatenar_para_disco(
+    arquivos: Iterable,
+    ler_arquivo: Callable,
+    colunas: List[str],
+    caminho: str,
+    formato: str = "xlsx",
+    dtypes: Optional[Dict[str, str]] = None,
+    linhas_previa: int = 100,
+    ao_processar: Optional[Callable] = None,
+    ao_gravar: Optional[Callable] = None,
+) -> Tuple[int, pd.DataFrame, List[Tuple[str, Optional[str]]]]:
+    """
+    Lê cada arquivo com `ler_arquivo(file)` e grava suas linhas na saída
+    logo em seguida, mantendo apenas um arquivo em memória por vez.
+
+    `ler_arquivo` deve retornar um DataFrame, um iterável de DataFrames
+    (blocos de linhas, para arquivos que não cabem em memória) ou None se o
+    arquivo não puder ser lido. `ao_processar(i, file)` é chamado antes de
+    cada leitura, para atualizar barras de progresso, e `ao_gravar(df)`
+    depois de cada arquivo (ou bloco) gravado, para acumular totais sem
+    manter os dados em memória. Se um bloco falhar, as linhas dos blocos
+    anteriores do mesmo arquivo já estarão na saída.
+
+    Retorna:
+        - Total de linhas gravadas
+        - DataFrame com as primeiras `linhas_previa` linhas (pré-visualização)
+        - Lista de (nome do arquivo, erro ou None)
+    """
+    previa = []
+    linhas_na_previa = 0
+    resultados = []
+
+    with SaidaConcatenada(caminho, colunas, formato) as saida:
+        for i, file in enumerate(arquivos):
+            if ao_processar is not None:
+                ao_processar(i, file)
+            try:
+                lido = ler_arquivo(file)
+                if lido is None:
+                    resultados.append((file.name, "Arquivo não pôde ser lido"))
+                    continue
+                for df in ([lido] if isinstance(lido, pd.DataFrame) else lido):
+                    df = aplicar_esquema(df, colunas, dtypes)
+                    saida.escrever(df)
+                    if ao_gravar is not None:
+                        ao_gravar(df)
+                    if linhas_na_previa < linhas_previa:
+                        previa.append(df.head(linhas_previa - linhas_na_previa))
+                        linhas_na_previa += len(previa[-1])
+                    del df
+            except Exception as e:
+                resultados.append((file.name, str(e)))
+                continue
+
+            resultados.append((file.name, None))
+
+        total_linhas = saida.total_linhas
+
+    df_previa = pd.concat(previa, ignore_index=True) if previa else pd.DataFrame(columns=colunas)
+    return total_linhas, df_previa, resultados
@@ -0,0 +1,375 @@
+"""
+Regras contratuais de cada artista (splits de Writer e Publisher).
+
+Cada artista em data/catalogs/<artista>/ tem um contrato.json com os
+shares, os titulares de cada bloco (obras adquiridas e não adquiridas) e
+as linhas de income geradas para o sistema externo. O contrato é lido e
+compilado uma única vez por processo (validação pelo mtime): cada bloco
+vira uma matriz de fatores aplicada a todas as obras de uma vez, e cada
+titular já sabe em qual linha de income e em qual split entra.
+
+Exemplo de parte de um bloco:
+    {"titular": "{autor} (Writer Share)", "fatores": ["writer"],
+     "income": "recuperavel", "split": "rights"}
+
+Os fatores são multiplicados em sequência (nomes em "shares" ou números)
+e as partes de cada obra são repartidas em centavos (utils.dinheiro),
+somando exatamente o valor da obra.
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.dinheiro import de_unidades, para_unidades, ratear_unidades
+from utils.obras import IndiceObras
+from utils.referencias import RAIZ_APP, carregar_referencia, obter_derivado, registrar_referencia
+
+PASTA_CATALOGOS = RAIZ_APP / "data" / "catalogs"
+ARQUIVO_CONTRATO = "contrato.json"
+
+TIPOS_RELATORIO = ("Writer", "Publisher")
+# Chave do bloco no contrato -> obras às quais ele se aplica (AQUIRED == 'Y' ou não)
+STATUS_BLOCO = {"adquiridas": True, "nao_adquiridas": False}
+SPLITS = ("rights", "organizacao")
+
+COLUNAS_TITULARES = ['TITULAR', 'PERCENTUAL', 'TOTAL CALCULADO']
+COLUNAS_INCOMES = [
+    'Name (*)', 'Contract - Money In (*)', 'Sale Date (*)', 'Payment Date (*)',
+    'Net Amount (*)', 'Gross Amount', 'Foreign Currency', 'Foreign Net Amount',
+    'Foreign Gross Amount', 'Contract - Money Out (*)',
+    'SPLIT AMOUNT | Organization (*)', 'SPLIT AMOUNT | Rights-Holder (*)', 'Notes',
+]
+
+_lock = threading.Lock()
+# artista -> (mtime do contrato.json, Contrato)
+_contratos: Dict[str, Tuple[float, "Contrato"]] = {}
+
+
+def _percentual_parte(parte: dict, produto: float) -> float:
+    """PERCENTUAL exibido: o informado no contrato ou o produto dos fatores x 100."""
+    if "percentual" in parte:
+        return float(parte["percentual"])
+    return produto * 100
+
+
+def agrupar_por_titular(resultados: pd.DataFrame) -> pd.DataFrame:
+    """Totaliza as linhas calculadas por TITULAR"""
+    return resultados.groupby('TITULAR').agg({
+        'PERCENTUAL': 'first',
+        'TOTAL CALCULADO': 'sum'
+    }).reset_index()
+
+
+class PlanoAlocacao:
+    """
+    Plano compilado de um tipo de relatório (Writer ou Publisher) de um
+    artista: blocos de titulares com a matriz de fatores e as linhas de
+    income do sistema externo.
+    """
+
+    def __init__(self, tipo: str, blocos: List[dict], incomes: List[dict], contract_money_in: str):
+        self.tipo = tipo
+        self.blocos = blocos
+        self.incomes = incomes
+        self.contract_money_in = contract_money_in
+
+        # TITULAR -> (id da linha de income, split); o mesmo titular pode
+        # aparecer em mais de um bloco, mas sempre na mesma linha
+        self.destinos: Dict[str, Tuple[str, str]] = {}
+        for bloco in blocos:
+            for grupo in bloco["grupos"]:
+                for titular, destino in zip(grupo["titulares"], grupo["destinos"]):
+                    anterior = self.destinos.setdefault(titular, destino)
+                    if anterior != destino:
+                        raise ValueError(f"{tipo}: titular '{titular}' com destinos diferentes ({anterior} e {destino})")
+
+    @property
+    def nomes_blocos(self) -> List[str]:
+        return [bloco["nome"] for bloco in self.blocos]
+
+    def alocar(self, df_obras: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """
+        Aplica o plano às obras (colunas TOTAL e AQUIRED) e retorna, por
+        bloco, as linhas TITULAR / PERCENTUAL / TOTAL CALCULADO ordenadas
+        por obra (e pela ordem dos titulares dentro da obra).
+        """
+        totais = df_obras['TOTAL'].to_numpy(dtype=float)
+        adquiridas = (df_obras['AQUIRED'] == 'Y').to_numpy()
+
+        resultados = {}
+        for bloco in self.blocos:
+            obras, titulares, percentuais, valores = [], [], [], []
+            for grupo in bloco["grupos"]:
+                posicoes = np.flatnonzero(adquiridas if grupo["adquiridas"] else ~adquiridas)
+                n_partes = len(grupo["titulares"])
+                if not len(posicoes) or not n_partes:
+                    continue
+
+                # (partes x obras): cada linha multiplica o total da obra pelos
+                # fatores da parte em sequência (colunas completadas com 1.0)
+                matriz = np.broadcast_to(totais[posicoes], (n_partes, len(posicoes)))
+                for coluna in grupo["fatores"].T:
+                    matriz = matriz * coluna[:, None]
+
+                # O valor que as partes somam em cada obra é arredondado uma vez
+                # e repartido em centavos pelos maiores restos: as partes de uma
+                # obra fecham exatamente com esse total
+                centavos = ratear_unidades(para_unidades(matriz.sum(axis=0)), matriz)
+
+                obras.append(np.repeat(posicoes, n_partes))
+                titulares.append(np.tile(grupo["titulares"], len(posicoes)))
+                percentuais.append(np.tile(grupo["percentuais"], len(posicoes)))
+                valores.append(de_unidades(centavos).T.reshape(-1))
+
+            if not obras:
+                resultados[bloco["nome"]] = pd.DataFrame(columns=COLUNAS_TITULARES)
+                continue
+
+            ordem = np.argsort(np.concatenate(obras), kind='stable')
+            resultados[bloco["nome"]] = pd.DataFrame({
+                'TITULAR': np.concatenate(titulares)[ordem],
+                'PERCENTUAL': np.concatenate(percentuais)[ordem],
+                'TOTAL CALCULADO': np.concatenate(valores)[ordem],
+            })
+        return resultados
+
+    def gerar_incomes(self, df_titulares: pd.DataFrame, periodo: str, total_geral_real: Optional[float] = None) -> pd.DataFrame:
+        """
+        Gera as linhas de incomes no formato do sistema externo a partir dos
+        totais por titular (de um ou mais blocos).
+
+        O Net Amount de cada linha é a soma dos seus titulares em centavos,
+        exceto a última, que fecha a diferença para o Gross Amount. Nas
+        linhas com titulares de "organizacao", o split de Organization é
+        arredondado primeiro e o de Rights-Holder fecha o Net Amount.
+        """
+        totais = df_titulares.groupby('TITULAR', sort=False)['TOTAL CALCULADO'].sum().to_dict() if len(df_titulares) else {}
+
+        def centavos(titulares):
+            return int(para_unidades(sum(totais.get(titular, 0.0) for titular in titulares)))
+
+        # Conta em centavos inteiros: os Net Amounts fecham exatamente o Gross Amount
+        if total_geral_real is not None:
+            gross = int(para_unidades(total_geral_real))
+        else:
+            gross = int(para_unidades(sum(sum(totais.get(t, 0.0) for t in linha["titulares"]) for linha in self.incomes)))
+        total_geral = gross / 100
+
+        incomes = []
+        soma_nets = 0
+        for i, linha in enumerate(self.incomes):
+            if i < len(self.incomes) - 1:
+                net = centavos(linha["titulares"])
+                soma_nets += net
+            else:
+                # Última linha ajustada para que a soma = Gross Amount exato
+                net = gross - soma_nets
+            net_amount = net / 100
+
+            if linha["organizacao"]:
+                org = centavos(linha["organizacao"])
+                split_org = org / 100
+                split_rights = (net - org) / 100
+            else:
+                split_org = 0
+                split_rights = net_amount
+
+            incomes.append({
+                'Name (*)': linha["nome"].format(periodo=periodo),
+                'Contract - Money In (*)': self.contract_money_in,
+                'Sale Date (*)': '',
+                'Payment Date (*)': '',
+                'Net Amount (*)': net_amount,
+                'Gross Amount': total_geral,
+                'Foreign Currency': '',
+                'Foreign Net Amount': '',
+                'Foreign Gross Amount': '',
+                'Contract - Money Out (*)': linha["money_out"],
+                'SPLIT AMOUNT | Organization (*)': split_org,
+                'SPLIT AMOUNT | Rights-Holder (*)': split_rights,
+                'Notes': linha["notes"].format(split_org=split_org, split_rights=split_rights),
+            })
+
+        return pd.DataFrame(incomes, columns=COLUNAS_INCOMES)
+
+
+class Contrato:
+    """Contrato compilado de um artista (autor, editora, catálogo e planos)."""
+
+    def __init__(self, artista: str, dados: dict):
+        self.artista = artista
+        self.nome = dados.get("artista", artista.replace("-", " ").upper())
+        self.autor = dados["autor"]
+        self.editora = dados["editora"]
+        self.contract_money_in = dados["contract_money_in"]
+        self.shares = {chave: float(valor) for chave, valor in dados.get("shares", {}).items()}
+
+        self.referencia_obras = f"obras_{artista.replace('-', '_')}"
+        registrar_referencia(self.referencia_obras, self._arquivo_obras(dados.get("obras")))
+
+        self.planos = {
+            tipo: self._compilar(tipo, dados[tipo])
+            for tipo in TIPOS_RELATORIO if tipo in dados
+        }
+
+    def _arquivo_obras(self, nome_arquivo: Optional[str]) -> Path:
+        pasta = PASTA_CATALOGOS / self.artista
+        if nome_arquivo:
+            return pasta / nome_arquivo
+        # Sem nome no contrato: planilha mais recente com 'obras-cadastradas' no nome
+        candidatos = sorted(p for p in pasta.glob("*.xlsx") if 'obras-cadastradas' in p.name)
+        if not candidatos:
+            raise FileNotFoundError(f"Nenhuma planilha de obras cadastradas em {pasta}")
+        return candidatos[-1]
+
+    def _fator(self, fator) -> float:
+        if isinstance(fator, str):
+            if fator not in self.shares:
+                raise ValueError(f"{self.artista}: share '{fator}' não definido no contrato")
+            return self.shares[fator]
+        return float(fator)
+
+    def _compilar(self, tipo: str, regras: dict) -> PlanoAlocacao:
+        linhas = [dict(linha, titulares=[], organizacao=[]) for linha in regras["incomes"]]
+        por_id = {linha["id"]: linha for linha in linhas}
+
+        blocos = []
+        for bloco in regras["blocos"]:
+            grupos = []
+            for chave, adquiridas in STATUS_BLOCO.items():
+                partes = bloco.get(chave)
+                if not partes:
+                    continue
+
+                fatores = [[self._fator(f) for f in parte["fatores"]] for parte in partes]
+                largura = max([len(f) for f in fatores] + [1])
+                matriz = np.ones((len(partes), largura))
+                percentuais = []
+                for i, sequencia in enumerate(fatores):
+                    matriz[i, :len(sequencia)] = sequencia
+                    percentual = 1.0
+                    for fator in sequencia:
+                        percentual = percentual * fator
+                    percentuais.append(_percentual_parte(partes[i], percentual))
+
+                titulares, destinos = [], []
+                for parte in partes:
+                    titular = parte["titular"].format(autor=self.autor, editora=self.editora)
+                    split = parte.get("split", "rights")
+                    if parte["income"] not in por_id:
+                        raise ValueError(f"{self.artista} {tipo}: linha de income '{parte['income']}' não definida")
+                    if split not in SPLITS:
+                        raise ValueError(f"{self.artista} {tipo}: split '{split}' inválido (use {', '.join(SPLITS)})")
+                    titulares.append(titular)
+                    destinos.append((parte["income"], split))
+
+                    linha = por_id[parte["income"]]
+                    if titular not in linha["titulares"]:
+                        linha["titulares"].append(titular)
+                    if split == "organizacao" and titular not in linha["organizacao"]:
+                        linha["organizacao"].append(titular)
+
+                grupos.append({
+                    "adquiridas": adquiridas,
+                    "titulares": np.array(titulares, dtype=object),
+                    "destinos": destinos,
+                    "percentuais": np.array(percentuais, dtype=float),
+                    "fatores": matriz,
+                })
+            blocos.append({"nome": bloco["nome"], "grupos": grupos})
+
+        return PlanoAlocacao(tipo, blocos, linhas, self.contract_money_in)
+
+    def plano(self, tipo: str) -> PlanoAlocacao:
+        if tipo not in self.planos:
+            raise KeyError(f"{self.artista}: contrato sem regras de {tipo}")
+        return self.planos[tipo]
+
+    def carregar_obras(self) -> pd.DataFrame:
+        """Catálogo de obras cadastradas do artista (cacheado por utils.referencias)."""
+        return carregar_referencia(self.referencia_obras)
+
+    def indice_obras(self) -> IndiceObras:
+        """Catálogo indexado por CÓD. OBRA e ISWC, refeito apenas quando a planilha muda."""
+        return obter_derivado(self.referencia_obras, "indice_obras", IndiceObras)
+
+
+def caminho_contrato(artista: str) -> Path:
+    return PASTA_CATALOGOS / artista / ARQUIVO_CONTRATO
+
+
+def listar_artistas() -> List[str]:
+    """Artistas (pastas em data/catalogs) que têm contrato.json."""
+    if not PASTA_CATALOGOS.is_dir():
+        return []
+    return sorted(p.name for p in PASTA_CATALOGOS.iterdir() if (p / ARQUIVO_CONTRATO).is_file())
+
+
+def carregar_contrato(artista: str) -> Contrato:
+    """
+    Retorna o contrato compilado do artista, relendo o contrato.json apenas
+    se ele tiver sido alterado. Lança FileNotFoundError se não existir.
+    """
+    caminho = caminho_contrato(artista)
+    mtime = caminho.stat().st_mtime
+
+    with _lock:
+        em_cache = _contratos.get(artista)
+        if em_cache is not None and em_cache[0] == mtime:
+            return em_cache[1]
+
+    with open(caminho, encoding="utf-8") as f:
+        contrato = Contrato(artista, json.load(f))
+
+    with _lock:
+        _contratos[artista] = (mtime, contrato)
+    return contrato
+
+
+def processar_lote(entradas: List[dict]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Aplica os contratos a vários artistas, tipos e períodos de uma vez.
+
+    Args:
+        entradas: lista de dicts com 'artista', 'tipo' ("Writer"/"Publisher"),
+            'periodo' e 'df_obras' (obras já cruzadas com o catálogo, com
+            TOTAL e AQUIRED)
+
+    Returns:
+        (resultados, df_titulares, df_incomes): linhas por obra, totais por
+        titular e incomes, todos com as colunas ARTISTA, TIPO e PERIODO.
+        Os totais por titular saem de um único groupby sobre todo o lote.
+    """
+    chaves = ['ARTISTA', 'TIPO', 'PERIODO']
+    blocos, totais_processados = [], {}
+    for entrada in entradas:
+        chave = (entrada['artista'], entrada['tipo'], entrada['periodo'])
+        plano = carregar_contrato(entrada['artista']).plano(entrada['tipo'])
+        totais_processados[chave] = totais_processados.get(chave, 0) + entrada['df_obras']['TOTAL'].sum()
+        for nome_bloco, linhas in plano.alocar(entrada['df_obras']).items():
+            if linhas.empty:
+                continue
+            blocos.append(linhas.assign(ARTISTA=chave[0], TIPO=chave[1], PERIODO=chave[2], BLOCO=nome_bloco))
+
+    if not blocos:
+        vazio = pd.DataFrame(columns=chaves + ['BLOCO'] + COLUNAS_TITULARES)
+        return vazio, vazio.copy(), pd.DataFrame(columns=chaves + COLUNAS_INCOMES)
+
+    resultados = pd.concat(blocos, ignore_index=True)[chaves + ['BLOCO'] + COLUNAS_TITULARES]
+    df_titulares = resultados.groupby(chaves + ['BLOCO', 'TITULAR'], sort=False).agg({
+        'PERCENTUAL': 'first',
+        'TOTAL CALCULADO': 'sum'
+    }).reset_index()
+
+    incomes = []
+    for chave, grupo in df_titulares.groupby(chaves, sort=False):
+        plano = carregar_contrato(chave[0]).plano(chave[1])
+        df_incomes = plano.gerar_incomes(grupo, chave[2], totais_processados[chave])
+        incomes.append(df_incomes.assign(ARTISTA=chave[0], TIPO=chave[1], PERIODO=chave[2]))
+    df_incomes = pd.concat(incomes, ignore_index=True)[chaves + COLUNAS_INCOMES]
+
+    return resultados, df_titulares, df_incomes
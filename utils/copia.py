@@ -0,0 +1,335 @@
+"""
+Cópia concorrente e incremental de arquivos (pastas de rede).
+
+Em compartilhamentos SMB o tempo de cada cópia é dominado pela latência
+da rede, então alguns arquivos são copiados ao mesmo tempo num pool de
+threads limitado. As tarefas (origem, destino) podem vir de uma lista ou
+de um gerador (ex.: uma varredura ainda em andamento): o consumo é feito
+aos poucos, com um número limitado de cópias pendentes.
+
+Tarefas repetidas (mesma origem e mesmo destino) são copiadas uma única
+vez; origens diferentes com o mesmo destino são conflitos: só a primeira
+é copiada e as demais são relatadas, em vez de passarem por repetição.
+Arquivos cujo destino já tem o mesmo tamanho e a mesma data de modificação são pulados. A cópia usa
+shutil.copy2, que preserva a data de modificação, para que a próxima
+execução reconheça o arquivo como atualizado. Com um manifesto
+(utils.manifesto), o hash do conteúdo é calculado na mesma leitura da
+cópia e origem e destino ficam registrados.
+
+Para copiar árvores de pastas, `VarreduraArquivos` percorre a origem com
+os.scandir numa única passada (opcionalmente uma thread por subpasta do
+primeiro nível) e entrega os arquivos encontrados enquanto a varredura
+continua, para que as cópias comecem antes de ela terminar.
+"""
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Cópias simultâneas; acima disso o SMB tende a só dividir a mesma banda
+MAX_WORKERS_COPIA = 8
+
+# Subpastas do primeiro nível varridas ao mesmo tempo
+MAX_WORKERS_VARREDURA = 8
+
+# Sistemas de arquivos de rede (e FAT) guardam o mtime com resolução de 2 segundos
+TOLERANCIA_MTIME = 2.0
+
+COPIADO = "copiado"
+IGNORADO = "ignorado"
+NAO_ENCONTRADO = "nao_encontrado"
+ERRO = "erro"
+
+
+def chave_caminho(caminho) -> str:
+    """Caminho absoluto normalizado para comparação (barras, '..' e maiúsculas no Windows)."""
+    return os.path.normcase(os.path.normpath(os.path.abspath(caminho)))
+
+
+def destino_atualizado(origem: os.stat_result, destino: str) -> bool:
+    """True se o destino existe com o mesmo tamanho e a mesma data de modificação da origem."""
+    try:
+        atual = os.stat(destino)
+    except OSError:
+        return False
+    return atual.st_size == origem.st_size and abs(atual.st_mtime - origem.st_mtime) <= TOLERANCIA_MTIME
+
+
+def copiar_arquivo(origem: str, destino: str, manifesto=None) -> Tuple[str, int, Optional[str]]:
+    """
+    Copia um arquivo, pulando-o se o destino já estiver atualizado.
+    Retorna (status, bytes copiados, mensagem de erro ou None).
+    """
+    try:
+        info = os.stat(origem)
+    except FileNotFoundError:
+        return NAO_ENCONTRADO, 0, None
+    except OSError as e:
+        return ERRO, 0, str(e)
+
+    try:
+        if destino_atualizado(info, destino):
+            if manifesto is not None:
+                manifesto.registrar(origem, info)
+            return IGNORADO, 0, None
+
+        if manifesto is not None:
+            manifesto.copiar(origem, destino, info)
+        else:
+            shutil.copy2(origem, destino)
+    except FileNotFoundError:
+        return NAO_ENCONTRADO, 0, None
+    except Exception as e:
+        return ERRO, 0, str(e)
+    return COPIADO, info.st_size, None
+
+
+class ResumoCopia:
+    """Totais de uma execução, atualizados à medida que as cópias terminam."""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.enviados = 0
+        self.concluidos = 0
+        self.copiados = 0
+        self.ignorados = 0
+        # Tarefas repetidas (mesma origem e destino), copiadas uma única vez
+        self.duplicados: List[str] = []
+        # (origem, destino) de origens diferentes para um destino já usado, não copiadas
+        self.conflitos: List[Tuple[str, str]] = []
+        self.bytes_copiados = 0
+        self.nao_encontrados: List[str] = []
+        self.falhas: List[Tuple[str, str]] = []
+        # Fica True quando todas as tarefas foram recebidas (total conhecido)
+        self.tarefas_completas = False
+
+    @property
+    def segundos(self) -> float:
+        return time.monotonic() - self.inicio
+
+    @property
+    def vazao(self) -> float:
+        """Bytes copiados por segundo desde o início."""
+        return self.bytes_copiados / max(self.segundos, 1e-6)
+
+    def registrar(self, origem: str, status: str, tamanho: int, erro: Optional[str]):
+        self.concluidos += 1
+        if status == COPIADO:
+            self.copiados += 1
+            self.bytes_copiados += tamanho
+        elif status == IGNORADO:
+            self.ignorados += 1
+        elif status == NAO_ENCONTRADO:
+            self.nao_encontrados.append(origem)
+        else:
+            self.falhas.append((origem, erro))
+
+
+def formatar_bytes(quantidade: float) -> str:
+    for unidade in ("B", "KB", "MB", "GB"):
+        if quantidade < 1024:
+            return f"{quantidade:.1f} {unidade}"
+        quantidade /= 1024
+    return f"{quantidade:.1f} TB"
+
+
+def copiar_em_paralelo(
+    tarefas: Iterable[Tuple[str, str]],
+    max_workers: int = MAX_WORKERS_COPIA,
+    ao_progredir: Optional[Callable[[ResumoCopia], None]] = None,
+    intervalo: float = 0.5,
+    manifesto=None,
+) -> ResumoCopia:
+    """
+    Copia as tarefas (caminho de origem, caminho completo de destino) num
+    pool de `max_workers` threads.
+
+    Uma tarefa repetida (mesma origem e destino) é copiada só na primeira
+    vez (as demais vão para `duplicados`); outra origem com um destino já
+    usado não é copiada e vai para `conflitos`. As pastas de destino são criadas uma
+    vez cada. `ao_progredir(resumo)` é chamado na thread de quem chamou,
+    no máximo a cada `intervalo` segundos e ao final, para que a página
+    atualize barra de progresso e vazão sem uma mensagem por arquivo.
+    Com `manifesto`, as origens e cópias ficam registradas nele.
+    """
+    resumo = ResumoCopia()
+    destinos = {}
+    pastas_criadas = set()
+    pendentes = {}
+    ultimo_aviso = 0.0
+
+    def concluir(futuros):
+        for futuro in futuros:
+            resumo.registrar(pendentes.pop(futuro), *futuro.result())
+
+    def avisar(forcar=False):
+        nonlocal ultimo_aviso
+        if ao_progredir is not None and (forcar or time.monotonic() - ultimo_aviso >= intervalo):
+            ultimo_aviso = time.monotonic()
+            ao_progredir(resumo)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for origem, destino in tarefas:
+            chave = chave_caminho(destino)
+            if chave in destinos:
+                if destinos[chave] == chave_caminho(origem):
+                    resumo.duplicados.append(origem)
+                else:
+                    resumo.conflitos.append((origem, destino))
+                continue
+            destinos[chave] = chave_caminho(origem)
+            resumo.enviados += 1
+
+            pasta = os.path.dirname(destino)
+            if pasta and pasta not in pastas_criadas:
+                try:
+                    os.makedirs(pasta, exist_ok=True)
+                except OSError as e:
+                    resumo.registrar(origem, ERRO, 0, f"Erro ao criar a pasta {pasta}: {e}")
+                    continue
+                pastas_criadas.add(pasta)
+
+            pendentes[executor.submit(copiar_arquivo, origem, destino, manifesto)] = origem
+
+            # Limita as cópias em espera para consumir geradores aos poucos
+            if len(pendentes) >= max_workers * 4:
+                feitos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            else:
+                feitos, _ = wait(pendentes, timeout=0)
+            concluir(feitos)
+            avisar()
+
+        resumo.tarefas_completas = True
+        while pendentes:
+            feitos, _ = wait(pendentes, timeout=intervalo, return_when=FIRST_COMPLETED)
+            concluir(feitos)
+            avisar()
+
+    avisar(forcar=True)
+    return resumo
+
+
+class VarreduraArquivos:
+    """
+    Arquivos de `raiz` (e subpastas) terminados em uma das `extensoes`,
+    encontrados com os.scandir numa única passada. Iterar sobre o objeto
+    devolve os caminhos à medida que são encontrados.
+
+    A ordem é fixa: entradas de cada pasta em ordem de nome, arquivos antes
+    das subpastas, em profundidade. Com `paralelo`, cada subpasta do
+    primeiro nível é varrida por uma thread, mas os arquivos são entregues
+    na mesma ordem da varredura sequencial (os de uma subpasta só depois
+    dos da anterior), para que arquivos de mesmo nome se resolvam sempre
+    da mesma forma na cópia. Os contadores (pastas do primeiro nível concluídas, arquivos
+    vistos, encontrados) permitem estimar o total enquanto a varredura
+    ainda está em andamento. Pastas em `ignorar` (ex.: a pasta de saída
+    dentro da origem) não são percorridas e pastas sem permissão vão para
+    `erros` sem interromper a varredura.
+    """
+
+    def __init__(
+        self,
+        raiz: str,
+        extensoes: Sequence[str],
+        ignorar: Iterable[str] = (),
+        paralelo: bool = True,
+        max_workers: int = MAX_WORKERS_VARREDURA,
+    ):
+        self.raiz = raiz
+        self.extensoes = tuple(extensoes)
+        self.ignorar = {chave_caminho(pasta) for pasta in ignorar if pasta}
+        self.paralelo = paralelo
+        self.max_workers = max_workers
+        self.pastas_topo = 0
+        self.pastas_topo_concluidas = 0
+        self.pastas_visitadas = 0
+        self.arquivos_vistos = 0
+        self.encontrados = 0
+        self.erros: List[Tuple[str, str]] = []
+        self.concluida = False
+        self._lock = threading.Lock()
+
+    def _listar(self, pasta: str) -> Tuple[List[str], List[str]]:
+        """Uma leitura da pasta: (subpastas, arquivos com a extensão)."""
+        subpastas, arquivos = [], []
+        vistos = 0
+        try:
+            with os.scandir(pasta) as entradas:
+                for entrada in entradas:
+                    try:
+                        if entrada.is_dir(follow_symlinks=False):
+                            if chave_caminho(entrada.path) not in self.ignorar:
+                                subpastas.append(entrada.path)
+                        elif entrada.is_file():
+                            vistos += 1
+                            if entrada.name.endswith(self.extensoes):
+                                arquivos.append(entrada.path)
+                    except OSError:
+                        continue
+        except OSError as e:
+            with self._lock:
+                self.erros.append((pasta, str(e)))
+
+        with self._lock:
+            self.pastas_visitadas += 1
+            self.arquivos_vistos += vistos
+            self.encontrados += len(arquivos)
+        return sorted(subpastas), sorted(arquivos)
+
+    def _varrer(self, pasta: str) -> Iterator[str]:
+        pilha = [pasta]
+        while pilha:
+            subpastas, arquivos = self._listar(pilha.pop())
+            yield from arquivos
+            pilha.extend(reversed(subpastas))
+
+    def _varrer_em_paralelo(self, pastas: List[str]) -> Iterator[str]:
+        # Uma fila por subpasta, lidas em ordem: as seguintes continuam sendo
+        # varridas (e acumulam caminhos) enquanto a atual é entregue
+        filas = [queue.Queue() for _ in pastas]
+        fim = object()
+
+        def varrer_pasta(pasta, fila):
+            try:
+                for caminho in self._varrer(pasta):
+                    fila.put(caminho)
+            finally:
+                with self._lock:
+                    self.pastas_topo_concluidas += 1
+                fila.put(fim)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for pasta, fila in zip(pastas, filas):
+                executor.submit(varrer_pasta, pasta, fila)
+            for fila in filas:
+                for item in iter(fila.get, fim):
+                    yield item
+
+    def __iter__(self) -> Iterator[str]:
+        subpastas, arquivos = self._listar(self.raiz)
+        self.pastas_topo = len(subpastas)
+        yield from arquivos
+
+        if self.paralelo and len(subpastas) > 1:
+            yield from self._varrer_em_paralelo(subpastas)
+        else:
+            for pasta in subpastas:
+                yield from self._varrer(pasta)
+                self.pastas_topo_concluidas += 1
+        self.concluida = True
+
+    def total_estimado(self) -> int:
+        """
+        Total de arquivos esperado: o número exato ao final da varredura;
+        antes disso, os encontrados projetados pela fração de subpastas do
+        primeiro nível já concluídas.
+        """
+        if self.concluida or not self.pastas_topo:
+            return self.encontrados
+        fracao = self.pastas_topo_concluidas / self.pastas_topo
+        if fracao == 0:
+            return self.encontrados + 1
+        return max(self.encontrados, round(self.encontrados / fracao))
@@ -0,0 +1,117 @@
+"""
+Descontos proporcionais em várias colunas de valores de uma vez.
+
+Os valores de cada ação vêm numa tabela grupo x coluna (percentual ou
+valor de cada coluna, para cada grupo). Sem coluna de grupo há um único
+grupo com todas as linhas; com ela (ex.: moeda, catálogo), cada grupo tem
+o seu valor.
+
+    - Percentual: cada linha é multiplicada pelo fator do seu grupo, com
+      um único get_indexer das linhas na tabela de percentuais
+    - Valor específico: o valor de cada grupo e coluna é rateado entre as
+      linhas do grupo proporcionalmente aos valores (maiores restos, em
+      utils.dinheiro), então a soma dos descontos é exatamente o valor
+      informado; as colunas de um grupo são rateadas numa única chamada
+    - Linha de ajuste: uma linha por grupo com o ajuste de cada coluna
+
+Percentual e valor específico alteram as colunas do DataFrame recebido
+(in-place); as linhas de ajuste são devolvidas à parte, para que o
+arquivo só seja montado com elas na exportação.
+"""
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.dinheiro import CASAS_RATEIO, ratear
+
+# Rótulo do grupo único quando não há coluna de grupo
+TODAS_AS_LINHAS = "(todas as linhas)"
+
+
+def grupos_das_linhas(df: pd.DataFrame, coluna_grupo: Optional[str]) -> pd.Series:
+    """Grupo de cada linha (vazios viram o texto vazio; sem coluna, um grupo só)."""
+    if not coluna_grupo:
+        return pd.Series(TODAS_AS_LINHAS, index=df.index)
+    return df[coluna_grupo].astype(str).where(df[coluna_grupo].notna(), "")
+
+
+def tabela_valores(df: pd.DataFrame, colunas: List[str], coluna_grupo: Optional[str], valor_padrao: float) -> pd.DataFrame:
+    """Tabela grupo x coluna preenchida com `valor_padrao`, para edição na página."""
+    grupos = pd.unique(grupos_das_linhas(df, coluna_grupo))
+    return pd.DataFrame(float(valor_padrao), index=pd.Index(grupos, name=coluna_grupo or "Grupo"), columns=colunas)
+
+
+def _valores_por_linha(valores: pd.DataFrame, grupos: pd.Series) -> np.ndarray:
+    """Valores (n linhas x colunas) do grupo de cada linha; grupos fora da tabela valem 0."""
+    posicoes = valores.index.astype(str).get_indexer(grupos)
+    matriz = np.vstack([valores.to_numpy(dtype=float), np.zeros(valores.shape[1])])
+    return matriz[posicoes]
+
+
+def aplicar_percentual(df: pd.DataFrame, colunas: List[str], percentuais: pd.DataFrame, coluna_grupo: Optional[str] = None):
+    """Multiplica as colunas por (1 - percentual/100) do grupo de cada linha, in-place."""
+    fatores = 1 - _valores_por_linha(percentuais[colunas], grupos_das_linhas(df, coluna_grupo)) / 100
+    df[colunas] = df[colunas].to_numpy(dtype=float) * fatores
+
+
+def aplicar_valor(df: pd.DataFrame, colunas: List[str], valores: pd.DataFrame, coluna_grupo: Optional[str] = None):
+    """
+    Desconta de cada coluna o valor do grupo, rateado entre as linhas do
+    grupo pelo valor de cada linha, in-place. Um grupo com valor a
+    descontar e soma zero ou negativa na coluna gera ValueError (nada é
+    alterado).
+    """
+    grupos = grupos_das_linhas(df, coluna_grupo)
+    atuais = df[colunas].to_numpy(dtype=float)
+    pesos = np.nan_to_num(atuais)
+    descontos = np.zeros_like(pesos)
+
+    tabela = valores[colunas].set_axis(valores.index.astype(str))
+    problemas = []
+    for grupo, posicoes in grupos.groupby(grupos, sort=False).indices.items():
+        if grupo not in tabela.index:
+            continue
+        valores_grupo = tabela.loc[grupo].to_numpy(dtype=float)
+        pesos_grupo = pesos[posicoes]
+        invalidas = (valores_grupo != 0) & (pesos_grupo.sum(axis=0) <= 0)
+        if invalidas.any():
+            problemas += [f"{grupo} / {coluna}" for coluna in np.asarray(colunas)[invalidas]]
+            continue
+        descontos[posicoes] = ratear(valores_grupo, pesos_grupo, CASAS_RATEIO)
+
+    if problemas:
+        raise ValueError("Soma zero ou negativa em: " + ", ".join(problemas))
+    df[colunas] = atuais - descontos
+
+
+def linhas_ajuste(
+    df: pd.DataFrame,
+    colunas: List[str],
+    valores: pd.DataFrame,
+    coluna_descricao: str,
+    descricao: str,
+    sinal: int = -1,
+    coluna_grupo: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Uma linha de ajuste por grupo com valor diferente de zero, com as
+    colunas do arquivo (vazias, exceto descrição, grupo e valores). O
+    `sinal` é aplicado aos valores informados (-1 para desconto).
+    """
+    valores = valores[colunas]
+    valores = valores[(valores != 0).any(axis=1)]
+    ajustes = pd.DataFrame("", index=range(len(valores)), columns=df.columns, dtype=object)
+    ajustes[coluna_descricao] = descricao
+    if coluna_grupo:
+        ajustes[coluna_grupo] = valores.index.to_numpy()
+    ajustes[colunas] = sinal * valores.to_numpy(dtype=float) + 0.0  # sem -0,0
+    return ajustes
+
+
+def totais(df: pd.DataFrame, colunas: List[str], ajustes: Optional[pd.DataFrame] = None) -> pd.Series:
+    """Soma de cada coluna, incluindo as linhas de ajuste."""
+    soma = df[colunas].sum()
+    if ajustes is not None and not ajustes.empty:
+        soma = soma + pd.to_numeric(ajustes[colunas].stack(), errors="coerce").groupby(level=1).sum().reindex(colunas, fill_value=0)
+    return soma
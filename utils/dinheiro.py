@@ -0,0 +1,130 @@
+"""
+Aritmética de valores monetários em unidades inteiras (centavos).
+
+Os rateios proporcionais das páginas (shares do EP, fee da ONERPM,
+descontos) são feitos em unidades inteiras pelo método dos maiores
+restos: cada parte recebe o piso da sua cota e as unidades que sobram vão
+para as maiores frações. Assim a soma das partes é sempre exatamente o
+total, sem o centavo a mais ou a menos de arredondar parte a parte.
+
+Tudo é vetorizado com numpy; `casas` define o tamanho da unidade
+(2 = centavos, 6 = milionésimos para colunas com mais casas decimais).
+"""
+from typing import Union
+
+import numpy as np
+
+CASAS_MOEDA = 2
+# Precisão usada nos rateios de colunas que não estão em centavos (ex: Net da ONERPM)
+CASAS_RATEIO = 6
+# Casas das frações comparadas nos maiores restos: partes com o mesmo peso
+# empatam mesmo quando o produto dos fatores difere no último bit
+CASAS_FRACAO = 9
+
+
+def arredondar(valores, casas: int = CASAS_MOEDA) -> np.ndarray:
+    """Arredonda com o mesmo resultado de round(x, casas) do Python, valor a valor.
+
+    O np.round pode divergir do round() apenas em casos de empate (valor
+    escalado terminando em ,5); esses poucos valores são refeitos com
+    round(). Aceita arrays de qualquer formato.
+    """
+    valores = np.asarray(valores, dtype=float)
+    arredondados = np.round(valores, casas)
+    planos = arredondados.reshape(-1)
+    originais = valores.reshape(-1)
+    escalados = originais * 10 ** casas
+    empates = np.flatnonzero(np.abs(np.abs(escalados - np.trunc(escalados)) - 0.5) < 1e-6)
+    for i in empates:
+        planos[i] = round(float(originais[i]), casas)
+    return planos.reshape(valores.shape)
+
+
+def arredondar_centavos(valores) -> np.ndarray:
+    """Arredonda para centavos com o mesmo resultado de round(x, 2)."""
+    return arredondar(valores, CASAS_MOEDA)
+
+
+def para_unidades(valores, casas: int = CASAS_MOEDA) -> np.ndarray:
+    """Converte valores em unidades inteiras (int64), arredondando como round(x, casas)."""
+    return np.rint(arredondar(valores, casas) * 10 ** casas).astype(np.int64)
+
+
+def de_unidades(unidades, casas: int = CASAS_MOEDA) -> np.ndarray:
+    """Converte unidades inteiras de volta para valores (float)."""
+    return np.asarray(unidades, dtype=np.int64) / 10 ** casas
+
+
+def ratear_unidades(totais, pesos) -> np.ndarray:
+    """
+    Reparte totais inteiros proporcionalmente aos pesos (maiores restos).
+
+    Args:
+        totais: inteiro (um total) ou array (n,) com um total por coluna
+        pesos: array (k,) ou (k, n); cada coluna é repartida entre as k
+            partes. Todos os pesos devem ser finitos (NaN gera ValueError;
+            quem chama decide se a linha fica fora do rateio ou vale 0).
+
+    Returns:
+        array int64 com o formato de pesos; cada coluna soma exatamente o
+        seu total. Colunas com peso total zero só são aceitas com total zero.
+
+    Empates nas frações (comuns quando todas as colunas seguem o mesmo
+    split, como as obras de um plano do EP) são decididos pelo saldo de
+    cada parte nas colunas anteriores (unidades recebidas menos a cota
+    exata): a unidade vai para a parte que está mais abaixo da sua cota.
+    Assim partes com pesos iguais terminam com totais iguais (diferença de
+    no máximo uma unidade), qualquer que seja o número de colunas.
+    """
+    pesos = np.asarray(pesos, dtype=float)
+    if not np.isfinite(pesos).all():
+        raise ValueError("Não é possível ratear com pesos vazios (NaN) ou infinitos")
+    vetor = pesos.ndim == 1
+    if vetor:
+        pesos = pesos[:, None]
+    k, n = pesos.shape
+
+    totais = np.broadcast_to(np.asarray(totais, dtype=np.int64), (n,))
+    soma = pesos.sum(axis=0)
+    sem_peso = soma == 0
+    if np.any(sem_peso & (totais != 0)):
+        raise ValueError("Não é possível ratear um valor diferente de zero entre pesos que somam zero")
+    if k == 0:
+        return np.zeros((0,) if vetor else (0, n), dtype=np.int64)
+
+    sinal = np.where(totais < 0, -1, 1)
+    absolutos = np.abs(totais)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        escala = np.where(sem_peso, 0.0, absolutos / np.where(sem_peso, 1.0, soma))
+    cotas = pesos * escala[None, :]
+
+    pisos = np.floor(cotas)
+    fracoes = np.round(cotas - pisos, CASAS_FRACAO)
+    partes = pisos.astype(np.int64)
+
+    # Unidades que faltam em cada coluna; normalmente entre 0 e k, mas
+    # erros de ponto flutuante em valores enormes podem tirar desse intervalo
+    sobra = absolutos - partes.sum(axis=0)
+    inteiras, sobra = np.divmod(sobra, k)
+    partes += inteiras[None, :]
+
+    # As unidades que sobram vão para as maiores frações da coluna; nos
+    # empates, para a parte com o menor saldo (com o sinal do total) até
+    # aqui. Colunas sem sobra não têm frações e não mudam os saldos.
+    saldos = np.zeros(k)
+    for j in np.flatnonzero(sobra):
+        ordem = np.lexsort((sinal[j] * saldos, -fracoes[:, j]))
+        partes[ordem[:sobra[j]], j] += 1
+        saldos += sinal[j] * (partes[:, j] - cotas[:, j])
+
+    partes *= sinal[None, :]
+    return partes[:, 0] if vetor else partes
+
+
+def ratear(total: Union[float, np.ndarray], pesos, casas: int = CASAS_MOEDA) -> np.ndarray:
+    """
+    Reparte um valor (ou um valor por coluna) proporcionalmente aos pesos.
+    O total é arredondado para `casas` e as partes somam exatamente esse
+    total em unidades inteiras.
+    """
+    return de_unidades(ratear_unidades(para_unidades(total, casas), pesos), casas)
@@ -0,0 +1,125 @@
+"""
+Números no formato brasileiro (1.234,56): leitura e exibição.
+
+A leitura trabalha sobre a Series (ou DataFrame) inteira com operações de
+texto vetorizadas: símbolos de moeda, espaços e separador de milhar são
+removidos numa única expressão regular, a vírgula decimal vira ponto e a
+conversão é um único pd.to_numeric. Colunas que já são numéricas são
+mantidas, e em colunas mistas (object) só os textos são convertidos.
+
+Para exibir tabelas, `estilo_br` aplica o formato pelo Styler (separadores
+e casas decimais definidos uma vez por coluna), sem converter o
+DataFrame em texto. `formatar_br` gera os textos quando eles precisam
+existir (métricas, mensagens, arquivos).
+"""
+import re
+from numbers import Number
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+
+# Troca "," por "." e vice-versa (1,234.56 -> 1.234,56) numa única passada
+TROCA_SEPARADORES = str.maketrans({",": ".", ".": ","})
+
+RE_SIMBOLOS = r"R\$|US\$|\$|€|£|\s"
+
+
+def _padrao_limpeza(milhar: str) -> str:
+    return f"{RE_SIMBOLOS}|{re.escape(milhar)}" if milhar else RE_SIMBOLOS
+
+
+def _converter_textos(textos: pd.Series, decimal: str, milhar: str) -> pd.Series:
+    limpos = textos.str.replace(_padrao_limpeza(milhar), "", regex=True)
+    # Negativos entre parênteses: (12,34) -> -12,34
+    limpos = limpos.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+    if decimal != ".":
+        limpos = limpos.str.replace(decimal, ".", regex=False)
+    return pd.to_numeric(limpos, errors="coerce")
+
+
+def _parse_serie(serie: pd.Series, decimal: str, milhar: str) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype(float)
+    if pd.api.types.is_object_dtype(serie):
+        # Colunas mistas (ex.: lidas do Excel): números ficam como estão
+        eh_texto = serie.map(type, na_action="ignore").eq(str)
+        resultado = pd.to_numeric(serie.where(~eh_texto), errors="coerce")
+        if eh_texto.any():
+            resultado[eh_texto] = _converter_textos(serie[eh_texto].astype(str), decimal, milhar)
+        return resultado
+    return _converter_textos(serie.astype(str).where(serie.notna()), decimal, milhar)
+
+
+def parse_numero(
+    valores: Union[pd.Series, pd.DataFrame],
+    decimal: str = ",",
+    milhar: str = ".",
+) -> Union[pd.Series, pd.DataFrame]:
+    """
+    Converte textos numéricos em float ("R$ 1.234,56", "(12,34)", "-5").
+    Por padrão no formato brasileiro; decimal="." e milhar="," leem o
+    formato americano ("$1,234.56"). Textos inválidos viram NaN.
+    """
+    if isinstance(valores, pd.DataFrame):
+        return valores.apply(_parse_serie, decimal=decimal, milhar=milhar)
+    return _parse_serie(pd.Series(valores), decimal, milhar)
+
+
+def parse_br(valores: Union[pd.Series, pd.DataFrame]) -> Union[pd.Series, pd.DataFrame]:
+    """Converte textos no formato brasileiro (1.234,56) em float."""
+    return parse_numero(valores, decimal=",", milhar=".")
+
+
+def formatar_br(valores, casas: int = 2, prefixo: str = "", milhar: bool = True):
+    """
+    Formata números como texto brasileiro ("1.234,56"; `prefixo` como "R$ ").
+    Aceita um valor ou uma Series: na Series, cada valor passa por um único
+    format e a troca de separadores é feita de uma vez para a coluna;
+    vazios continuam vazios. Um valor que não é número é devolvido como veio
+    (textos "1.234,56" são lidos antes de formatar).
+    """
+    modelo = f"{{:{',' if milhar else ''}.{casas}f}}"
+
+    if isinstance(valores, pd.Series):
+        numeros = _parse_serie(valores, ",", ".")
+        textos = numeros.map(modelo.format, na_action="ignore").str.translate(TROCA_SEPARADORES)
+        return (prefixo + textos) if prefixo else textos
+
+    valor = valores
+    if isinstance(valor, str):
+        convertido = parse_br(pd.Series([valor])).iloc[0]
+        if pd.isna(convertido):
+            return valores
+        valor = convertido
+    if not isinstance(valor, Number) or pd.isna(valor):
+        return valores
+    return prefixo + modelo.format(valor).translate(TROCA_SEPARADORES)
+
+
+def formatar_taxa(valor, casas: int = 4) -> str:
+    """Taxa de câmbio com vírgula decimal e sem separador de milhar (5,4321)."""
+    return formatar_br(valor, casas=casas, milhar=False)
+
+
+def estilo_br(
+    dados,
+    colunas: Optional[Iterable[str]] = None,
+    casas: int = 2,
+    prefixo: str = "",
+):
+    """
+    Styler com as `colunas` numéricas (todas, se None) no formato
+    brasileiro. Aceita um DataFrame ou um Styler já existente, para
+    encadear formatos diferentes (ex.: moeda com 2 casas e taxas com 4).
+    """
+    estilo = dados.style if isinstance(dados, pd.DataFrame) else dados
+    if colunas is None:
+        colunas = estilo.data.select_dtypes("number").columns
+    colunas = [coluna for coluna in colunas if coluna in estilo.data.columns]
+    return estilo.format(
+        f"{prefixo}{{:,.{casas}f}}",
+        subset=colunas,
+        thousands=".",
+        decimal=",",
+        na_rep="",
+    )
@@ -0,0 +1,362 @@
+"""
+Manifesto local dos extratos mensais (pastas de rede).
+
+Um índice SQLite em data/.cache guarda, para cada arquivo já visto,
+tamanho, data de modificação e hash do conteúdo (SHA-256). Enquanto tamanho e mtime não mudam, o arquivo é tratado
+como inalterado: o hash vem do índice, sem reler o arquivo, e extratos
+iguais em pastas diferentes (ex.: o mesmo relatório em dois catálogos)
+são encontrados só pelo índice.
+
+O manifesto também guarda:
+    - as cópias feitas (origem -> destino), com o hash calculado durante
+      a própria cópia
+    - a listagem das pastas percorridas na descoberta de períodos,
+      revalidada pelo mtime da pasta (uma consulta em vez de um listdir)
+    - o resultado das leituras de relatórios, por hash do conteúdo e
+      leitor (nome e versão da função: a mesma planilha lida por funções
+      diferentes, ou por uma versão corrigida do leitor, gera leituras
+      diferentes): o DataFrame vai para um pickle em data/.cache/leituras
+      (só os MAX_LEITURAS_DISCO usados mais recentemente) e erros de
+      leitura ficam registrados até o arquivo ou o leitor mudar
+
+O arquivo é local a cada máquina e pode ser apagado a qualquer momento;
+ele é reconstruído à medida que os arquivos são acessados.
+"""
+import hashlib
+import inspect
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.copia import TOLERANCIA_MTIME, chave_caminho
+from utils.referencias import PASTA_CACHE
+
+ARQUIVO_MANIFESTO = PASTA_CACHE / "manifesto.sqlite"
+PASTA_LEITURAS = PASTA_CACHE / "leituras"
+
+TAMANHO_BLOCO = 1 << 20
+
+# Leituras guardadas em disco (as mais antigas pelo último uso são apagadas)
+MAX_LEITURAS_DISCO = 100
+
+STATUS_OK = "ok"
+STATUS_ERRO = "erro"
+
+# Versão do esquema (PRAGMA user_version); um índice de outra versão é
+# recriado do zero, já que tudo nele pode ser reconstruído
+VERSAO_ESQUEMA = 2
+
+TABELAS = ("arquivos", "copias", "pastas", "leituras")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS arquivos (
+    chave TEXT PRIMARY KEY,
+    caminho TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT,
+    atualizado_em TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS arquivos_hash ON arquivos (hash);
+CREATE TABLE IF NOT EXISTS copias (
+    origem TEXT NOT NULL,
+    destino TEXT NOT NULL,
+    hash TEXT,
+    copiado_em TEXT NOT NULL,
+    PRIMARY KEY (origem, destino)
+);
+CREATE TABLE IF NOT EXISTS pastas (
+    chave TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    entradas TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leituras (
+    hash TEXT NOT NULL,
+    leitor TEXT NOT NULL,
+    status TEXT NOT NULL,
+    erro TEXT,
+    lido_em TEXT NOT NULL,
+    PRIMARY KEY (hash, leitor)
+);
+"""
+
+
+def hash_conteudo(caminho) -> str:
+    """SHA-256 do arquivo, lido em blocos."""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def chave_leitor(leitor: Callable) -> str:
+    """
+    Identificação do leitor no manifesto: módulo, nome qualificado e versão
+    da função (hash do código-fonte, ou do bytecode quando o fonte não está
+    disponível). Uma correção no leitor invalida as leituras e os erros
+    guardados com a versão anterior.
+    """
+    try:
+        codigo = inspect.getsource(leitor).encode()
+    except (OSError, TypeError):
+        codigo = getattr(getattr(leitor, "__code__", None), "co_code", b"")
+    versao = hashlib.sha256(codigo).hexdigest()[:12]
+    return f"{leitor.__module__}.{leitor.__qualname__}@{versao}"
+
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _inalterado(registro: Optional[sqlite3.Row], info: os.stat_result) -> bool:
+    return (
+        registro is not None
+        and registro["tamanho"] == info.st_size
+        and abs(registro["mtime"] - info.st_mtime) <= TOLERANCIA_MTIME
+    )
+
+
+class Manifesto:
+    """
+    Índice de arquivos por caminho, tamanho, mtime e hash do conteúdo.
+    Pode ser usado por várias threads (cópias paralelas, sessões do app).
+    """
+
+    def __init__(self, caminho=ARQUIVO_MANIFESTO):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self._pronto = False
+
+    @contextmanager
+    def _conexao(self):
+        with self._lock:
+            if not self._pronto:
+                self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.row_factory = sqlite3.Row
+            try:
+                if not self._pronto:
+                    if conexao.execute("PRAGMA user_version").fetchone()[0] != VERSAO_ESQUEMA:
+                        conexao.executescript("".join(f"DROP TABLE IF EXISTS {tabela};" for tabela in TABELAS))
+                        conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+                    conexao.executescript(ESQUEMA)
+                    self._pronto = True
+                with conexao:
+                    yield conexao
+            finally:
+                conexao.close()
+
+    def _registro(self, conexao, caminho) -> Optional[sqlite3.Row]:
+        return conexao.execute("SELECT * FROM arquivos WHERE chave = ?", (chave_caminho(caminho),)).fetchone()
+
+    def consultar(self, caminho, info: Optional[os.stat_result] = None) -> Optional[dict]:
+        """Registro do arquivo se ele não mudou desde que foi registrado (None caso contrário)."""
+        info = info or os.stat(caminho)
+        with self._conexao() as conexao:
+            registro = self._registro(conexao, caminho)
+        return dict(registro) if _inalterado(registro, info) else None
+
+    def registrar(self, caminho, info: os.stat_result, hash: Optional[str] = None):
+        """
+        Grava tamanho e mtime do arquivo. O hash, se não informado, é
+        mantido se o arquivo não mudou e apagado se mudou.
+        """
+        with self._conexao() as conexao:
+            anterior = self._registro(conexao, caminho)
+            if _inalterado(anterior, info):
+                hash = hash or anterior["hash"]
+            conexao.execute(
+                "INSERT OR REPLACE INTO arquivos VALUES (?, ?, ?, ?, ?, ?)",
+                (chave_caminho(caminho), os.path.abspath(caminho), info.st_size, info.st_mtime, hash, _agora()),
+            )
+
+    def hash_arquivo(self, caminho, info: Optional[os.stat_result] = None) -> str:
+        """Hash do conteúdo; só relê o arquivo se tamanho ou mtime mudaram."""
+        info = info or os.stat(caminho)
+        registro = self.consultar(caminho, info)
+        if registro is not None and registro["hash"]:
+            return registro["hash"]
+        hash = hash_conteudo(caminho)
+        self.registrar(caminho, info, hash=hash)
+        return hash
+
+    def copiar(self, origem, destino, info: Optional[os.stat_result] = None) -> str:
+        """
+        Copia o arquivo calculando o hash na mesma leitura (com a data de
+        modificação preservada, como o shutil.copy2) e registra origem e
+        cópia no manifesto. Retorna o hash.
+        """
+        info = info or os.stat(origem)
+        sha = hashlib.sha256()
+        with open(origem, "rb") as entrada, open(destino, "wb") as saida:
+            for bloco in iter(lambda: entrada.read(TAMANHO_BLOCO), b""):
+                sha.update(bloco)
+                saida.write(bloco)
+        shutil.copystat(origem, destino)
+        hash = sha.hexdigest()
+
+        self.registrar(origem, info, hash=hash)
+        with self._conexao() as conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO copias VALUES (?, ?, ?, ?)",
+                (chave_caminho(origem), chave_caminho(destino), hash, _agora()),
+            )
+        return hash
+
+    def duplicados(self, caminhos: Optional[Iterable] = None) -> pd.DataFrame:
+        """
+        Arquivos com o mesmo conteúdo em caminhos diferentes, pelo hash já
+        registrado (nada é relido). Com `caminhos`, só os grupos que contêm
+        algum deles. Colunas: hash, caminho, tamanho.
+        """
+        with self._conexao() as conexao:
+            repetidos = pd.read_sql_query(
+                "SELECT hash, caminho, chave, tamanho FROM arquivos WHERE hash IN "
+                "(SELECT hash FROM arquivos WHERE hash IS NOT NULL GROUP BY hash HAVING COUNT(*) > 1) "
+                "ORDER BY hash, caminho",
+                conexao,
+            )
+        if caminhos is not None:
+            chaves = {chave_caminho(caminho) for caminho in caminhos}
+            hashes = repetidos.loc[repetidos["chave"].isin(chaves), "hash"]
+            repetidos = repetidos[repetidos["hash"].isin(hashes)]
+        return repetidos.drop(columns="chave").reset_index(drop=True)
+
+    def listar_pasta(self, pasta) -> List[Tuple[str, bool]]:
+        """
+        Entradas da pasta como (nome, é pasta). A listagem fica no
+        manifesto e só é refeita quando o mtime da pasta muda (arquivo ou
+        subpasta criado, removido ou renomeado diretamente nela).
+        """
+        mtime = os.stat(pasta).st_mtime
+        chave = chave_caminho(pasta)
+        with self._conexao() as conexao:
+            registro = conexao.execute("SELECT mtime, entradas FROM pastas WHERE chave = ?", (chave,)).fetchone()
+        if registro is not None and registro["mtime"] == mtime:
+            return [tuple(entrada) for entrada in json.loads(registro["entradas"])]
+
+        with os.scandir(pasta) as itens:
+            entradas = sorted((item.name, item.is_dir()) for item in itens)
+        with self._conexao() as conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO pastas VALUES (?, ?, ?)", (chave, mtime, json.dumps(entradas))
+            )
+        return entradas
+
+    def _gravar_leitura(self, hash: str, leitor: str, status: str, erro: Optional[str] = None):
+        with self._conexao() as conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO leituras VALUES (?, ?, ?, ?, ?)", (hash, leitor, status, erro, _agora())
+            )
+
+    def ler(
+        self,
+        caminho,
+        leitor: Callable[[io.BytesIO], pd.DataFrame],
+        chave: Optional[str] = None,
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        Lê um relatório com `leitor(arquivo)` reaproveitando a leitura
+        anterior do mesmo conteúdo pelo mesmo leitor (`chave`, por padrão
+        chave_leitor(leitor)): o DataFrame vem do pickle gravado e um erro
+        de leitura anterior é repetido sem reler o arquivo. Fora do cache,
+        o arquivo é lido uma única vez: o hash é calculado sobre os bytes
+        lidos e o leitor recebe esses bytes num arquivo binário em memória.
+        Retorna (DataFrame, hash).
+        """
+        chave = chave or chave_leitor(leitor)
+        info = os.stat(caminho)
+        registro = self.consultar(caminho, info)
+        if registro is not None and registro["hash"]:
+            with self._conexao() as conexao:
+                leitura = conexao.execute(
+                    "SELECT status, erro FROM leituras WHERE hash = ? AND leitor = ?", (registro["hash"], chave)
+                ).fetchone()
+            if leitura is not None and leitura["status"] == STATUS_ERRO:
+                raise ValueError(leitura["erro"])
+            if leitura is not None and leitura["status"] == STATUS_OK:
+                df = _ler_pickle(registro["hash"], chave)
+                if df is not None:
+                    return df, registro["hash"]
+
+        with open(caminho, "rb") as f:
+            dados = f.read()
+        hash = hashlib.sha256(dados).hexdigest()
+        self.registrar(caminho, info, hash=hash)
+        try:
+            df = leitor(io.BytesIO(dados))
+        except ValueError as e:
+            # Só erros de formato (cabeçalho, planilha ausente) ficam no manifesto
+            self._gravar_leitura(hash, chave, STATUS_ERRO, str(e))
+            raise
+        if _gravar_pickle(hash, chave, df):
+            self._gravar_leitura(hash, chave, STATUS_OK)
+        return df, hash
+
+
+def _caminho_pickle(hash: str, leitor: str) -> Path:
+    # O nome do leitor entra resumido, para caber em qualquer sistema de arquivos
+    return PASTA_LEITURAS / f"{hash}-{hashlib.sha256(leitor.encode()).hexdigest()[:16]}.pkl"
+
+
+def _podar_leituras():
+    """Mantém em disco só as MAX_LEITURAS_DISCO leituras usadas mais recentemente."""
+    try:
+        gravadas = sorted(PASTA_LEITURAS.glob("*.pkl"), key=lambda caminho: caminho.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for caminho in gravadas[MAX_LEITURAS_DISCO:]:
+        try:
+            caminho.unlink()
+        except OSError:
+            pass
+
+
+def _ler_pickle(hash: str, leitor: str) -> Optional[pd.DataFrame]:
+    caminho = _caminho_pickle(hash, leitor)
+    try:
+        df = pd.read_pickle(caminho)
+        # O mtime marca o último uso, para a poda manter as mais recentes
+        os.utime(caminho)
+    except Exception:
+        return None
+    return df
+
+
+def _gravar_pickle(hash: str, leitor: str, df: pd.DataFrame) -> bool:
+    """Grava a leitura em pickle; retorna False (sem deixar arquivo parcial) se a gravação falhar."""
+    caminho = _caminho_pickle(hash, leitor)
+    try:
+        PASTA_LEITURAS.mkdir(parents=True, exist_ok=True)
+        df.to_pickle(caminho)
+        _podar_leituras()
+        return True
+    except Exception:
+        try:
+            caminho.unlink()
+        except OSError:
+            pass
+        return False
+
+
+_manifesto: Optional[Manifesto] = None
+_lock_manifesto = threading.Lock()
+
+
+def manifesto_padrao() -> Manifesto:
+    """Manifesto compartilhado pelas páginas (data/.cache/manifesto.sqlite)."""
+    global _manifesto
+    with _lock_manifesto:
+        if _manifesto is None:
+            _manifesto = Manifesto()
+        return _manifesto
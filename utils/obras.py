@@ -0,0 +1,72 @@
+"""
+Índice do catálogo de obras cadastradas (CÓD. OBRA e ISWC).
+
+O catálogo é indexado uma única vez (cacheado junto com a planilha em
+utils.referencias) por chaves normalizadas dos dois identificadores:
+"C" + código ECAD/ABRAMUS sem casas decimais e "I" + ISWC sem pontuação
+(T-040.308.274-5 e T0403082745 são a mesma obra). As linhas dos
+relatórios nacional e internacional são resolvidas com um único
+get_indexer sobre esse índice.
+"""
+import re
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+RE_NAO_ALFANUMERICO = re.compile(r'[^0-9A-Z]')
+COLUNAS_STATUS = ['AQUIRED', 'CONTROLLED']
+
+
+def normalizar_iswc(valores: pd.Series) -> pd.Series:
+    """ISWC em maiúsculas, sem espaços, pontos ou hífens."""
+    return valores.astype(str).str.upper().str.replace(RE_NAO_ALFANUMERICO, '', regex=True)
+
+
+def chaves_codigo(valores: pd.Series) -> pd.Series:
+    """Chaves do CÓD. OBRA; códigos lidos como float (18951406.0) viram o mesmo texto do inteiro."""
+    numeros = pd.to_numeric(valores, errors='coerce')
+    inteiros = numeros.notna() & (numeros == np.floor(numeros))
+    textos = valores.astype(str).str.strip()
+    textos[inteiros] = numeros[inteiros].astype('int64').astype(str)
+    return 'C' + textos
+
+
+def chaves_iswc(valores: pd.Series) -> pd.Series:
+    return 'I' + normalizar_iswc(valores)
+
+
+class IndiceObras:
+    """Catálogo de obras indexado por CÓD. OBRA e ISWC normalizados."""
+
+    def __init__(self, obras: pd.DataFrame):
+        self.obras = obras.reset_index(drop=True)
+
+        partes = []
+        if 'CÓD. OBRA' in self.obras.columns:
+            codigos = self.obras['CÓD. OBRA'].dropna()
+            partes.append(pd.Series(codigos.index, index=chaves_codigo(codigos)))
+        if 'ISWC' in self.obras.columns:
+            iswcs = self.obras['ISWC'].dropna()
+            partes.append(pd.Series(iswcs.index, index=chaves_iswc(iswcs)))
+        posicoes = pd.concat(partes) if partes else pd.Series(dtype='int64')
+
+        # Chave repetida no catálogo: vale a primeira obra (as demais viram diagnóstico)
+        repetidas = posicoes.index.duplicated(keep='first')
+        self.chaves_repetidas: List[str] = sorted(set(posicoes.index[repetidas].str[1:]))
+        posicoes = posicoes[~repetidas]
+
+        self.indice = pd.Index(posicoes.index)
+        self.posicoes = posicoes.to_numpy(dtype='int64')
+
+    def __len__(self):
+        return len(self.obras)
+
+    def localizar(self, chaves: pd.Series) -> np.ndarray:
+        """Posição de cada chave no catálogo (-1 para obras não cadastradas)."""
+        encontrados = self.indice.get_indexer(chaves)
+        return np.where(encontrados >= 0, self.posicoes[encontrados], -1)
+
+    def status(self, posicoes: np.ndarray) -> pd.DataFrame:
+        """Colunas AQUIRED e CONTROLLED das obras nas posições informadas."""
+        return self.obras[COLUNAS_STATUS].iloc[posicoes].reset_index(drop=True)
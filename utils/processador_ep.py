@@ -0,0 +1,351 @@
+"""
+Cálculo dos EPs (Writer / Publisher) a partir dos relatórios ABRAMUS.
+
+ProcessadorRoyalties cruza o relatório (nacional em CSV, internacional em
+Excel, ou ambos) com o catálogo de obras do artista e aplica o plano de
+alocação do contrato (utils.contratos). processar_pasta roda o mesmo
+cálculo para vários artistas e períodos de uma vez, lendo os relatórios
+de uma pasta organizada como:
+
+    <pasta>/<periodo>/<artista>/<Writer|Publisher>/<relatórios>
+
+O período segue o formato dos nomes de incomes (ex: "2025M8") e a ordem
+dos três níveis não importa. CSVs são tratados como relatório nacional e
+planilhas (xlsx/xls) como internacional.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.contratos import (
+    COLUNAS_INCOMES,
+    COLUNAS_TITULARES,
+    TIPOS_RELATORIO,
+    agrupar_por_titular,
+    carregar_contrato,
+    listar_artistas,
+    processar_lote,
+)
+from utils.obras import IndiceObras, chaves_codigo, chaves_iswc
+
+# Parâmetros de leitura do CSV nacional da ABRAMUS
+LEITURA_NACIONAL = {
+    "sep": ';',
+    "encoding": "ISO-8859-1",
+    "decimal": ',',
+    "thousands": '.',
+    "header": 4,
+}
+EXTENSOES_NACIONAL = ('.csv',)
+EXTENSOES_INTERNACIONAL = ('.xlsx', '.xls')
+COLUNAS_NAO_CADASTRADAS = ['CÓD. OBRA', 'TÍTULO DA MUSICA', 'TOTAL', 'LINHAS']
+RE_PERIODO = re.compile(r'^\d{4}M\d{1,2}$', re.IGNORECASE)
+
+
+def ler_relatorio(arquivo, nome: Optional[str] = None) -> pd.DataFrame:
+    """Lê um relatório nacional (CSV) ou internacional (Excel); aceita caminho ou upload."""
+    nome = (nome or getattr(arquivo, 'name', None) or str(arquivo)).lower()
+    if nome.endswith(EXTENSOES_NACIONAL):
+        return pd.read_csv(arquivo, **LEITURA_NACIONAL)
+    if nome.endswith(EXTENSOES_INTERNACIONAL):
+        return pd.read_excel(arquivo)
+    raise ValueError(f"Formato de relatório não suportado: {nome}")
+
+
+def calcular_totais(relatorios: List[pd.DataFrame], relatorio_completo: Optional[pd.DataFrame] = None) -> Dict[str, float]:
+    """Totais nacional, internacional e geral dos relatórios carregados (antes do cruzamento)."""
+    total_nacional = 0
+    total_internacional = 0
+    for rel in relatorios:
+        if 'RATEIO' in rel.columns and 'CÓD. OBRA' in rel.columns:  # Nacional
+            total_nacional += rel['RATEIO'].sum()
+        elif 'Rendimento' in rel.columns:  # Internacional
+            total_internacional += rel['Rendimento'].sum()
+
+    # Total geral considerando ambas as colunas
+    if relatorio_completo is None:
+        relatorio_completo = pd.concat(relatorios, ignore_index=True)
+    total_geral = 0
+    if 'RATEIO' in relatorio_completo.columns:
+        total_geral += relatorio_completo['RATEIO'].fillna(0).sum()
+    if 'Rendimento' in relatorio_completo.columns:
+        total_geral += relatorio_completo['Rendimento'].fillna(0).sum()
+
+    return {
+        'total_nacional': total_nacional,
+        'total_internacional': total_internacional,
+        'total_geral': total_geral,
+    }
+
+
+class ProcessadorRoyalties:
+    def __init__(self, obras_cadastradas, tipo_relatorio, contrato):
+        # Aceita o catálogo já indexado (contrato.indice_obras()) ou o DataFrame
+        self.indice_obras = obras_cadastradas if isinstance(obras_cadastradas, IndiceObras) else IndiceObras(obras_cadastradas)
+        self.obras_cadastradas = self.indice_obras.obras
+        self.tipo_relatorio = tipo_relatorio
+        self.contrato = contrato
+        self.autor = self.contrato.autor
+        self.editora = self.contrato.editora
+        # Plano de alocação compilado a partir das regras do contrato
+        self.plano = self.contrato.plano(tipo_relatorio)
+        # Diagnóstico da última chamada de preparar_obras
+        self.obras_nao_cadastradas = pd.DataFrame(columns=COLUNAS_NAO_CADASTRADAS)
+
+    def preparar_obras(self, relatorio):
+        """Agrupa o relatório (nacional, internacional ou ambos) por obra e cruza com as obras cadastradas
+
+        As linhas nacionais (CÓD. OBRA) e internacionais (ISWC) são resolvidas no
+        índice do catálogo de uma vez; as que não estão cadastradas ficam em
+        self.obras_nao_cadastradas.
+        """
+        
+        # Identifica quais tipos de relatório estão presentes
+        tem_nacional = 'CÓD. OBRA' in relatorio.columns and 'RATEIO' in relatorio.columns
+        tem_internacional = 'ISRC/ISWC' in relatorio.columns and 'Rendimento' in relatorio.columns
+        
+        linhas = []
+        
+        # Linhas do relatório NACIONAL, pela chave do CÓD. OBRA
+        if tem_nacional:
+            df_nacional = relatorio[relatorio['CÓD. OBRA'].notna()]
+            linhas.append(pd.DataFrame({
+                'CÓD. OBRA': df_nacional['CÓD. OBRA'],
+                'TÍTULO DA MUSICA': df_nacional['TÍTULO DA MUSICA'],
+                'TOTAL': df_nacional['RATEIO'],
+                '_chave': chaves_codigo(df_nacional['CÓD. OBRA']),
+            }))
+        
+        # Linhas do relatório INTERNACIONAL, pela chave do ISWC (o ISWC fica no lugar do CÓD. OBRA)
+        if tem_internacional:
+            df_inter = relatorio[relatorio['ISRC/ISWC'].notna()]
+            # Identifica o nome correto da coluna de título
+            coluna_titulo_inter = 'Título' if 'Título' in df_inter.columns else 'TITULOTITULO'
+            linhas.append(pd.DataFrame({
+                'CÓD. OBRA': df_inter['ISRC/ISWC'],
+                'TÍTULO DA MUSICA': df_inter[coluna_titulo_inter],
+                'TOTAL': df_inter['Rendimento'],
+                '_chave': chaves_iswc(df_inter['ISRC/ISWC']),
+            }))
+        
+        linhas = [df for df in linhas if not df.empty]
+        if not linhas:
+            self.obras_nao_cadastradas = pd.DataFrame(columns=COLUNAS_NAO_CADASTRADAS)
+            return None
+        
+        df_linhas = pd.concat(linhas)
+        posicoes = self.indice_obras.localizar(df_linhas['_chave'])
+        cadastradas = posicoes >= 0
+        
+        # Diagnóstico das obras não cadastradas, na mesma passada
+        self.obras_nao_cadastradas = df_linhas[~cadastradas].groupby(
+            ['CÓD. OBRA', 'TÍTULO DA MUSICA'], dropna=False
+        ).agg(TOTAL=('TOTAL', 'sum'), LINHAS=('TOTAL', 'size')).reset_index()
+        
+        # Se não há obras processadas, retorna vazio
+        if not cadastradas.any():
+            return None
+        
+        df_linhas = df_linhas[cadastradas].assign(_posicao=posicoes[cadastradas])
+        
+        # Agrupa por obra (CÓD. OBRA contém tanto códigos nacionais quanto ISWCs)
+        df_obras = df_linhas.groupby(['CÓD. OBRA', 'TÍTULO DA MUSICA']).agg(
+            TOTAL=('TOTAL', 'sum'),
+            _posicao=('_posicao', 'first')
+        ).reset_index()
+        
+        status = self.indice_obras.status(df_obras['_posicao'].to_numpy())
+        df_obras['AQUIRED'] = status['AQUIRED'].to_numpy()
+        df_obras['CONTROLLED'] = status['CONTROLLED'].to_numpy()
+        
+        return df_obras.drop(columns='_posicao')
+
+    def processar_relatorio(self, relatorio):
+        """Processa o relatório (pode conter nacional, internacional ou ambos) e retorna os resultados calculados"""
+        df_obras = self.preparar_obras(relatorio)
+        
+        # Se não há obras processadas, retorna vazio
+        if df_obras is None:
+            if self.tipo_relatorio == "Writer":
+                return pd.DataFrame(columns=COLUNAS_TITULARES), pd.DataFrame(), []
+            else:
+                return pd.DataFrame(columns=COLUNAS_TITULARES), pd.DataFrame(columns=COLUNAS_TITULARES), \
+                       pd.DataFrame(), []
+        
+        # Aplica o plano do contrato a todas as obras de uma vez
+        blocos = self.plano.alocar(df_obras)
+        
+        if self.tipo_relatorio == "Writer":
+            resultados = blocos['titulares']
+            df_titulares = agrupar_por_titular(resultados)
+            
+            return df_titulares, df_obras, resultados
+            
+        else:  # Publisher
+            # Obras ADQUIRIDAS vão para AQUISIÇÃO e NÃO ADQUIRIDAS para ADMINISTRAÇÃO
+            resultados_aquisicao = blocos['aquisicao']
+            resultados_administracao = blocos['administracao']
+            
+            df_titulares_aquisicao = agrupar_por_titular(resultados_aquisicao) if not resultados_aquisicao.empty else pd.DataFrame()
+            df_titulares_administracao = agrupar_por_titular(resultados_administracao) if not resultados_administracao.empty else pd.DataFrame()
+            
+            # Combina todos os resultados para retornar
+            resultados = pd.concat([resultados_aquisicao, resultados_administracao], ignore_index=True)
+            
+            return df_titulares_aquisicao, df_titulares_administracao, df_obras, resultados
+
+def gerar_linhas_incomes(df_titulares, tipo_relatorio, periodo, contrato, total_geral_real=None):
+    """Gera as linhas de incomes no formato do sistema externo
+    
+    Args:
+        df_titulares: DataFrame com os totais por titular (pode juntar os blocos de aquisição e administração)
+        tipo_relatorio: "Writer" ou "Publisher"
+        periodo: String com o período (ex: "2025M8")
+        contrato: Contrato do artista (utils.contratos)
+        total_geral_real: Total geral real para usar no Gross Amount
+    """
+    return contrato.plano(tipo_relatorio).gerar_incomes(df_titulares, periodo, total_geral_real)
+
+
+def _nivel_tipo(parte: str) -> Optional[str]:
+    for tipo in TIPOS_RELATORIO:
+        if parte.lower() == tipo.lower():
+            return tipo
+    return None
+
+
+def descobrir_relatorios(pasta: str) -> Tuple[Dict[Tuple[str, str, str], List[str]], List[Tuple[str, str]]]:
+    """
+    Percorre a pasta e agrupa os relatórios por (artista, tipo, período).
+
+    Returns:
+        (grupos, ignorados): grupos mapeia (artista, tipo, periodo) para a
+        lista de caminhos; ignorados lista (caminho, motivo)
+    """
+    artistas = set(listar_artistas())
+    grupos: Dict[Tuple[str, str, str], List[str]] = {}
+    ignorados = []
+
+    for raiz, pastas, arquivos in os.walk(pasta):
+        pastas.sort()
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            if nome.startswith(('~$', '.')):
+                continue
+            if not nome.lower().endswith(EXTENSOES_NACIONAL + EXTENSOES_INTERNACIONAL):
+                ignorados.append((caminho, "extensão não suportada"))
+                continue
+
+            niveis = os.path.relpath(raiz, pasta).split(os.sep)
+            artista = next((n for n in niveis if n in artistas), None)
+            tipo = next((t for t in map(_nivel_tipo, niveis) if t), None)
+            periodo = next((n.upper() for n in niveis if RE_PERIODO.match(n)), None)
+
+            if artista is None:
+                ignorados.append((caminho, "artista sem contrato.json em data/catalogs"))
+            elif tipo is None:
+                ignorados.append((caminho, "pasta Writer/Publisher não encontrada"))
+            elif periodo is None:
+                ignorados.append((caminho, "pasta de período (ex: 2025M8) não encontrada"))
+            else:
+                grupos.setdefault((artista, tipo, periodo), []).append(caminho)
+
+    return grupos, ignorados
+
+
+def _preparar_grupo(artista: str, tipo: str, periodo: str, caminhos: List[str]) -> dict:
+    """Lê os relatórios de um artista/tipo/período e cruza com o catálogo do artista."""
+    contrato = carregar_contrato(artista)
+    relatorios = [ler_relatorio(caminho) for caminho in caminhos]
+    relatorio_completo = pd.concat(relatorios, ignore_index=True)
+
+    processador = ProcessadorRoyalties(contrato.indice_obras(), tipo, contrato)
+    df_obras = processador.preparar_obras(relatorio_completo)
+    if df_obras is None:
+        df_obras = pd.DataFrame(columns=['CÓD. OBRA', 'TÍTULO DA MUSICA', 'TOTAL', 'AQUIRED', 'CONTROLLED'])
+
+    totais = calcular_totais(relatorios, relatorio_completo)
+    total_processado = df_obras['TOTAL'].sum()
+    return {
+        'artista': artista,
+        'tipo': tipo,
+        'periodo': periodo,
+        'df_obras': df_obras,
+        'resumo': {
+            'ARTISTA': artista,
+            'TIPO': tipo,
+            'PERIODO': periodo,
+            'Arquivos': len(caminhos),
+            'Total Nacional': totais['total_nacional'],
+            'Total Internacional': totais['total_internacional'],
+            'Total Geral': totais['total_geral'],
+            'Total Processado': total_processado,
+            'Não Processado': totais['total_geral'] - total_processado,
+            'Obras': len(df_obras),
+            'Obras Não Cadastradas': len(processador.obras_nao_cadastradas),
+            'Valor Não Cadastrado': processador.obras_nao_cadastradas['TOTAL'].sum(),
+            'Erro': '',
+        },
+    }
+
+
+def processar_pasta(
+    pasta: str,
+    max_workers: Optional[int] = None,
+    ao_processar: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, List[Tuple[str, str]]]:
+    """
+    Processa todos os relatórios da pasta (vários artistas e períodos).
+
+    A leitura e o cruzamento com o catálogo rodam em paralelo por
+    (artista, tipo, período); a alocação e as incomes saem de uma única
+    passada de utils.contratos.processar_lote.
+
+    Args:
+        pasta: pasta raiz dos relatórios
+        max_workers: threads de leitura (padrão: até 8)
+        ao_processar: callback (concluídos, total) para barra de progresso
+
+    Returns:
+        (df_resumo, df_incomes, ignorados): resumo por artista/tipo/período,
+        incomes consolidadas (com ARTISTA, TIPO e PERIODO) e arquivos ignorados
+    """
+    grupos, ignorados = descobrir_relatorios(pasta)
+    # Ordem estável do arquivo final: período, artista, Writer antes de Publisher
+    chaves = sorted(grupos, key=lambda c: (c[2], c[0], TIPOS_RELATORIO.index(c[1])))
+    preparados: List[Optional[dict]] = [None] * len(chaves)
+    resumo_erros = {}
+
+    if chaves:
+        workers = max_workers or min(8, len(chaves))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futuros = {
+                executor.submit(_preparar_grupo, *chave, grupos[chave]): i
+                for i, chave in enumerate(chaves)
+            }
+            for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+                i = futuros[futuro]
+                try:
+                    preparados[i] = futuro.result()
+                except Exception as e:
+                    artista, tipo, periodo = chaves[i]
+                    resumo_erros[i] = {
+                        'ARTISTA': artista, 'TIPO': tipo, 'PERIODO': periodo,
+                        'Arquivos': len(grupos[chaves[i]]), 'Erro': str(e),
+                    }
+                if ao_processar:
+                    ao_processar(concluidos, len(chaves))
+
+    resumo = [resumo_erros[i] if p is None else p['resumo'] for i, p in enumerate(preparados)]
+    entradas = [p for p in preparados if p is not None and not p['df_obras'].empty]
+    _, _, df_incomes = processar_lote(entradas)
+
+    return pd.DataFrame(resumo), df_incomes, ignorados
+
+
+def exportar_incomes(df_incomes: pd.DataFrame) -> bytes:
+    """CSV de importação das incomes (mesmo formato do export da página do EP)."""
+    return df_incomes[COLUNAS_INCOMES].to_csv(index=False).encode('utf-8-sig')
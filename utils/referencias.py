@@ -0,0 +1,184 @@
+"""
+Registro central das planilhas de referência (mapeamentos e catálogos).
+
+Cada planilha é lida uma única vez por processo e mantida em memória
+enquanto o arquivo de origem não mudar (validação pelo mtime). Uma cópia
+em pickle é gravada em data/.cache, junto com o mtime e os parâmetros de
+leitura da planilha de origem, para acelerar a primeira leitura após
+reiniciar o app; ela só é usada se o mtime for exatamente o mesmo (uma
+versão antiga da planilha restaurada também invalida a cópia).
+
+A planilha em memória é compartilhada entre páginas e sessões, então
+nunca é entregue diretamente: `carregar_referencia` devolve uma cópia,
+`obter_indice` um dicionário somente leitura (MappingProxyType) e
+`obter_derivado` monta o objeto a partir de uma cópia.
+"""
+import os
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+import pandas as pd
+
+RAIZ_APP = Path(__file__).resolve().parent.parent
+PASTA_CACHE = RAIZ_APP / "data" / ".cache"
+
+# nome -> caminho relativo à raiz do app e parâmetros do read_excel
+REFERENCIAS = {
+    "rubricas": {
+        "caminho": os.path.join("data", "mapping", "mapping-rubricas.xlsx"),
+        "read_excel": {"sheet_name": "Sheet1"},
+    },
+    "artistas_ingrooves": {
+        "caminho": os.path.join("data", "mapping", "mapping-artistas-ingrooves.xlsx"),
+        "read_excel": {},
+    },
+    "obras_douglas_cezar": {
+        "caminho": os.path.join("data", "catalogs", "douglas-cezar", "obras-cadastradas-DOUGLAS-CEZAR.xlsx"),
+        "read_excel": {},
+    },
+}
+
+_lock = threading.Lock()
+# nome -> (mtime do arquivo de origem, DataFrame)
+_tabelas: Dict[str, Tuple[float, pd.DataFrame]] = {}
+# (nome, chave, valor) -> (mtime do arquivo de origem, dicionário somente leitura)
+_indices: Dict[Tuple[str, Hashable, Hashable], Tuple[float, Mapping]] = {}
+# (nome, chave) -> (mtime do arquivo de origem, objeto derivado da planilha)
+_derivados: Dict[Tuple[str, Hashable], Tuple[float, Any]] = {}
+
+
+def caminho_referencia(nome: str) -> Path:
+    """Retorna o caminho absoluto da planilha registrada com esse nome."""
+    if nome not in REFERENCIAS:
+        raise KeyError(f"Referência não registrada: {nome}")
+    return RAIZ_APP / REFERENCIAS[nome]["caminho"]
+
+
+def registrar_referencia(nome: str, caminho, read_excel: Optional[dict] = None):
+    """
+    Registra (ou atualiza) uma planilha de referência em tempo de execução,
+    como os catálogos de obras de cada artista. O caminho pode ser absoluto
+    ou relativo à raiz do app.
+    """
+    caminho = Path(caminho)
+    if caminho.is_absolute():
+        try:
+            caminho = caminho.relative_to(RAIZ_APP)
+        except ValueError:
+            pass
+    config = {"caminho": str(caminho), "read_excel": dict(read_excel or {})}
+
+    with _lock:
+        if REFERENCIAS.get(nome) != config:
+            REFERENCIAS[nome] = config
+            _tabelas.pop(nome, None)
+            for cache in (_indices, _derivados):
+                for chave in [chave for chave in cache if chave[0] == nome]:
+                    del cache[chave]
+
+
+def _caminho_pickle(nome: str) -> Path:
+    return PASTA_CACHE / f"{nome}.pkl"
+
+
+def _ler_pickle(nome: str, mtime_origem: float) -> Optional[pd.DataFrame]:
+    """Lê a cópia em pickle se ela foi gravada a partir da mesma versão da planilha."""
+    try:
+        mtime, read_excel, df = pd.read_pickle(_caminho_pickle(nome))
+    except Exception:
+        return None
+    if mtime != mtime_origem or read_excel != REFERENCIAS[nome]["read_excel"]:
+        return None
+    return df
+
+
+def _gravar_pickle(nome: str, mtime_origem: float, df: pd.DataFrame):
+    """Grava a cópia em pickle com o mtime da origem; falhas são ignoradas."""
+    try:
+        PASTA_CACHE.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle((mtime_origem, REFERENCIAS[nome]["read_excel"], df), _caminho_pickle(nome))
+    except Exception:
+        try:
+            _caminho_pickle(nome).unlink()
+        except OSError:
+            pass
+
+
+def _carregar(nome: str) -> Tuple[float, pd.DataFrame]:
+    caminho = caminho_referencia(nome)
+    mtime = caminho.stat().st_mtime
+
+    with _lock:
+        em_cache = _tabelas.get(nome)
+        if em_cache is not None and em_cache[0] == mtime:
+            return em_cache
+
+        df = _ler_pickle(nome, mtime)
+        if df is None:
+            df = pd.read_excel(caminho, **REFERENCIAS[nome]["read_excel"])
+            _gravar_pickle(nome, mtime, df)
+
+        _tabelas[nome] = (mtime, df)
+        return _tabelas[nome]
+
+
+def carregar_referencia(nome: str) -> pd.DataFrame:
+    """
+    Retorna a planilha de referência, lendo do disco apenas se ainda não
+    estiver em memória ou se o arquivo de origem tiver sido alterado. O
+    DataFrame é uma cópia: pode ser alterado sem afetar outras sessões.
+
+    Lança FileNotFoundError se a planilha não existir.
+    """
+    return _carregar(nome)[1].copy()
+
+
+def obter_indice(nome: str, chave: Hashable, valor: Hashable) -> Mapping:
+    """
+    Retorna um dicionário chave -> valor montado a partir da planilha de
+    referência (primeira ocorrência de cada chave, ignorando chaves vazias).
+    O dicionário é compartilhado e somente leitura (MappingProxyType; use
+    dict(...) para uma cópia alterável) e é reconstruído apenas quando a
+    planilha muda.
+    """
+    mtime, df = _carregar(nome)
+
+    with _lock:
+        em_cache = _indices.get((nome, chave, valor))
+        if em_cache is not None and em_cache[0] == mtime:
+            return em_cache[1]
+
+        pares = df[[chave, valor]].dropna(subset=[chave]).drop_duplicates(subset=[chave], keep="first")
+        indice = MappingProxyType(dict(zip(pares[chave], pares[valor])))
+        _indices[(nome, chave, valor)] = (mtime, indice)
+        return indice
+
+
+def obter_derivado(nome: str, chave: Hashable, construir: Callable[[pd.DataFrame], Any]) -> Any:
+    """
+    Retorna um objeto montado a partir da planilha de referência (ex: um
+    índice de obras), chamando construir(df) apenas quando a planilha muda.
+    `construir` recebe uma cópia da planilha; o objeto devolvido é
+    compartilhado entre sessões e deve ser tratado como somente leitura.
+    """
+    mtime, df = _carregar(nome)
+
+    with _lock:
+        em_cache = _derivados.get((nome, chave))
+        if em_cache is not None and em_cache[0] == mtime:
+            return em_cache[1]
+
+    derivado = construir(df.copy())
+    with _lock:
+        _derivados[(nome, chave)] = (mtime, derivado)
+    return derivado
+
+
+def limpar_cache():
+    """Descarta as planilhas, índices e derivados mantidos em memória."""
+    with _lock:
+        _tabelas.clear()
+        _indices.clear()
+        _derivados.clear()